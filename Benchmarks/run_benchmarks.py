@@ -0,0 +1,243 @@
+"""
+Throughput benchmark of every pipeline stage on a synthetic PGN corpus.
+
+Runs MetaData, MoveData, unique_fens, unique_positions, evaluation (against
+Tests/fixtures/stub_engine.py unless --engine is given), merge_data and the
+DuckDB star-schema load in sequence on a deterministic corpus, and reports
+rows/sec and peak RSS per stage. Results are compared with a stored
+baseline for the same corpus and settings; a stage slower (or bigger) than
+the baseline by more than --tolerance is a regression and makes the run
+exit with status 1.
+
+Usage:
+    python Benchmarks/run_benchmarks.py --games 2000                 # compare with Benchmarks/baseline.json
+    python Benchmarks/run_benchmarks.py --games 2000 --save-baseline # record a new baseline
+    python Benchmarks/run_benchmarks.py --games 500 --chess960-share 0.5 --workers 4 --output run.json
+"""
+
+import contextlib
+import io
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+import duckdb
+
+from Benchmarks.synthetic_pgn import add_corpus_arguments, corpus_config, write_corpus
+from Ingestion.metadata import MetaData
+from Ingestion.movedata import MoveData
+from Processing.unique_fen import unique_fens, unique_positions, repopulate_position_evals
+from Processing.merge_data import merge_data
+from Processing.cleanmove import convert_color
+from Processing.load_duckdb import load_star_schema
+from Processing.instrumentation import reset_peak_rss, peak_rss_mb
+import Processing.add_eval as add_eval
+
+BASELINE_PATH = "Benchmarks/baseline.json"
+STUB_ENGINE = "Tests/fixtures/stub_engine.py"
+
+# Peak RSS may grow this many MB over the baseline before it counts, on top of --tolerance
+RSS_SLACK_MB = 16.0
+
+
+def time_stage(func, repeat: int = 1, verbose: bool = False) -> tuple:
+    """
+    Run func repeat times and measure the fastest run.
+
+    Returns:
+    --------
+    tuple
+        (result of the last run, stats dict with 'rows', 'seconds',
+        'rows_per_sec' and 'peak_rss_mb'); func returns (result, rows)
+    """
+    best = None
+    peak = None
+    for _ in range(repeat):
+        reset = reset_peak_rss()
+        quiet = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        start = time.perf_counter()
+        with quiet:
+            result, rows = func()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+        rss = peak_rss_mb()
+        # Without a reset the counter is the whole process' peak so far
+        peak = rss if reset or peak is None else max(peak, rss or 0)
+
+    return result, {
+        "rows": rows,
+        "seconds": round(best, 4),
+        "rows_per_sec": round(rows / best, 1) if best > 0 else None,
+        "peak_rss_mb": round(peak, 1) if peak is not None else None,
+    }
+
+
+def run_benchmarks(config: dict, depth: int = 8, workers: int = 1, engine: str = None,
+                   repeat: int = 1, verbose: bool = False) -> dict:
+    """
+    Benchmark every stage on the corpus described by config.
+
+    Parameters:
+    -----------
+    config : dict
+        Corpus settings (see Benchmarks.synthetic_pgn.CORPUS_DEFAULTS)
+    depth : int
+        Engine search depth (default: 8)
+    workers : int
+        Engine processes for the evaluation stage (default: 1)
+    engine : str, optional
+        UCI engine binary; defaults to the stub engine so only pipeline overhead is measured
+    repeat : int
+        Runs per stage; the fastest counts (default: 1)
+    verbose : bool
+        Show the stages' own output (default: False)
+
+    Returns:
+    --------
+    dict
+        'settings' (corpus, depth, workers, engine), 'environment' and
+        'stages' (stage -> rows, seconds, rows_per_sec, peak_rss_mb)
+    """
+    pgn_path = write_corpus(**config)
+    add_eval.ENGINE_PATH = engine or str(project_root / STUB_ENGINE)
+    stages = {}
+
+    def stage(name, func):
+        result, stats = time_stage(func, repeat, verbose)
+        stages[name] = stats
+        print(f"  {name:<17}{stats['rows']:>10} rows {stats['seconds']:>9.3f}s")
+        return result
+
+    print(f"Benchmarking {pgn_path.name}")
+    meta_df = stage("metadata", lambda: (lambda df: (df, len(df)))(MetaData(pgn_path).df))
+    move_df = stage("movedata", lambda: (lambda df: (df, len(df)))(MoveData(pgn_path).df))
+    stage("unique_fens", lambda: (unique_fens(move_df), len(move_df)))
+    positions = stage("unique_positions", lambda: (unique_positions(move_df), len(move_df)))
+
+    def evaluate():
+        evaluated = add_eval.add_eval_to_positions(positions.copy(), depth=depth, workers=workers)
+        return evaluated, len(evaluated)
+    positions = stage("evaluate", evaluate)
+    move_df = repopulate_position_evals(move_df, positions)
+
+    merged = meta_df.reset_index()
+    stage("merge_data", lambda: (None, len(merge_data(merged, move_df))))
+
+    # Boolean colors, as the pipelines' Gold moves have
+    move_df = convert_color(move_df)
+
+    def load():
+        con = duckdb.connect()
+        try:
+            load_star_schema(con, meta_df, move_df)
+        finally:
+            con.close()
+        return None, len(move_df)
+    stage("duckdb_load", load)
+
+    return {
+        "settings": {"corpus": config, "depth": depth, "workers": workers,
+                     "engine": "stub" if engine is None else Path(engine).name},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "processor": platform.processor() or platform.machine()},
+        "stages": stages,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.2) -> list:
+    """
+    Regressions of results against baseline.
+
+    Parameters:
+    -----------
+    results, baseline : dict
+        Outputs of run_benchmarks
+    tolerance : float
+        Allowed relative drop in rows/sec and growth in peak RSS (default: 0.2)
+
+    Returns:
+    --------
+    list
+        One message per regressed stage metric; empty when nothing regressed
+    """
+    regressions = []
+    for name, stats in results["stages"].items():
+        base = baseline["stages"].get(name)
+        if base is None:
+            continue
+        if base["rows_per_sec"] and stats["rows_per_sec"] is not None \
+                and stats["rows_per_sec"] < base["rows_per_sec"] * (1 - tolerance):
+            regressions.append(f"{name}: {stats['rows_per_sec']:.0f} rows/s vs "
+                               f"{base['rows_per_sec']:.0f} baseline")
+        if base["peak_rss_mb"] is not None and stats["peak_rss_mb"] is not None \
+                and stats["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance) + RSS_SLACK_MB:
+            regressions.append(f"{name}: peak RSS {stats['peak_rss_mb']:.0f} MB vs "
+                               f"{base['peak_rss_mb']:.0f} MB baseline")
+    return regressions
+
+
+def print_report(results: dict, baseline: dict = None) -> None:
+    """Per-stage table, with the change against baseline when there is one."""
+    print(f"\n{'stage':<18}{'rows':>10}{'seconds':>10}{'rows/s':>12}{'peak MB':>10}{'vs base':>10}")
+    for name, stats in results["stages"].items():
+        change = ""
+        base = (baseline or {}).get("stages", {}).get(name)
+        if base and base["rows_per_sec"] and stats["rows_per_sec"]:
+            change = f"{100 * (stats['rows_per_sec'] / base['rows_per_sec'] - 1):+.0f}%"
+        rss = f"{stats['peak_rss_mb']:.0f}" if stats["peak_rss_mb"] is not None else "-"
+        print(f"{name:<18}{stats['rows']:>10}{stats['seconds']:>10.3f}"
+              f"{stats['rows_per_sec'] or 0:>12.0f}{rss:>10}{change:>10}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on a synthetic corpus.")
+    add_corpus_arguments(parser)
+    parser.add_argument("--depth", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=1, help="engine processes for the evaluation stage")
+    parser.add_argument("--engine", default=None, help="UCI engine binary (default: the stub engine)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per stage; the fastest counts")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative slowdown / RSS growth before a stage regresses")
+    parser.add_argument("--output", default=None, help="also write the results to this JSON file")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    config = corpus_config(**{key: getattr(args, key) for key in corpus_config()})
+    results = run_benchmarks(config, args.depth, args.workers, args.engine, args.repeat, args.verbose)
+
+    baseline_path = project_root / Path(args.baseline)
+    baseline = None
+    if baseline_path.exists():
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["settings"] != results["settings"]:
+            print(f"\nBaseline {baseline_path.name} was recorded with other settings; not comparing")
+            baseline = None
+
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+
+    if args.save_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+        print(f"\nSaved baseline to {baseline_path}")
+    elif baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print(f"\nNo regressions against {baseline_path.name} (tolerance {args.tolerance:.0%})")
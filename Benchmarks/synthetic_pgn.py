@@ -0,0 +1,191 @@
+"""
+Deterministic synthetic PGN corpora shaped like Chess.com archives.
+
+Games are random legal move sequences; their first plies come from a small
+pool of opening lines, so positions repeat across games the way real
+openings do and deduplication has something to remove. The same
+configuration always produces the same file, byte for byte.
+
+Usage:
+    from Benchmarks.synthetic_pgn import write_corpus
+    path = write_corpus(games=2000, chess960_share=0.1)
+
+    python Benchmarks/synthetic_pgn.py --games 2000 --output corpus.pgn
+"""
+
+import random
+from pathlib import Path
+
+import chess
+import chess.pgn
+
+CORPUS_DIR = "Benchmarks/corpora"
+
+
+# Corpus shape:
+#   games                  number of games
+#   min_plies, max_plies   game length range in plies
+#   clocks                 add [%clk] annotations
+#   eval_share             share of games with [%eval] annotations
+#   chess960_share         share of Chess960 games
+#   openings               distinct opening lines standard games start from
+#   opening_plies          length of those shared opening lines
+#   seed                   random seed
+CORPUS_DEFAULTS = {
+    "games": 1000,
+    "min_plies": 20,
+    "max_plies": 100,
+    "clocks": True,
+    "eval_share": 0.5,
+    "chess960_share": 0.05,
+    "openings": 40,
+    "opening_plies": 8,
+    "seed": 0,
+}
+
+
+def corpus_config(**overrides) -> dict:
+    """CORPUS_DEFAULTS with overrides applied; unknown keys raise ValueError."""
+    unknown = set(overrides) - set(CORPUS_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown corpus settings: {sorted(unknown)}")
+    return {**CORPUS_DEFAULTS, **overrides}
+
+
+def corpus_name(config: dict) -> str:
+    """File stem that identifies a corpus configuration."""
+    return "synthetic_" + "_".join(str(config[key]) for key in CORPUS_DEFAULTS).replace(".", "p")
+
+
+def _opening_line(opening: int, seed: int, plies: int) -> list:
+    """UCI moves of one shared opening line from the standard start."""
+    rng = random.Random(f"{seed}-opening-{opening}")
+    board = chess.Board()
+    moves = []
+    for _ in range(plies):
+        legal = sorted(board.legal_moves, key=lambda move: move.uci())
+        if not legal:
+            break
+        move = rng.choice(legal)
+        moves.append(move)
+        board.push(move)
+    return moves
+
+
+def _format_clock(tenths: int) -> str:
+    seconds = tenths / 10
+    return f"{int(seconds // 3600)}:{int(seconds % 3600 // 60):02d}:{seconds % 60:04.1f}"
+
+
+def generate_games(**config):
+    """Yield the games of a corpus (settings as in CORPUS_DEFAULTS) as chess.pgn.Game objects."""
+    config = corpus_config(**config)
+    rng = random.Random(config["seed"])
+    openings = [_opening_line(i, config["seed"], config["opening_plies"]) for i in range(config["openings"])]
+    time_controls = [("180+2", 1800, 20), ("600", 6000, 0), ("60", 600, 0), ("300+5", 3000, 50)]
+
+    for g in range(config["games"]):
+        chess960 = rng.random() < config["chess960_share"]
+        if chess960:
+            board = chess.Board.from_chess960_pos(rng.randrange(960))
+            line = []
+        else:
+            board = chess.Board()
+            line = openings[rng.randrange(len(openings))] if openings else []
+
+        time_control, base, increment = time_controls[rng.randrange(len(time_controls))]
+        day = g % 28 + 1
+        game = chess.pgn.Game()
+        game.headers.update({
+            "Event": "Live Chess", "Site": "Chess.com", "Date": f"2025.01.{day:02d}",
+            "White": "stak1" if g % 2 else f"opp{g}", "Black": f"opp{g}" if g % 2 else "stak1",
+            "Result": rng.choice(["1-0", "0-1", "1/2-1/2"]),
+            "WhiteElo": str(1200 + rng.randrange(800)), "BlackElo": str(1200 + rng.randrange(800)),
+            "TimeControl": time_control, "ECO": rng.choice(["A00", "B01", "C20", "D02", "E60"]),
+            "UTCDate": f"2025.01.{day:02d}", "UTCTime": "12:00:00", "StartTime": "12:00:00",
+            "EndDate": f"2025.01.{day:02d}", "EndTime": "12:10:00",
+            "Link": f"https://www.chess.com/game/live/{1000 + g}",
+            "Termination": "stak1 won by resignation",
+        })
+        if chess960:
+            game.headers["Variant"] = "Chess960"
+            game.setup(board)
+
+        with_evals = rng.random() < config["eval_share"]
+        clocks = [base, base]
+        node = game
+        for ply in range(rng.randint(config["min_plies"], config["max_plies"])):
+            if ply < len(line):
+                move = line[ply]
+            else:
+                legal = list(board.legal_moves)
+                if not legal:
+                    break
+                move = legal[rng.randrange(len(legal))]
+
+            side = 0 if board.turn else 1
+            clocks[side] = max(clocks[side] - rng.randrange(60) + increment, 0)
+            node = node.add_variation(move)
+
+            comments = []
+            if config["clocks"]:
+                comments.append(f"[%clk {_format_clock(clocks[side])}]")
+            if with_evals:
+                comments.append(f"[%eval #{rng.randint(-5, 5) or 1}]" if rng.random() < 0.02
+                                else f"[%eval {rng.uniform(-3, 3):.2f}]")
+            node.comment = " ".join(comments)
+            board.push(move)
+
+        yield game
+
+
+def write_corpus(path: str = None, **config) -> Path:
+    """
+    Write a corpus (settings as in CORPUS_DEFAULTS) to path, reusing an
+    existing file for the same configuration.
+
+    Parameters:
+    -----------
+    path : str, optional
+        Output file (default: Benchmarks/corpora/<corpus_name>.pgn)
+
+    Returns:
+    --------
+    Path
+        Absolute path of the PGN file
+    """
+    config = corpus_config(**config)
+    project_root = Path(__file__).resolve().parents[1]
+    out = project_root / Path(path or f"{CORPUS_DIR}/{corpus_name(config)}.pgn")
+    if out.exists():
+        return out
+
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_suffix(".pgn.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        for game in generate_games(**config):
+            f.write(f"{game}\n\n")
+    tmp.replace(out)
+    print(f"Wrote {config['games']} synthetic games to {out}")
+    return out
+
+
+def add_corpus_arguments(parser) -> None:
+    """Add one --<setting> option per CORPUS_DEFAULTS entry to an argparse parser."""
+    for key, default in CORPUS_DEFAULTS.items():
+        flag = "--" + key.replace("_", "-")
+        if isinstance(default, bool):
+            parser.add_argument(flag, type=lambda value: value.lower() in ("1", "true", "yes"), default=default)
+        else:
+            parser.add_argument(flag, type=type(default), default=default)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write a deterministic synthetic PGN corpus.")
+    add_corpus_arguments(parser)
+    parser.add_argument("--output", default=None)
+    args = vars(parser.parse_args())
+
+    write_corpus(args.pop("output"), **args)
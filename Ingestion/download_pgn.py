@@ -4,71 +4,320 @@ Usage:
     from download_pgn import download_pgn
     download_pgn('bkchessmaster2')
     download_pgn('bkchessmaster2', start_date='2024-01', end_date='2024-12')
+
+    # Fetch 8 months at a time (api_base can point at a local stub server)
+    download_pgn('bkchessmaster2', max_workers=8, api_base='http://127.0.0.1:8000/pub')
+
+    # Only fetch months/games not seen before; returns Data/Bronze/<user>_new.pgn
+    new_pgn = download_pgn('bkchessmaster2', incremental=True)
+    ...  # parse/load new_pgn with game_ids from load_manifest(user)['loaded'] + 1
+    mark_loaded('bkchessmaster2')
 """
 
+import contextlib
+import json
+import re
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+API_BASE = "https://api.chess.com/pub"
+# Archives, merged PGNs and manifests; tests point it at a temporary directory
+BRONZE_DIR = Path(__file__).resolve().parents[1] / "Data" / "Bronze"
+HEADERS = {"User-Agent": "Mozilla/5.0 (Chess PGN Downloader)"}
+
+GAME_SPLIT_RE = re.compile(r"\n\s*\n(?=\[Event )")
+LINK_RE = re.compile(r'\[Link "([^"]+)"\]')
+
+
+def short_name(username: str) -> str:
+    """Lowercased username truncated to the 8 characters used in file names."""
+    return username.lower()[:8]
+
+
+def manifest_path(username: str) -> Path:
+    """Path of the ingestion manifest for a user."""
+    return BRONZE_DIR / f"{short_name(username)}_manifest.json"
+
+
+def load_manifest(username: str) -> dict:
+    """
+    Load the record of already ingested archives and games.
+
+    Returns:
+    --------
+    dict
+        {'archives': {'YYYY/MM': {'complete': bool, 'games': int, 'etag': str, 'last_modified': str}},
+         'links': [game URLs in game_id order],
+         'loaded': number of leading games already loaded downstream}
+    """
+    path = manifest_path(username)
+    if not path.exists():
+        return {"archives": {}, "links": [], "loaded": 0}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(username: str, manifest: dict) -> None:
+    """Write the manifest atomically so a crash never leaves it half written."""
+    path = manifest_path(username)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    tmp.replace(path)
+
+
+def mark_loaded(username: str) -> None:
+    """
+    Record that every downloaded game has reached Silver/Gold/DuckDB.
+
+    Clears the pending <user>_new.pgn so the next incremental run starts a fresh delta.
+    """
+    manifest = load_manifest(username)
+    manifest["loaded"] = len(manifest["links"])
+    save_manifest(username, manifest)
+
+    new_file = manifest_path(username).with_name(f"{short_name(username)}_new.pgn")
+    new_file.unlink(missing_ok=True)
+
+
+def make_session(pool_size: int = 8, retries: int = 5, backoff: float = 1.0) -> requests.Session:
+    """
+    HTTP session with a shared connection pool and retry/backoff on 429 and 5xx.
+
+    Retry-After headers sent with 429/503 responses are honoured.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def fetch_archive(session: requests.Session, archive_url: str, month_file: Path,
+                  validators: dict) -> dict:
+    """
+    Stream one monthly /pgn archive to month_file with a conditional GET.
+
+    Parameters:
+    -----------
+    session : requests.Session
+        Pooled session from make_session
+    archive_url : str
+        Monthly archive URL from the archives endpoint
+    month_file : Path
+        Where the archive is cached on disk
+    validators : dict
+        'etag' / 'last_modified' from the previous download of this month
+
+    Returns:
+    --------
+    dict
+        {'changed': bool, 'etag': str, 'last_modified': str}; 'changed' is False
+        when the server answered 304 and the cached month_file is still current
+    """
+    headers = {}
+    if month_file.exists():
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    with session.get(archive_url + "/pgn", headers=headers, stream=True, timeout=60) as response:
+        if response.status_code == 304:
+            return {"changed": False, **validators}
+        response.raise_for_status()
+
+        # Write to a temp file first so an interrupted download never looks complete
+        tmp = month_file.with_suffix(".part")
+        with open(tmp, "wb") as f:
+            for chunk in response.iter_content(chunk_size=1 << 16):
+                f.write(chunk)
+        tmp.replace(month_file)
+
+        return {
+            "changed": True,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+
+
+def split_games(pgn_text: str) -> list:
+    """Split a monthly archive into one PGN string per game."""
+    return [game.strip() for game in GAME_SPLIT_RE.split(pgn_text) if game.strip()]
 
-def download_pgn(username: str, start_date: str = None, end_date: str = None) -> None:
+
+def game_link(game_pgn: str) -> str:
+    """Game URL from the Link header (falls back to the game text itself)."""
+    match = LINK_RE.search(game_pgn)
+    return match.group(1) if match else game_pgn
+
+
+def download_pgn(username: str, start_date: str = None, end_date: str = None,
+                 incremental: bool = False, max_workers: int = 4,
+                 api_base: str = API_BASE) -> Path:
+    """
+    Download a user's monthly archives into Data/Bronze/<user>.pgn.
+
+    Months are fetched concurrently over one pooled session and streamed to
+    Data/Bronze/<user>/YYYY-MM.pgn. Months fetched before are requested with
+    their ETag/Last-Modified, so unchanged archives are not transferred again.
+
+    Parameters:
+    -----------
+    username : str
+        Chess.com username
+    start_date, end_date : str, optional
+        Inclusive 'YYYY-MM' bounds on the archive months
+    incremental : bool
+        Skip months that were already complete when last ingested, drop games
+        whose URL is in the manifest, append the rest to <user>.pgn and also
+        to the pending <user>_new.pgn, which holds every game not yet passed
+        to mark_loaded (default: False)
+    max_workers : int
+        Number of archives downloaded at once (default: 4)
+    api_base : str
+        Base URL of the public API (default: https://api.chess.com/pub)
+
+    Returns:
+    --------
+    Path
+        <user>.pgn, or <user>_new.pgn in incremental mode
+    """
     username = username.lower()
-    
+
     # Set output directory
-    project_root = Path(__file__).resolve().parents[1]
-    output_dir = project_root / "Data" / "Bronze"
-    output_dir.mkdir(parents=True, exist_ok=True)
-    
+    output_dir = BRONZE_DIR
+    month_dir = output_dir / short_name(username)
+    month_dir.mkdir(parents=True, exist_ok=True)
+
+    session = make_session(pool_size=max_workers)
+
     # Get archive URLs
-    url = f"https://api.chess.com/pub/player/{username}/games/archives"
-    headers = {"User-Agent": "Mozilla/5.0 (Chess PGN Downloader)"}
-    
-    response = requests.get(url, headers=headers)
+    url = f"{api_base}/player/{username}/games/archives"
+    response = session.get(url, timeout=60)
+    response.raise_for_status()
     archives = response.json()['archives']
-    
+
     # Filter by date range if specified
     if start_date is not None or end_date is not None:
         filtered_archives = []
         for archive_url in archives:
             year, month = archive_url.split('/')[-2:]
             archive_period = f"{year}-{month}"
-            
+
             # Check if within range (inclusive)
             if start_date is not None and archive_period < start_date:
                 continue
             if end_date is not None and archive_period > end_date:
                 continue
-            
+
             filtered_archives.append(archive_url)
-        
+
         archives = filtered_archives
-    
+
+    manifest = load_manifest(username)
+    if not incremental:
+        # Full rebuild: keep cache validators, forget which games were ingested
+        manifest = {"archives": manifest["archives"], "links": [], "loaded": 0}
+    seen_links = set(manifest["links"])
+    current_month = datetime.now(timezone.utc).strftime("%Y/%m")
+
+    # Months that had ended when they were ingested cannot gain new games
+    if incremental:
+        archives = [
+            archive_url for archive_url in archives
+            if not manifest["archives"].get("/".join(archive_url.split('/')[-2:]), {}).get("complete")
+        ]
+
     # Reverse to get most recent first
     archives = list(reversed(archives))
+    periods = ["/".join(archive_url.split('/')[-2:]) for archive_url in archives]
+    month_files = [month_dir / f"{period.replace('/', '-')}.pgn" for period in periods]
 
-    all_pgn = []
-    
-    # Download each month
-    for i, archive_url in enumerate(archives, 1):
-        month = archive_url.split('/')[-2:]
-        print(f"[{i}/{len(archives)}] Downloading {month[0]}/{month[1]}...")
-        
-        pgn_url = archive_url + "/pgn"
-        response = requests.get(pgn_url, headers=headers)
-        
-        if response.text.strip():
-            all_pgn.append(response.text)
-    
-    # Save to file
-    username = username.lower()
-    if len(username) > 8:
-        username = username[:8]
+    def fetch(i):
+        print(f"[{i + 1}/{len(archives)}] Downloading {periods[i]}...")
+        return fetch_archive(session, archives[i], month_files[i], manifest["archives"].get(periods[i], {}))
+
+    username = short_name(username)
     output_file = output_dir / f"{username}.pgn"
-    content = "\n\n".join(all_pgn).rstrip() + "\n"
-    
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(content)
-    
+    new_file = output_dir / f"{username}_new.pgn"
+
+    # Append after the games already on disk so existing game_ids stay put
+    appending = incremental and bool(manifest["links"]) and output_file.exists()
+    out = open(output_file, 'a' if appending else 'w', encoding='utf-8')
+    wrote_games = appending and output_file.stat().st_size > 0
+
+    # Games from an earlier run that never reached mark_loaded() stay pending
+    if incremental:
+        delta = open(new_file, 'a', encoding='utf-8')
+        wrote_delta = new_file.stat().st_size > 0
+    else:
+        new_file.unlink(missing_ok=True)
+        delta = None
+
+    new_links = 0
+
+    # Downloads run ahead in the pool; months are written out in order as they finish.
+    # The manifest is saved after every month, so when a later month fails the
+    # games already written are known and a rerun does not write them again
+    with ThreadPoolExecutor(max_workers=max_workers) as pool, out, (delta or contextlib.nullcontext()):
+        for period, month_file, result in zip(periods, month_files, pool.map(fetch, range(len(archives)))):
+            if incremental and not result["changed"]:
+                continue
+
+            with open(month_file, encoding='utf-8', errors='ignore') as f:
+                games = []
+                links = []
+                for game in split_games(f.read()):
+                    link = game_link(game)
+                    if link not in seen_links:
+                        seen_links.add(link)
+                        links.append(link)
+                        games.append(game)
+
+            if games:
+                out.write(("\n\n" if wrote_games else "") + "\n\n".join(games) + "\n")
+                out.flush()
+                wrote_games = True
+                if incremental:
+                    delta.write(("\n\n" if wrote_delta else "") + "\n\n".join(games) + "\n")
+                    delta.flush()
+                    wrote_delta = True
+
+            previous = manifest["archives"].get(period, {})
+            manifest["archives"][period] = {
+                "complete": period < current_month,
+                "games": (previous.get("games", 0) if incremental else 0) + len(games),
+                "etag": result.get("etag"),
+                "last_modified": result.get("last_modified"),
+            }
+            manifest["links"].extend(links)
+            new_links += len(links)
+            save_manifest(username, manifest)
+
+    session.close()
+    save_manifest(username, manifest)
     print(f"Saved to {output_file}")
 
+    if not incremental:
+        return output_file
+
+    print(f"{new_links} new games saved to {new_file}")
+    return new_file
+
 
 if __name__ == "__main__":
     import sys
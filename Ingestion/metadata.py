@@ -2,6 +2,24 @@ import chess.pgn as ch
 import pandas as pd
 from pathlib import Path
 
+
+def game_headers(headers: ch.Headers, game_id: int) -> dict:
+    """Convert PGN headers into a metadata row tagged with game_id."""
+    row = dict(headers)
+    row["game_id"] = game_id
+    return row
+
+
+def metadata_frame(metadata_list: list) -> pd.DataFrame:
+    """Build the metadata DataFrame from per-game header rows."""
+    if not metadata_list:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(metadata_list)
+    df.set_index("game_id", inplace=True)
+    return df
+
+
 class MetaData:
     """
     Extract game-level metadata from a PGN file and store as DataFrame.
@@ -10,32 +28,35 @@ class MetaData:
         self.project_root = Path(__file__).resolve().parents[1]
         self.pgn_path = self.project_root / Path(pgn_path)
         self.df = self._extract_metadata()
-    
+
+    @classmethod
+    def from_df(cls, pgn_path: str, df: pd.DataFrame) -> "MetaData":
+        """Wrap metadata rows already extracted from pgn_path (see PGNData)."""
+        obj = cls.__new__(cls)
+        obj.project_root = Path(__file__).resolve().parents[1]
+        obj.pgn_path = obj.project_root / Path(pgn_path)
+        obj.df = df
+        return obj
+
     def _extract_metadata(self) -> pd.DataFrame:
         """Read the PGN file and extract metadata for all games."""
         metadata_list = []
-        
+
         with open(self.pgn_path, encoding="utf-8", errors="ignore") as pgn:
             game_id = 1
             while True:
-                game = ch.read_game(pgn)
-                if game is None:
+                # Headers only: skips building the move tree
+                headers = ch.read_headers(pgn)
+                if headers is None:
                     break
-                
-                headers = dict(game.headers)
-                headers["game_id"] = game_id
+
+                metadata_list.append(game_headers(headers, game_id))
                 game_id += 1
-                metadata_list.append(headers)
-        
-        if not metadata_list:
-            return pd.DataFrame()
-        
-        df = pd.DataFrame(metadata_list)
-        df.set_index("game_id", inplace=True)
-        return df
-    
+
+        return metadata_frame(metadata_list)
+
     def save_csv(self, output_path: str) -> None:
         """Save metadata as CSV to Data/Silver directory."""
-        
+
         self.df.to_csv(output_path, index=True)
         print(f"Saved to {output_path}")
\ No newline at end of file
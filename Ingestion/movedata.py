@@ -1,24 +1,336 @@
+import re
+from array import array
 import chess
 import chess.pgn as ch
+import chess.polyglot
+import duckdb
+import numpy as np
 import pandas as pd
 from pathlib import Path
+from typing import Iterator
+
+
+CLK_RE = re.compile(r"\[%clk\s*([0-9:.]+)\]")
+EVAL_RE = re.compile(r"\[%eval\s*([#\-\d\.]+)\]")
+MOVE_COLUMNS = ["game_id", "ply", "color", "move", "clock", "eval", "fen", "position_key"]
+
+# One row per ply for Processing.position_index: the position_key plus four
+# bitboards (bit i = square i, a1 = 0) describing pawn structure and piece placement
+SIGNATURE_WORDS = ["white_pawns", "black_pawns", "white_pieces", "black_pieces"]
+SIGNATURE_DTYPE = np.dtype(
+    [("key", "<u8")] + [(word, "<u8") for word in SIGNATURE_WORDS] + [("game_id", "<u4"), ("ply", "<u2")]
+)
+
+# DataFrame.attrs flag: FENs came from board.fen() of legally played games, so
+# evaluation can skip revalidating them (see Processing.add_eval)
+TRUSTED_FENS = "trusted_fens"
+
+# Fixed column types for streamed batches, so every Parquet part / insert has the same schema
+BATCH_SELECT = """
+    SELECT
+        CAST(game_id AS INTEGER) AS game_id,
+        CAST(ply AS SMALLINT) AS ply,
+        CAST(color AS VARCHAR) AS color,
+        CAST(move AS VARCHAR) AS move,
+        CAST(clock AS VARCHAR) AS clock,
+        CAST(eval AS VARCHAR) AS eval,
+        CAST(fen AS VARCHAR) AS fen,
+        CAST(position_key AS UBIGINT) AS position_key
+    FROM batch_df
+"""
+
+
+def board_signature(board: chess.Board) -> tuple:
+    """Pawn and non-pawn piece bitboards of each side, in SIGNATURE_WORDS order."""
+    white, black = board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK]
+    return (board.pawns & white, board.pawns & black, white & ~board.pawns, black & ~board.pawns)
+
+
+def clock_seconds(clock) -> np.ndarray:
+    """
+    Parse 'H:MM:SS.s' clock strings to float seconds, NaN where missing.
+
+    The strings are joined into one byte buffer and gathered into a
+    right-aligned byte matrix, which is scanned one character column at a
+    time: a handful of array passes instead of a Python call per row.
+    """
+    values = pd.Series(clock, dtype=object).values
+    n = len(values)
+    if n == 0:
+        return np.empty(0)
+
+    strings = [c if isinstance(c, str) else "" for c in values]
+    buf = np.frombuffer(("\n".join(strings) + "\n").encode("ascii", "replace"), dtype=np.uint8)
+    ends = np.flatnonzero(buf == 10)
+    lengths = ends - np.r_[0, ends[:-1] + 1]
+
+    # Column j of row r holds the byte width - j before the row's newline; zero padding on the left
+    offsets = np.arange(-int(lengths.max()), 0)
+    chars = np.where(offsets >= -lengths[:, None], buf[np.maximum(ends[:, None] + offsets, 0)], 0)
+
+    total = np.zeros(n)        # completed fields, carried forward in base 60
+    current = np.zeros(n)      # integer digits of the field being read
+    fraction = np.zeros(n)
+    scale = np.zeros(n)        # 0 before the decimal point, then 0.1, 0.01, ...
+
+    for column in chars.T:
+        value = column.astype(np.float64) - 48
+        digit = (value >= 0) & (value <= 9)
+        decimal = digit & (scale > 0)
+        current = np.where(digit & ~decimal, current * 10 + value, current)
+        fraction = np.where(decimal, fraction + value * scale, fraction)
+        scale = np.where(decimal, scale / 10, np.where(column == 46, 0.1, scale))
+
+        colon = column == 58
+        total = np.where(colon, (total + current) * 60, total)
+        current = np.where(colon, 0, current)
+
+    seconds = total + current + fraction
+    seconds[lengths == 0] = np.nan
+    return seconds
+
+
+def clock_to_deciseconds(clock: pd.Series) -> pd.Series:
+    """Convert 'H:MM:SS.s' clock strings to nullable integer deciseconds."""
+    seconds = pd.Series(clock_seconds(clock), index=clock.index)
+    return (seconds * 10).round().astype("Int32")
+
+
+def parse_annotations(comments) -> tuple:
+    """
+    Vectorised [%clk] / [%eval] extraction from per-ply move comments.
+
+    Returns:
+    --------
+    tuple
+        (clock, eval) object Series: clock as 'H:MM:SS.s' strings, eval as
+        pawn floats or 'M<n>' mate strings; None where the comment has no value
+    """
+    comments = pd.Series(comments, dtype=object)
+    clock = comments.str.extract(CLK_RE, expand=False)
+    raw_eval = comments.str.extract(EVAL_RE, expand=False)
+
+    is_mate = raw_eval.str.startswith("#", na=False).astype(bool)
+    pawns = pd.to_numeric(raw_eval.where(~is_mate), errors="coerce")
+    evals = pawns.astype(object).where(pawns.notna(), None)
+    evals[is_mate] = "M" + raw_eval[is_mate].str[1:]  # mate in N
+
+    return clock.astype(object).where(clock.notna(), None), evals
+
+
+class MoveBuffers:
+    """
+    Column buffers for ply rows, filled one game at a time.
+
+    game_id and ply are not stored per ply: each game records its id and ply
+    count, and the columns are expanded with np.repeat when the frame is built.
+
+    position_key is the 64-bit polyglot Zobrist hash of the position after the
+    move. It ignores the halfmove/fullmove counters, so transpositions that
+    differ only in move counters share a key. With signatures=True the
+    board_signature words of the same position are kept flat in an unsigned
+    64-bit array (8 bytes per word rather than a Python int each) for
+    signatures(); they cost about 3% of the parse, so only buffers whose
+    caller keeps them record them.
+    """
+
+    def __init__(self, signatures: bool = False):
+        self.game_ids = []
+        self.counts = []
+        self.color = []
+        self.move = []
+        self.comment = []
+        self.fen = []
+        self.position_key = []
+        self.signature = array("Q") if signatures else None
+
+    def __len__(self) -> int:
+        return len(self.fen)
+
+    def add_game(self, game: ch.Game, game_id: int) -> None:
+        """Append one row per ply of a parsed game."""
+        board = game.board()
+        n_plies = 0
+
+        for node in game.mainline():
+            if node.move is None:
+                continue
+
+            move = node.move
+            self.move.append(board.san(move))
+
+            # Detect color BEFORE pushing the move
+            self.color.append(board.turn == chess.WHITE)
+
+            # Clock and eval annotations are parsed in bulk when the frame is built
+            self.comment.append(node.comment or None)
+
+            # Apply move first, then get FEN after move
+            board.push(move)
+            self.fen.append(board.fen())
+            self.position_key.append(chess.polyglot.zobrist_hash(board))
+            if self.signature is not None:
+                self.signature.extend(board_signature(board))
+
+            n_plies += 1
+
+        self.game_ids.append(game_id)
+        self.counts.append(n_plies)
+
+    def extend(self, other: "MoveBuffers", offset: int = 0) -> None:
+        """Append another buffer's rows, shifting its game_ids by offset."""
+        self.game_ids.extend(game_id + offset for game_id in other.game_ids)
+        self.counts.extend(other.counts)
+        self.color.extend(other.color)
+        self.move.extend(other.move)
+        self.comment.extend(other.comment)
+        self.fen.extend(other.fen)
+        self.position_key.extend(other.position_key)
+        if self.signature is not None:
+            self.signature.extend(other.signature)
+
+    def _id_columns(self):
+        """Expand per-game ids and counts into per-ply game_id and ply arrays."""
+        counts = np.asarray(self.counts, dtype=np.int64)
+        game_id = np.repeat(np.asarray(self.game_ids, dtype=np.int64), counts)
+        # 1..n within each game: global position minus the game's starting position
+        starts = np.repeat(np.cumsum(counts) - counts, counts)
+        ply = np.arange(len(game_id), dtype=np.int64) - starts + 1
+        return game_id, ply
+
+    def signatures(self) -> np.ndarray:
+        """Position signatures of every ply as a SIGNATURE_DTYPE array, in ply order (None if not recorded)."""
+        if self.signature is None:
+            return None
+
+        out = np.empty(len(self.fen), dtype=SIGNATURE_DTYPE)
+        if not self.fen:
+            return out
+
+        game_id, ply = self._id_columns()
+        words = np.frombuffer(self.signature, dtype=np.uint64).reshape(-1, len(SIGNATURE_WORDS))
+        out["key"] = np.asarray(self.position_key, dtype=np.uint64)
+        for i, word in enumerate(SIGNATURE_WORDS):
+            out[word] = words[:, i]
+        out["game_id"] = game_id
+        out["ply"] = ply
+        return out
+
+    def frame(self) -> pd.DataFrame:
+        """Move DataFrame with the original object-dtype columns."""
+        if not self.fen:
+            return pd.DataFrame()
+
+        game_id, ply = self._id_columns()
+        clock, evals = parse_annotations(self.comment)
+        df = pd.DataFrame({
+            "game_id": game_id,
+            "ply": ply,
+            "color": np.where(self.color, "white", "black").astype(object),
+            "move": self.move,
+            "clock": clock.values,
+            "eval": evals.values,
+            "fen": self.fen,
+            "position_key": np.asarray(self.position_key, dtype=np.uint64),
+        })[MOVE_COLUMNS]
+        df.attrs[TRUSTED_FENS] = True
+        return df
+
+    def compact_frame(self):
+        """
+        Memory-efficient move DataFrame plus its FEN dictionary.
+
+        Returns:
+        --------
+        tuple
+            (df, positions): df has uint32 game_id, uint16 ply, bool color
+            (True = white), categorical move, Int32 clock in deciseconds,
+            Int16 eval_cp (centipawns), Int16 eval_mate and uint32 position_id;
+            positions has one row per distinct position_key, indexed by
+            position_id, with the key and the first FEN seen for it
+        """
+        if not self.fen:
+            return pd.DataFrame(), pd.DataFrame(columns=["position_key", "fen"])
+
+        game_id, ply = self._id_columns()
+        clock, raw_eval = parse_annotations(self.comment)
+
+        # Mixed float / 'M<n>' evals: numbers parse as centipawns, the rest are mates
+        pawns = pd.to_numeric(raw_eval, errors="coerce")
+        mates = pd.to_numeric(raw_eval.where(pawns.isna()).str[1:], errors="coerce")
+
+        position_id, keys = pd.factorize(np.asarray(self.position_key, dtype=np.uint64))
+        _, first_row = np.unique(position_id, return_index=True)
+
+        df = pd.DataFrame({
+            "game_id": game_id.astype(np.uint32),
+            "ply": ply.astype(np.uint16),
+            "color": np.asarray(self.color, dtype=bool),
+            "move": pd.Categorical(self.move),
+            "clock": clock_to_deciseconds(clock).values,
+            "eval_cp": (pawns * 100).round().clip(-32767, 32767).astype("Int16").values,
+            "eval_mate": mates.astype("Int16").values,
+            "position_id": position_id.astype(np.uint32),
+        })
+        positions = pd.DataFrame({
+            "position_key": keys,
+            "fen": np.asarray(self.fen, dtype=object)[first_row],
+        })
+        positions.index.name = "position_id"
+        df.attrs[TRUSTED_FENS] = True
+        positions.attrs[TRUSTED_FENS] = True
+        return df, positions
 
 
 class MoveData:
     """
     Extract move-level data from a PGN file.
     Each row = one ply (half-move).
+
+    With compact=True, df uses the compact typed schema from
+    MoveBuffers.compact_frame and the FENs live once each in self.positions.
+
+    With signatures=True, signatures holds each ply's position signature
+    (MoveBuffers.signatures) for Processing.position_index; otherwise None.
+
+    With stream=True nothing is extracted up front (df is None); use
+    iter_batches, write_parquet or to_duckdb to process the file in
+    fixed-size batches with flat memory use.
     """
 
-    def __init__(self, pgn_path: str):
+    def __init__(self, pgn_path: str, compact: bool = False, stream: bool = False,
+                 signatures: bool = False):
         self.project_root = Path(__file__).resolve().parents[1]
         self.pgn_path = self.project_root / Path(pgn_path)
-        self.df = self._extract_moves()
+        self.positions = None
+        self.signatures = None
+        self.df = None
+        if stream:
+            return
+
+        buffers = self._extract_moves(signatures)
+        self.signatures = buffers.signatures()
+        if compact:
+            self.df, self.positions = buffers.compact_frame()
+        else:
+            self.df = buffers.frame()
+
+    @classmethod
+    def from_df(cls, pgn_path: str, df: pd.DataFrame, positions: pd.DataFrame = None,
+                signatures: np.ndarray = None) -> "MoveData":
+        """Wrap move rows already extracted from pgn_path (see PGNData)."""
+        obj = cls.__new__(cls)
+        obj.project_root = Path(__file__).resolve().parents[1]
+        obj.pgn_path = obj.project_root / Path(pgn_path)
+        obj.df = df
+        obj.positions = positions
+        obj.signatures = signatures
+        return obj
 
     # ---------------------------------------------------------
-    def _extract_moves(self) -> pd.DataFrame:
-        moves_list = []
-        
+    def _extract_moves(self, signatures: bool = False) -> MoveBuffers:
+        buffers = MoveBuffers(signatures)
+
         with open(self.pgn_path, encoding="utf-8", errors="ignore") as pgn:
 
             game_id = 1  # match MetaData integer game_id
@@ -28,75 +340,107 @@ class MoveData:
                 if game is None:
                     break
 
-                board = game.board()
-                ply = 1
-
-                for node in game.mainline():
-                    if node.move is None:
-                        continue
-
-                    move = node.move
-                    san = board.san(move)
-
-                    # Detect color BEFORE pushing the move
-                    color = "white" if board.turn == chess.WHITE else "black"
-
-                    # Extract clock and eval annotations if present
-                    clock = None
-                    eval = None
-
-                    if node.comment:
-                        import re
-                        clk_match = re.search(r"\[%clk\s*([0-9:.]+)\]", node.comment)
-                        if clk_match:
-                            clock = clk_match.group(1)
-                        eval_match = re.search(r"\[%eval\s*([#\-\d\.]+)\]", node.comment)
-                        if eval_match:
-                            eval_str = eval_match.group(1)
-                            if eval_str.startswith("#"):
-                                eval = f"M{eval_str[1:]}"  # mate in N
-                            else:
-                                try:
-                                    eval = float(eval_str)
-                                except ValueError:
-                                    eval = None
-
-                    # Apply move first, then get FEN after move
-                    board.push(move)
-                    fen_after = board.fen()
-
-                    # Store row
-                    moves_list.append({
-                        "game_id": game_id,
-                        "ply": ply,
-                        "color": color,
-                        "move": san,
-                        "clock": clock,
-                        "eval": eval,
-                        "fen": fen_after,
-                    })
-
-                    ply += 1
+                buffers.add_game(game, game_id)
+                game_id += 1
+
+        return buffers
 
+    # ---------------------------------------------------------
+    def iter_batches(self, batch_size: int = 100_000, first_game_id: int = 1) -> Iterator[pd.DataFrame]:
+        """
+        Stream the PGN and yield move DataFrames of about batch_size plies.
+
+        Batches end on game boundaries, so a batch can exceed batch_size by
+        at most one game's plies; only one batch is held in memory at a time.
+
+        Parameters:
+        -----------
+        batch_size : int
+            Plies per batch (default: 100000)
+        first_game_id : int
+            game_id of the first game (default: 1)
+
+        Yields:
+        -------
+        pd.DataFrame
+            Move rows with the same columns as df
+        """
+        buffers = MoveBuffers()
+
+        with open(self.pgn_path, encoding="utf-8", errors="ignore") as pgn:
+            game_id = first_game_id
+            while True:
+                game = ch.read_game(pgn)
+                if game is None:
+                    break
+
+                buffers.add_game(game, game_id)
                 game_id += 1
-        
-        if not moves_list:
-            return pd.DataFrame()
 
-        df = pd.DataFrame(moves_list)
+                if len(buffers) >= batch_size:
+                    yield buffers.frame()
+                    buffers = MoveBuffers()
 
-        # Sorting ensures stable ordering
-        df.sort_values(by=["game_id", "ply"], inplace=True)
+        if len(buffers):
+            yield buffers.frame()
 
-        # Reorder columns
-        desired_order = ["game_id", "ply", "color", "move", "clock", "eval", "fen"]
-        df = df[desired_order]
+    # ---------------------------------------------------------
+    def write_parquet(self, output_dir: str, batch_size: int = 100_000,
+                      first_game_id: int = 1) -> int:
+        """
+        Stream move rows to output_dir/part-NNNNN.parquet, one file per batch.
 
-        return df
+        Read back with DuckDB: SELECT * FROM read_parquet('output_dir/*.parquet').
+
+        Returns:
+        --------
+        int
+            Number of plies written
+        """
+        output_dir = self.project_root / Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        for old_part in output_dir.glob("part-*.parquet"):
+            old_part.unlink()
+
+        con = duckdb.connect()
+        total = 0
+        for i, batch_df in enumerate(self.iter_batches(batch_size, first_game_id)):
+            con.register("batch_df", batch_df)
+            con.execute(f"COPY ({BATCH_SELECT}) TO '{output_dir / f'part-{i:05d}.parquet'}' (FORMAT PARQUET);")
+            con.unregister("batch_df")
+            total += len(batch_df)
+        con.close()
+
+        print(f"Saved {total} moves to {output_dir}")
+        return total
+
+    # ---------------------------------------------------------
+    def to_duckdb(self, con: duckdb.DuckDBPyConnection, table: str = "moves_raw",
+                  batch_size: int = 100_000, first_game_id: int = 1) -> int:
+        """
+        Stream move rows straight into a DuckDB table, replacing it.
+
+        Returns:
+        --------
+        int
+            Number of plies inserted
+        """
+        total = 0
+        for batch_df in self.iter_batches(batch_size, first_game_id):
+            con.register("batch_df", batch_df)
+            if total == 0:
+                con.execute(f"CREATE OR REPLACE TABLE {table} AS {BATCH_SELECT};")
+            else:
+                con.execute(f"INSERT INTO {table} {BATCH_SELECT};")
+            con.unregister("batch_df")
+            total += len(batch_df)
+
+        print(f"Inserted {total} moves into {table}")
+        return total
 
     # ---------------------------------------------------------
     def save_csv(self, output_path: str) -> None:
         """Save move data as CSV to Data/Raw directory."""
-        
+
         self.df.to_csv(output_path, index=False)
-        print(f"Saved to {output_path}")
\ No newline at end of file
+        print(f"Saved to {output_path}")
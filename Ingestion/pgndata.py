@@ -0,0 +1,200 @@
+"""
+Single-pass PGN extraction shared by MetaData and MoveData.
+
+Usage:
+    from Ingestion.pgndata import PGNData
+    pgn_data = PGNData('Data/Bronze/stak1.pgn')
+    meta_parser = pgn_data.metadata
+    move_parser = pgn_data.movedata
+
+    # Parse byte-range shards in 8 processes (same game_ids as serial)
+    pgn_data = PGNData('Data/Bronze/stak1.pgn', workers=8)
+
+    # Compact typed moves; each position's key and FEN stored once in pgn_data.positions
+    pgn_data = PGNData('Data/Bronze/stak1.pgn', compact=True)
+
+    # Per-ply position signatures for Processing.position_index
+    signatures = pgn_data.signatures
+
+    # Skip the signatures when nothing indexes them
+    pgn_data = PGNData('Data/Bronze/stak1.pgn', signatures=False)
+"""
+
+import io
+import os
+import chess.pgn as ch
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+from Ingestion.metadata import MetaData, game_headers, metadata_frame
+from Ingestion.movedata import MoveData, MoveBuffers
+
+
+GAME_START = b"[Event "
+
+
+def _iter_stream(pgn, buffers: MoveBuffers, first_game_id: int = 1) -> Iterator[dict]:
+    """Yield the header row of every game in an open text stream, filling buffers with its plies."""
+    game_id = first_game_id
+    while True:
+        game = ch.read_game(pgn)
+        if game is None:
+            break
+
+        buffers.add_game(game, game_id)
+        yield game_headers(game.headers, game_id)
+        game_id += 1
+
+
+def iter_games(pgn_path: str, buffers: MoveBuffers, first_game_id: int = 1) -> Iterator[dict]:
+    """
+    Stream a PGN file once, yielding each game's header row while its ply
+    rows are appended to the column buffers.
+
+    Both carry the same integer game_id, starting at first_game_id.
+
+    Parameters:
+    -----------
+    pgn_path : str
+        Path to the PGN file
+    buffers : MoveBuffers
+        Column buffers that receive the ply rows
+    first_game_id : int
+        game_id of the first game, e.g. to continue after previously loaded games (default: 1)
+
+    Yields:
+    -------
+    dict
+        Header row for each game in file order
+    """
+    with open(pgn_path, encoding="utf-8", errors="ignore") as pgn:
+        yield from _iter_stream(pgn, buffers, first_game_id)
+
+
+def shard_pgn(pgn_path: str, n_shards: int) -> List[Tuple[int, int]]:
+    """
+    Split a PGN file into byte ranges that each start on a game boundary.
+
+    Boundaries are the first '[Event ' line at or after each evenly spaced
+    byte offset, so no game is cut in half.
+
+    Parameters:
+    -----------
+    pgn_path : str
+        Path to the PGN file
+    n_shards : int
+        Target number of shards (fewer are returned for small files)
+
+    Returns:
+    --------
+    list
+        (start, end) byte offsets covering the whole file in order
+    """
+    size = os.path.getsize(pgn_path)
+    starts = [0]
+
+    with open(pgn_path, "rb") as f:
+        for k in range(1, n_shards):
+            target = size * k // n_shards
+            if target <= starts[-1]:
+                continue
+
+            # Skip the partial line, then scan forward to the next game header
+            f.seek(target - 1)
+            f.readline()
+            offset = f.tell()
+            line = f.readline()
+            while line and not line.startswith(GAME_START):
+                offset = f.tell()
+                line = f.readline()
+
+            if line and offset > starts[-1]:
+                starts.append(offset)
+
+    ends = starts[1:] + [size]
+    return list(zip(starts, ends))
+
+
+def _parse_shard(args: Tuple[str, int, int, bool]) -> Tuple[list, MoveBuffers]:
+    """Parse one byte range; game_ids restart at 1 within the shard."""
+    pgn_path, start, end, signatures = args
+    with open(pgn_path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8", errors="ignore")
+
+    buffers = MoveBuffers(signatures)
+    metadata_list = list(_iter_stream(io.StringIO(text), buffers))
+
+    return metadata_list, buffers
+
+
+class PGNData:
+    """
+    Extract game-level and move-level data from a PGN file in one pass.
+
+    With workers > 1 the file is split at game boundaries and the shards are
+    parsed in a process pool; game_ids match the serial output exactly.
+    Numbering starts at first_game_id so a delta file can continue existing ids.
+    With compact=True, moves_df uses the compact typed schema and each
+    position's key and FEN are kept once in self.positions (see MoveBuffers.compact_frame).
+    self.signatures holds the per-ply position signatures (see MoveBuffers.signatures),
+    or None with signatures=False.
+    """
+    def __init__(self, pgn_path: str, workers: int = 1, first_game_id: int = 1,
+                 compact: bool = False, signatures: bool = True):
+        self.project_root = Path(__file__).resolve().parents[1]
+        self.pgn_path = self.project_root / Path(pgn_path)
+        self.workers = workers
+        self.first_game_id = first_game_id
+        self.record_signatures = signatures
+        self.positions = None
+
+        metadata_list, buffers = self._extract()
+        self.meta_df = metadata_frame(metadata_list)
+        self.signatures = buffers.signatures()
+        if compact:
+            self.moves_df, self.positions = buffers.compact_frame()
+        else:
+            self.moves_df = buffers.frame()
+
+    def _extract(self):
+        """Read every game once into header rows and move column buffers."""
+        if self.workers > 1:
+            return self._extract_parallel()
+
+        buffers = MoveBuffers(self.record_signatures)
+        metadata_list = list(iter_games(self.pgn_path, buffers, self.first_game_id))
+
+        return metadata_list, buffers
+
+    def _extract_parallel(self):
+        """Parse shards in a process pool and renumber games globally."""
+        # Several shards per worker keeps the pool busy when games vary in size
+        shards = shard_pgn(self.pgn_path, self.workers * 4)
+        tasks = [(str(self.pgn_path), start, end, self.record_signatures) for start, end in shards]
+
+        metadata_list = []
+        buffers = MoveBuffers(self.record_signatures)
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            for shard_meta, shard_moves in pool.map(_parse_shard, tasks):
+                # Shift shard-local ids past the games already collected
+                offset = self.first_game_id - 1 + len(metadata_list)
+                for row in shard_meta:
+                    row["game_id"] += offset
+
+                metadata_list.extend(shard_meta)
+                buffers.extend(shard_moves, offset)
+
+        return metadata_list, buffers
+
+    @property
+    def metadata(self) -> MetaData:
+        """MetaData view over the extracted header rows."""
+        return MetaData.from_df(self.pgn_path, self.meta_df)
+
+    @property
+    def movedata(self) -> MoveData:
+        """MoveData view over the extracted ply rows."""
+        return MoveData.from_df(self.pgn_path, self.moves_df, self.positions, self.signatures)
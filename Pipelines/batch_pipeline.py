@@ -0,0 +1,339 @@
+"""
+Batch pipeline for many Chess.com accounts. Downloads run in a thread pool and
+hand each finished archive straight to a parser process pool, so downloading
+and parsing overlap. Each parsed user's unique positions join one shared
+evaluation queue, a single worker whose engines evaluate the users in turn;
+positions already evaluated for an earlier user come from the eval cache. A
+user is loaded into their own DuckDB database as soon as their positions are
+evaluated, while the worker moves on to the next user. At most max_parsed
+users' games are held in memory at once, so memory does not grow with the
+number of accounts.
+
+Stage metrics (Processing.instrumentation) are appended to
+Data/Gold/pipeline_runs.jsonl and Data/Gold/pipeline_runs.duckdb; --profile
+writes a cProfile dump per main-process stage to Data/Profiles.
+
+Usage:
+    python Pipelines/batch_pipeline.py stak1 bkchessmaster2 --start-date 2025-01
+
+    from Pipelines.batch_pipeline import run_batch
+    report = run_batch(['stak1', 'bkchessmaster2'], start_date='2025-01')
+"""
+
+# Establish project root and add to PATH
+from pathlib import Path
+import sys
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, (str(project_root)))
+
+# Import dependencies
+import argparse
+import time
+import duckdb
+import pandas as pd
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# Import custom modules
+from Ingestion.download_pgn import download_pgn, load_manifest, mark_loaded, short_name
+from Ingestion.pgndata import PGNData
+from Processing.cleanmeta import remove_unnec, convert_datetime
+from Processing.cleanmove import convert_color
+from Processing.clock_features import add_time_features
+from Processing.unique_fen import unique_positions, repopulate_position_evals
+from Processing.move_quality import add_move_quality, game_accuracy
+from Processing.add_eval import add_eval_to_positions, add_eval_adaptive, protagonist_moves
+from Processing.eval_cache import EvalCache
+from Processing.eval_checkpoint import EvalCheckpoint
+from Processing.opening_index import load_opening_index
+from Processing.append_data import append_csv
+from Processing.load_duckdb import load_star_schema
+from Processing.position_index import PositionIndex
+from Processing.instrumentation import RunMetrics
+
+
+def _parse_user(pgn_file: str, first_game_id: int) -> tuple:
+    """Parser pool task: one user's PGN -> (meta_df, moves_df, signatures, seconds)."""
+    start = time.perf_counter()
+    pgn_data = PGNData(pgn_file, first_game_id=first_game_id)
+    return pgn_data.meta_df, pgn_data.moves_df, pgn_data.signatures, time.perf_counter() - start
+
+
+def _save(df: pd.DataFrame, path: Path, first_game_id: int, index: bool = False) -> None:
+    """
+    Write a fresh CSV for a batch starting at game 1, else append the batch,
+    replacing rows an earlier, interrupted load of it left behind.
+    """
+    if first_game_id > 1:
+        append_csv(df, path, index=index, replace_from=first_game_id)
+    else:
+        df.to_csv(path, index=index)
+
+
+def _load_user(user: str, meta_df: pd.DataFrame, move_df: pd.DataFrame,
+               positions: pd.DataFrame, first_game_id: int, signatures) -> int:
+    """Write one user's Silver/Gold CSVs, DuckDB tables and position index segment; returns loaded plies."""
+    name = short_name(user)
+    silver = project_root / "Data" / "Silver"
+    gold = project_root / "Data" / "Gold"
+
+    _save(meta_df, silver / f"{name}_meta.csv", first_game_id, index=True)
+    _save(move_df, silver / f"{name}_moves.csv", first_game_id)
+
+    meta_df = convert_datetime(remove_unnec(meta_df))
+    _save(meta_df.reset_index(), gold / f"{name}_meta_gold.csv", first_game_id)
+
+    move_df = add_time_features(convert_color(move_df), meta_df)
+    move_df = add_move_quality(repopulate_position_evals(move_df, positions))
+    meta_df = meta_df.join(game_accuracy(move_df))
+    _save(move_df, gold / f"{name}_moves_gold.csv", first_game_id)
+
+    con = duckdb.connect(str(gold / f"{name}.duckdb"))
+    try:
+        load_star_schema(con, meta_df, move_df, append=first_game_id > 1, user=user)
+    finally:
+        con.close()
+
+    PositionIndex().add(name, signatures)
+    mark_loaded(user)
+    return len(move_df)
+
+
+def run_batch(usernames: list, start_date: str = None, end_date: str = None,
+              incremental: bool = True, download_workers: int = 4, parse_workers: int = 2,
+              engine_workers: int = 1, depth: int = 20, eval_budget: float = None,
+              max_parsed: int = None, profile: bool = None) -> dict:
+    """
+    Run download, parse, evaluate and load for many users with bounded concurrency.
+
+    Parameters:
+    -----------
+    usernames : list
+        Chess.com usernames
+    start_date, end_date : str, optional
+        Inclusive 'YYYY-MM' bounds on the archive months
+    incremental : bool
+        Only process games not loaded by an earlier run (default: True)
+    download_workers : int
+        Users downloading at once (default: 4)
+    parse_workers : int
+        Parser processes (default: 2)
+    engine_workers : int
+        Stockfish processes of the shared evaluation worker (default: 1)
+    depth : int
+        Analysis depth (default: 20)
+    eval_budget : float, optional
+        Seconds for all evaluation in the batch; when set, positions are
+        evaluated shallowly and only critical ones are deepened to depth
+        (see add_eval_adaptive), each user getting an equal share of what is
+        left when their turn comes (default: None)
+    max_parsed : int, optional
+        Users whose parsed games are held in memory at once, from parsing to
+        the end of their load; further downloads wait on disk for a slot
+        (default: parse_workers + 2)
+    profile : bool, optional
+        cProfile dump per main-process stage; default from the PIPELINE_PROFILE
+        environment variable
+
+    Returns:
+    --------
+    dict
+        {'users': {user: {'status', 'stage', 'games', 'plies', 'rows'}},
+         'stages': {stage: {'seconds', 'items', 'per_sec'}}, 'run_id': id in pipeline_runs}
+    """
+    for d in ("Bronze", "Silver", "Gold"):
+        (project_root / "Data" / d).mkdir(parents=True, exist_ok=True)
+
+    status = {user: {"status": "pending", "stage": None, "games": 0, "plies": 0, "rows": 0}
+              for user in usernames}
+    stages = {stage: {"seconds": 0.0, "items": 0} for stage in ("download", "parse", "evaluate", "load")}
+    metrics = RunMetrics("batch", profile=profile)
+    max_parsed = max_parsed or parse_workers + 2
+
+    gold = project_root / "Data" / "Gold"
+    cache = EvalCache(gold / "eval_cache.duckdb")
+    opening_index = load_opening_index(gold / "opening_index")
+    # Users not yet evaluated, for each user's share of eval_budget
+    unevaluated = set(usernames)
+    budget = {"left": eval_budget}
+
+    def download(user):
+        start = time.perf_counter()
+        pgn_file = download_pgn(user, start_date=start_date, end_date=end_date, incremental=incremental)
+        first_game_id = load_manifest(user)["loaded"] + 1 if incremental else 1
+        return pgn_file, first_game_id, time.perf_counter() - start
+
+    def evaluate(user, meta_df, moves_df):
+        """Evaluation worker task: one user's new unique positions, deduplicated against the cache."""
+        start = time.perf_counter()
+        positions = unique_positions(moves_df[["position_key", "fen", "ply"]])
+        metrics.record("dedup", time.perf_counter() - start, rows_in=len(moves_df),
+                       rows_out=len(positions), user=user)
+
+        counters = {}
+        try:
+            if budget["left"] is None:
+                # An interrupted user resumes from the checkpoint; it is dropped once the cache has the evals
+                checkpoint = EvalCheckpoint(gold / "batch_evals.ckpt", depth=depth)
+                positions = add_eval_to_positions(positions, depth=depth, workers=engine_workers, cache=cache,
+                                                  index=opening_index, checkpoint=checkpoint, stats=counters)
+                checkpoint.remove()
+            else:
+                share = max(budget["left"], 0.0) / max(len(unevaluated), 1)
+                # The user's own moves are the critical ones in their games
+                positions, _ = add_eval_adaptive(positions, moves_df, time_budget=share, deep_depth=depth,
+                                                 workers=engine_workers, cache=cache, index=opening_index,
+                                                 protagonist=protagonist_moves(moves_df, meta_df, user),
+                                                 stats=counters)
+                budget["left"] -= time.perf_counter() - start
+        except Exception as e:
+            metrics.record("evaluate", time.perf_counter() - start, rows_in=len(positions), user=user,
+                           status=f"failed: {type(e).__name__}", **counters)
+            raise
+        unevaluated.discard(user)
+
+        seconds = time.perf_counter() - start
+        metrics.record("evaluate", seconds, rows_in=len(positions), rows_out=len(positions),
+                       user=user, **counters)
+        return positions, seconds
+
+    def fail(user, stage, err):
+        status[user].update(status=f"failed: {err}", stage=stage)
+        unevaluated.discard(user)
+        print(f"{user}: {stage} failed: {err}")
+
+    # Downloaded PGNs waiting for a parse slot, and the running tasks: future -> (stage, user, data)
+    downloaded = deque()
+    futures = {}
+    in_memory = 0
+
+    try:
+        with ThreadPoolExecutor(max_workers=download_workers) as downloads, \
+             ProcessPoolExecutor(max_workers=parse_workers) as parsers, \
+             ThreadPoolExecutor(max_workers=1) as evaluator:
+
+            def submit_parses():
+                # A user's frames stay in memory from parsing until their load ends
+                nonlocal in_memory
+                while downloaded and in_memory < max_parsed:
+                    user, pgn_file, first_game_id = downloaded.popleft()
+                    futures[parsers.submit(_parse_user, str(pgn_file), first_game_id)] = ("parse", user, first_game_id)
+                    in_memory += 1
+
+            def release():
+                nonlocal in_memory
+                in_memory -= 1
+                submit_parses()
+
+            for user in usernames:
+                futures[downloads.submit(download, user)] = ("download", user, None)
+
+            while futures:
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage, user, data = futures.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        fail(user, stage, e)
+                        if stage != "download":
+                            release()
+                        continue
+
+                    if stage == "download":
+                        pgn_file, first_game_id, seconds = result
+                        stages["download"]["seconds"] += seconds
+                        stages["download"]["items"] += 1
+                        metrics.record("download", seconds, user=user)
+                        status[user]["stage"] = "download"
+                        downloaded.append((user, pgn_file, first_game_id))
+                        submit_parses()
+
+                    elif stage == "parse":
+                        meta_df, moves_df, signatures, seconds = result
+                        stages["parse"]["seconds"] += seconds
+                        stages["parse"]["items"] += len(moves_df)
+                        metrics.record("parse", seconds, rows_out=len(moves_df), user=user, games=len(meta_df))
+                        status[user].update(stage="parse", games=len(meta_df), plies=len(moves_df))
+
+                        if meta_df.empty:
+                            status[user]["status"] = "no new games"
+                            unevaluated.discard(user)
+                            mark_loaded(user)
+                            release()
+                            continue
+                        # One evaluation worker: users queue up in parse order and share its engines
+                        futures[evaluator.submit(evaluate, user, meta_df, moves_df)] = \
+                            ("evaluate", user, (meta_df, moves_df, data, signatures))
+
+                    else:
+                        positions, seconds = result
+                        stages["evaluate"]["seconds"] += seconds
+                        stages["evaluate"]["items"] += len(positions)
+                        status[user]["stage"] = "evaluate"
+
+                        # Load in this process while the worker evaluates the next user
+                        meta_df, moves_df, first_game_id, signatures = data
+                        start = time.perf_counter()
+                        try:
+                            with metrics.stage("load", rows_in=len(moves_df), user=user) as load:
+                                rows = _load_user(user, meta_df, moves_df, positions, first_game_id, signatures)
+                                load.rows_out = rows
+                        except Exception as e:
+                            fail(user, "load", e)
+                        else:
+                            stages["load"]["seconds"] += time.perf_counter() - start
+                            stages["load"]["items"] += rows
+                            status[user].update(status="ok", stage="load", rows=rows)
+                        release()
+    except Exception as e:
+        # Users still in flight are reported as failed; the report and metrics are still written
+        for user, info in status.items():
+            if info["status"] == "pending":
+                fail(user, info["stage"] or "download", e)
+    finally:
+        cache.close()
+
+    for stats in stages.values():
+        stats["per_sec"] = stats["items"] / stats["seconds"] if stats["seconds"] else 0.0
+
+    print()
+    print("=" * 50)
+    print("Stage throughput (items = users, plies, positions, rows)")
+    print("=" * 50)
+    for stage, stats in stages.items():
+        print(f"{stage:<10} {stats['items']:>10} items {stats['seconds']:>9.1f}s {stats['per_sec']:>10.1f}/s")
+    print()
+    print("=" * 50)
+    print("Per-user status")
+    print("=" * 50)
+    for user, info in status.items():
+        print(f"{user:<20} {info['status']:<15} games={info['games']} plies={info['plies']} rows={info['rows']}")
+
+    metrics.save()
+    return {"users": status, "stages": stages, "run_id": metrics.run_id}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the PGN -> DuckDB pipeline for many users.")
+    parser.add_argument("usernames", nargs="+")
+    parser.add_argument("--start-date", default=None)
+    parser.add_argument("--end-date", default=None)
+    parser.add_argument("--full", action="store_true", help="rebuild instead of processing only new games")
+    parser.add_argument("--download-workers", type=int, default=4)
+    parser.add_argument("--parse-workers", type=int, default=2)
+    parser.add_argument("--engine-workers", type=int, default=1)
+    parser.add_argument("--depth", type=int, default=20)
+    parser.add_argument("--eval-budget", type=float, default=None,
+                        help="seconds for evaluation; deepen only critical positions")
+    parser.add_argument("--max-parsed", type=int, default=None,
+                        help="users held in memory at once (default: parse workers + 2)")
+    parser.add_argument("--profile", action="store_true", default=None,
+                        help="cProfile dump per stage in Data/Profiles (also PIPELINE_PROFILE=1)")
+    args = parser.parse_args()
+
+    run_batch(args.usernames, start_date=args.start_date, end_date=args.end_date,
+              incremental=not args.full, download_workers=args.download_workers,
+              parse_workers=args.parse_workers, engine_workers=args.engine_workers,
+              depth=args.depth, eval_budget=args.eval_budget, max_parsed=args.max_parsed,
+              profile=args.profile)
@@ -0,0 +1,317 @@
+"""
+Small make-style stage graph: declared inputs and outputs, up-to-date checks
+and concurrent execution of independent stages.
+
+Each Stage names the files it reads and writes, the parameters and source
+modules its output depends on, and the stages it runs after. Before a stage
+runs, its fingerprint (SHA-1 over the parameters, the stage function's
+source, the listed modules and the contents of its input files) is compared
+with the one recorded after its last successful run in the DAG's state file.
+When they match and every output exists, the stage is skipped.
+
+File contents are hashed once per (size, mtime) and the hash is kept in the
+state file, so unchanged files are not read again and a file that was
+rewritten with the same bytes does not trigger a rerun downstream.
+
+Stages whose dependencies are done run concurrently on a thread pool; stages
+that share a resource name (e.g. the chess engine) never overlap.
+
+Usage:
+    from Pipelines.dag import DAG, Stage, STOP, run_dags
+    dag = DAG("stak1", "Data/Work/stak1/state.json")
+    dag.add(Stage("parse", parse, inputs=[pgn], outputs=[raw], params={"first_game_id": 1}))
+    dag.add(Stage("clean", clean, inputs=[raw], outputs=[gold], after=["parse"]))
+    results = run_dags([dag], jobs=2)        # {'stak1': {'parse': 'up to date', 'clean': 'ran'}}
+"""
+
+import hashlib
+import inspect
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from pathlib import Path
+
+from Processing.instrumentation import RunMetrics
+
+# Returned by a stage function to end its DAG early (e.g. no new games); the
+# stage is not recorded as done and its downstream stages are not run
+STOP = "stop"
+
+# Stage results
+RAN = "ran"
+UP_TO_DATE = "up to date"
+STOPPED = "stopped"
+BLOCKED = "blocked"
+ALWAYS = "would run (always runs)"
+
+project_root = Path(__file__).resolve().parents[1]
+
+
+class Stage:
+    """
+    One step of a DAG.
+
+    Parameters:
+    -----------
+    name : str
+        Stage name, unique within its DAG
+    func : callable
+        Does the work; called with the stage's StageMetrics
+        (Processing.instrumentation) to fill in rows and counters, and may
+        return STOP to end the DAG early
+    inputs, outputs : list of Path
+        Files read and written; inputs are hashed for the up-to-date check,
+        outputs only need to exist. outputs may be a callable returning the
+        list, evaluated like params (e.g. a file named after the batch)
+    after : list of str
+        Stages that must finish first (default: none)
+    params : dict or callable, optional
+        Values the output depends on; a callable is evaluated right before the
+        up-to-date check, after the stages before it have run
+    code : list of str
+        Modules (paths relative to the project root) the output depends on;
+        the source of func always counts
+    always : bool
+        Never skip, e.g. for remote inputs (default: False)
+    resource : str, optional
+        Stages with the same resource never run at the same time
+    """
+    def __init__(self, name: str, func, inputs=(), outputs=(), after=(), params=None,
+                 code=(), always: bool = False, resource: str = None):
+        self.name = name
+        self.func = func
+        self.inputs = [Path(path) for path in inputs]
+        self.outputs = outputs if callable(outputs) else [Path(path) for path in outputs]
+        self.after = list(after)
+        self.params = params
+        self.code = list(code)
+        self.always = always
+        self.resource = resource
+
+
+def _digest(value) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class DAG:
+    """
+    Stages of one target (e.g. one user) and the state file recording their
+    last successful runs.
+    """
+    def __init__(self, name: str, state_path: str):
+        self.name = name
+        self.state_path = project_root / Path(state_path)
+        self.stages = {}
+        self.state = {"files": {}, "stages": {}}
+        if self.state_path.exists():
+            with open(self.state_path, encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    def add(self, stage: Stage) -> Stage:
+        """Add a stage; the stages it runs after must already be added."""
+        unknown = [name for name in stage.after if name not in self.stages]
+        if unknown:
+            raise ValueError(f"{self.name}/{stage.name}: unknown upstream stages {unknown}")
+        self.stages[stage.name] = stage
+        return stage
+
+    def _save(self) -> None:
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=1)
+        tmp.replace(self.state_path)
+
+    def file_hash(self, path: Path) -> str:
+        """SHA-1 of a file's contents, reused while its size and mtime are unchanged."""
+        stat = path.stat()
+        key = str(path)
+        cached = self.state["files"].get(key)
+        if cached and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return cached[2]
+
+        sha1 = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha1.update(block)
+        self.state["files"][key] = [stat.st_size, stat.st_mtime_ns, sha1.hexdigest()]
+        return sha1.hexdigest()
+
+    def fingerprint(self, stage: Stage) -> dict:
+        """
+        Hashes of the stage's parameters, code and inputs.
+
+        Raises FileNotFoundError when an input does not exist.
+        """
+        missing = [str(path) for path in stage.inputs if not path.exists()]
+        if missing:
+            raise FileNotFoundError(f"missing input {', '.join(missing)}")
+
+        params = stage.params() if callable(stage.params) else (stage.params or {})
+        sources = [inspect.getsource(stage.func)]
+        sources += [(project_root / module).read_bytes().decode("utf-8") for module in stage.code]
+        return {
+            "params": _digest(params),
+            "code": _digest(sources),
+            "inputs": _digest({str(path): self.file_hash(path) for path in stage.inputs}),
+        }
+
+    def check(self, stage: Stage, force: bool = False) -> tuple:
+        """
+        Whether stage must run.
+
+        Returns:
+        --------
+        tuple
+            (run, reason, fingerprint)
+        """
+        fingerprint = self.fingerprint(stage)
+        previous = self.state["stages"].get(stage.name)
+        if force:
+            return True, "forced", fingerprint
+        if stage.always:
+            return True, "always runs", fingerprint
+        if previous is None:
+            return True, "never ran", fingerprint
+
+        changed = [part for part in ("params", "code", "inputs") if previous.get(part) != fingerprint[part]]
+        if changed:
+            return True, f"{'/'.join(changed)} changed", fingerprint
+        outputs = stage.outputs() if callable(stage.outputs) else stage.outputs
+        missing = [Path(path).name for path in outputs if not Path(path).exists()]
+        if missing:
+            return True, f"missing {', '.join(missing)}", fingerprint
+        return False, UP_TO_DATE, fingerprint
+
+    def record(self, stage: Stage, fingerprint: dict, seconds: float) -> None:
+        """Store a successful run of stage."""
+        self.state["stages"][stage.name] = {**fingerprint, "finished": datetime.now().isoformat(timespec="seconds"),
+                                            "seconds": round(seconds, 3)}
+        self._save()
+
+
+def run_dags(dags: list, only=None, force: bool = False, jobs: int = 1, dry_run: bool = False,
+             metrics: RunMetrics = None) -> dict:
+    """
+    Run the out-of-date stages of several DAGs, independent stages concurrently.
+
+    Parameters:
+    -----------
+    dags : list of DAG
+        Targets to bring up to date
+    only : iterable of str, optional
+        Stage names to consider; the others are neither run nor checked, so
+        their outputs must already exist (default: every stage)
+    force : bool
+        Run the considered stages even when up to date (default: False)
+    jobs : int
+        Stages running at once (default: 1)
+    dry_run : bool
+        Only report what would run (default: False)
+    metrics : RunMetrics, optional
+        Receives one record per stage that ran or was skipped
+
+    Returns:
+    --------
+    dict
+        {dag name: {stage name: 'ran', 'up to date', 'stopped', 'blocked',
+        'failed: <error>' or, with dry_run, 'would run (<reason>)'}}
+    """
+    metrics = metrics or RunMetrics("dag")
+    only = set(only) if only is not None else None
+    if only is not None:
+        unknown = only - {name for dag in dags for name in dag.stages}
+        if unknown:
+            raise ValueError(f"Unknown stages: {sorted(unknown)}")
+    if metrics.profile_dir is not None and jobs > 1:
+        # cProfile can only follow one stage at a time
+        print("Profiling: running one stage at a time")
+        jobs = 1
+
+    results = {dag.name: {} for dag in dags}
+    pending = [(dag, stage) for dag in dags for stage in dag.stages.values()
+               if only is None or stage.name in only]
+    selected = {(dag.name, stage.name) for dag, stage in pending}
+    running = {}
+    held = set()
+
+    def finish(dag, stage, result):
+        results[dag.name][stage.name] = result
+        if result.startswith("failed"):
+            print(f"[{dag.name}] {stage.name}: {result}")
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+        while pending or running:
+            for dag, stage in list(pending):
+                upstream = [results[dag.name].get(name) for name in stage.after
+                            if (dag.name, name) in selected]
+                if any(result is None for result in upstream):
+                    continue
+                if any(result in (STOPPED, BLOCKED) or result.startswith("failed") for result in upstream):
+                    pending.remove((dag, stage))
+                    finish(dag, stage, STOPPED if STOPPED in upstream else BLOCKED)
+                    continue
+                # Stages that always run (e.g. downloads) are assumed to change nothing
+                if dry_run and any(result.startswith("would run") and result != ALWAYS for result in upstream):
+                    pending.remove((dag, stage))
+                    finish(dag, stage, "would run (upstream)")
+                    continue
+                # Wait for a free slot, and for the resource when another stage holds it
+                if len(running) >= jobs or (stage.resource is not None and stage.resource in held):
+                    continue
+                pending.remove((dag, stage))
+
+                try:
+                    run, reason, fingerprint = dag.check(stage, force)
+                except FileNotFoundError as e:
+                    # In a dry run the input may be one an earlier stage would write
+                    finish(dag, stage, f"would run ({e})" if dry_run else f"failed: {e}")
+                    continue
+                except (OSError, ValueError) as e:
+                    finish(dag, stage, f"failed: {e}")
+                    continue
+                if not run:
+                    print(f"[{dag.name}] {stage.name}: up to date")
+                    metrics.record(stage.name, 0.0, user=dag.name, status="skipped")
+                    finish(dag, stage, UP_TO_DATE)
+                    continue
+                if dry_run:
+                    finish(dag, stage, ALWAYS if stage.always and not force else f"would run ({reason})")
+                    continue
+
+                print(f"[{dag.name}] {stage.name}: running ({reason})")
+                if stage.resource is not None:
+                    held.add(stage.resource)
+                running[pool.submit(_run_stage, stage, dag.name, metrics)] = (dag, stage, fingerprint)
+
+            if not running:
+                # Every remaining stage waits on one that was just resolved; scan again
+                if pending:
+                    continue
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                dag, stage, fingerprint = running.pop(future)
+                held.discard(stage.resource)
+                try:
+                    outcome, seconds = future.result()
+                except Exception as e:
+                    finish(dag, stage, f"failed: {type(e).__name__}: {e}")
+                    continue
+                if outcome == STOP:
+                    finish(dag, stage, STOPPED)
+                    continue
+                dag.record(stage, fingerprint, seconds)
+                finish(dag, stage, RAN)
+
+    return results
+
+
+def _run_stage(stage: Stage, user: str, metrics: RunMetrics) -> tuple:
+    """Run one stage inside a metrics stage; returns (func result, seconds)."""
+    start = time.perf_counter()
+    with metrics.stage(stage.name, user=user) as record:
+        outcome = stage.func(record)
+    return outcome, time.perf_counter() - start
@@ -0,0 +1,350 @@
+"""
+Bronze -> Silver -> Gold -> DuckDB pipeline as a graph of declared stages.
+
+    download   Chess.com archives -> Data/Bronze/<user>.pgn, and <user>_new.pgn
+               holding the games not loaded yet (incremental runs)
+    parse      batch PGN -> Data/Work/<user>/meta_raw.pkl, moves_raw.pkl, signatures.npy
+    index      signatures -> the batch's segment of Data/Gold/position_index
+    silver     raw frames -> Data/Silver/<user>_meta.csv, <user>_moves.csv
+    metadata   meta_raw -> meta.pkl, Data/Gold/<user>_meta_gold.csv
+    moves      moves_raw (+ time controls from meta_raw) -> moves.pkl
+    evaluate   moves -> moves_eval.pkl (engine, eval cache, opening index)
+    quality    moves_eval + meta -> moves_gold.pkl, games.pkl, Data/Gold/<user>_moves_gold.csv
+    load       moves_gold + games -> Data/Gold/<user>.duckdb; the batch is then marked loaded
+
+index, silver, metadata and moves only need parse, so they run concurrently with
+--jobs > 1, as do the stages of different users (one evaluate at a time).
+A stage whose inputs, parameters and code are unchanged since its last
+successful run is skipped (Pipelines.dag): after a crash the run resumes at
+the failed stage, and after a code change only the stages it affects run
+again. download always runs; its conditional requests keep unchanged
+archives cheap. When there are no new games, parse leaves the previous
+batch's files in place, so the later stages are up to date unless their
+code changed (they then redo that batch).
+
+The batch is the pending games (incremental, the default) or every game
+(--full). Silver/Gold CSVs and DuckDB tables are appended to; a batch
+written again replaces its earlier rows instead of duplicating them.
+
+Usage:
+    python Pipelines/run_pipeline.py stak1 --start-date 2025-01
+    python Pipelines/run_pipeline.py stak1 bkchessmaster2 --jobs 3 --workers 4
+    python Pipelines/run_pipeline.py stak1 --stages quality load           # only these; inputs must exist
+    python Pipelines/run_pipeline.py stak1 --stages evaluate --force       # rerun even if up to date
+    python Pipelines/run_pipeline.py stak1 --dry-run                       # what would run, and why
+    python Pipelines/run_pipeline.py --list
+
+    from Pipelines.run_pipeline import run_pipeline
+    results = run_pipeline(['stak1'], start_date='2025-01')
+"""
+
+# Establish project root and add to PATH
+from pathlib import Path
+import sys
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, (str(project_root)))
+
+# Import dependencies
+import argparse
+import duckdb
+import numpy as np
+import pandas as pd
+
+# Import custom modules
+from Pipelines.dag import DAG, Stage, STOP, run_dags
+from Ingestion.download_pgn import download_pgn, load_manifest, mark_loaded, short_name
+from Ingestion.pgndata import PGNData
+from Processing.cleanmeta import remove_unnec, convert_datetime
+from Processing.cleanmove import convert_color
+from Processing.clock_features import add_time_features
+from Processing.unique_fen import unique_positions, repopulate_position_evals
+from Processing.move_quality import add_move_quality, game_accuracy
+from Processing.add_eval import add_eval_to_moves, add_eval_adaptive, protagonist_moves
+from Processing.eval_cache import EvalCache
+from Processing.eval_checkpoint import EvalCheckpoint
+from Processing.opening_index import load_opening_index
+from Processing.append_data import append_csv
+from Processing.load_duckdb import load_star_schema
+from Processing.position_index import PositionIndex
+from Processing.instrumentation import RunMetrics
+
+STAGES = ["download", "parse", "index", "silver", "metadata", "moves", "evaluate", "quality", "load"]
+
+
+def _write_frame(df: pd.DataFrame, path: Path) -> None:
+    """Pickle an intermediate frame (dtypes and attrs intact) atomically."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    df.to_pickle(tmp)
+    tmp.replace(path)
+
+
+def _save(df: pd.DataFrame, path: Path, first_game_id: int, index: bool = False) -> None:
+    """Write a fresh CSV for a batch starting at game 1, else append the batch."""
+    if first_game_id > 1:
+        append_csv(df, path, index=index, replace_from=first_game_id)
+    else:
+        df.to_csv(path, index=index)
+        print(f"Saved to {path}")
+
+
+def _first_game_id(meta_df: pd.DataFrame) -> int:
+    """game_id of the first game in a batch (meta frames are indexed by game_id)."""
+    return int(meta_df.index.min())
+
+
+def user_dag(user: str, start_date: str = None, end_date: str = None, incremental: bool = True,
+             workers: int = 1, depth: int = 20, eval_budget: float = None) -> DAG:
+    """
+    The pipeline stages of one user.
+
+    Parameters:
+    -----------
+    user : str
+        Chess.com username
+    start_date, end_date : str, optional
+        Inclusive 'YYYY-MM' bounds on the archive months
+    incremental : bool
+        Process only games not loaded by an earlier run (default: True)
+    workers : int
+        Parser and Stockfish processes (default: 1)
+    depth : int
+        Analysis depth (default: 20)
+    eval_budget : float, optional
+        Seconds of engine time; evaluate shallowly first and deepen only
+        critical positions (see add_eval_adaptive) (default: None)
+
+    Returns:
+    --------
+    DAG
+        Stages named as in STAGES, state in Data/Work/<user>/state.json
+    """
+    name = short_name(user)
+    bronze = project_root / "Data" / "Bronze"
+    silver = project_root / "Data" / "Silver"
+    gold = project_root / "Data" / "Gold"
+    work = project_root / "Data" / "Work" / name
+
+    batch_pgn = bronze / f"{name}_new.pgn" if incremental else bronze / f"{name}.pgn"
+    meta_raw, moves_raw = work / "meta_raw.pkl", work / "moves_raw.pkl"
+    signatures = work / "signatures.npy"
+    position_index = PositionIndex()
+    meta, moves = work / "meta.pkl", work / "moves.pkl"
+    moves_eval, moves_gold, games = work / "moves_eval.pkl", work / "moves_gold.pkl", work / "games.pkl"
+    database = gold / f"{name}.duckdb"
+
+    dag = DAG(name, work / "state.json")
+
+    def download(record):
+        download_pgn(user, start_date=start_date, end_date=end_date, incremental=incremental)
+
+    def parse(record):
+        first_game_id = load_manifest(user)["loaded"] + 1 if incremental else 1
+        pgn_data = PGNData(batch_pgn, workers=workers, first_game_id=first_game_id)
+        record.rows_out = len(pgn_data.moves_df)
+        record.counters["games"] = len(pgn_data.meta_df)
+        if pgn_data.meta_df.empty:
+            print(f"{user}: no new games to process")
+            mark_loaded(user)
+            # The last batch's files stay, so later stages still pick up code changes
+            return None if meta_raw.exists() and moves_raw.exists() else STOP
+        _write_frame(pgn_data.meta_df, meta_raw)
+        _write_frame(pgn_data.moves_df, moves_raw)
+        tmp = signatures.with_suffix(".npy.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, pgn_data.signatures)
+        tmp.replace(signatures)
+
+    def index(record):
+        batch = np.load(signatures)
+        record.rows_in = record.rows_out = len(batch)
+        position_index.add(name, batch)
+
+    def index_segment():
+        # This user's segment for the batch (none for a batch without plies), not the shared directory
+        batch = np.load(signatures, mmap_mode="r")
+        return [position_index.segment_path(name, int(batch["game_id"].min()))] if len(batch) else []
+
+    def write_silver(record):
+        meta_df, move_df = pd.read_pickle(meta_raw), pd.read_pickle(moves_raw)
+        first_game_id = _first_game_id(meta_df)
+        _save(meta_df, silver / f"{name}_meta.csv", first_game_id, index=True)
+        _save(move_df, silver / f"{name}_moves.csv", first_game_id)
+        record.rows_in = len(move_df)
+
+    def process_metadata(record):
+        meta_df = pd.read_pickle(meta_raw)
+        record.rows_in = len(meta_df)
+        meta_df = convert_datetime(remove_unnec(meta_df))
+        _save(meta_df.reset_index(), gold / f"{name}_meta_gold.csv", _first_game_id(meta_df))
+        _write_frame(meta_df, meta)
+        record.rows_out = len(meta_df)
+
+    def process_moves(record):
+        move_df = pd.read_pickle(moves_raw)
+        record.rows_in = len(move_df)
+        move_df = add_time_features(convert_color(move_df), pd.read_pickle(meta_raw))
+        _write_frame(move_df, moves)
+        record.rows_out = len(move_df)
+
+    def evaluate(record):
+        move_df = pd.read_pickle(moves)
+        record.rows_in = len(move_df)
+        eval_cache = EvalCache(gold / "eval_cache.duckdb")
+        opening_index = load_opening_index(gold / "opening_index")
+        try:
+            if eval_budget is None:
+                # A crashed run resumes from the checkpoint
+                checkpoint = EvalCheckpoint(gold / f"{name}_evals.ckpt", depth=depth)
+                move_df = add_eval_to_moves(move_df, depth=depth, workers=workers, cache=eval_cache,
+                                            index=opening_index, checkpoint=checkpoint,
+                                            stats=record.counters)
+                checkpoint.remove()
+            else:
+                positions = unique_positions(move_df)
+                positions, _ = add_eval_adaptive(positions, move_df, time_budget=eval_budget,
+                                                 deep_depth=depth, workers=workers, cache=eval_cache,
+                                                 index=opening_index,
+                                                 protagonist=protagonist_moves(move_df, pd.read_pickle(meta_raw), user),
+                                                 stats=record.counters)
+                move_df = repopulate_position_evals(move_df, positions)
+        finally:
+            eval_cache.close()
+        _write_frame(move_df, moves_eval)
+        record.rows_out = len(move_df)
+
+    def quality(record):
+        move_df, meta_df = pd.read_pickle(moves_eval), pd.read_pickle(meta)
+        record.rows_in = len(move_df)
+        # Eval loss, blunder labels and per-game accuracy (games table only; the Gold meta CSV is already written)
+        move_df = add_move_quality(move_df)
+        meta_df = meta_df.join(game_accuracy(move_df))
+        _save(move_df, gold / f"{name}_moves_gold.csv", _first_game_id(meta_df))
+        _write_frame(move_df, moves_gold)
+        _write_frame(meta_df, games)
+        record.rows_out = len(move_df)
+
+    def load(record):
+        move_df, meta_df = pd.read_pickle(moves_gold), pd.read_pickle(games)
+        con = duckdb.connect(str(database))
+        try:
+            load_star_schema(con, meta_df, move_df, append=_first_game_id(meta_df) > 1, user=user)
+        finally:
+            con.close()
+        record.rows_in = record.rows_out = len(move_df)
+        # Everything downloaded so far is now in Silver/Gold/DuckDB
+        mark_loaded(user)
+
+    dag.add(Stage("download", download, outputs=[batch_pgn], always=True,
+                  params={"start_date": start_date, "end_date": end_date, "incremental": incremental},
+                  code=["Ingestion/download_pgn.py"]))
+    dag.add(Stage("parse", parse, inputs=[batch_pgn], outputs=[meta_raw, moves_raw, signatures], after=["download"],
+                  params=lambda: {"first_game_id": load_manifest(user)["loaded"] + 1 if incremental else 1},
+                  code=["Ingestion/pgndata.py", "Ingestion/metadata.py", "Ingestion/movedata.py"]))
+    dag.add(Stage("index", index, inputs=[signatures], outputs=index_segment, after=["parse"],
+                  code=["Processing/position_index.py"]))
+    dag.add(Stage("silver", write_silver, inputs=[meta_raw, moves_raw],
+                  outputs=[silver / f"{name}_meta.csv", silver / f"{name}_moves.csv"], after=["parse"],
+                  code=["Processing/append_data.py"]))
+    dag.add(Stage("metadata", process_metadata, inputs=[meta_raw],
+                  outputs=[meta, gold / f"{name}_meta_gold.csv"], after=["parse"],
+                  code=["Processing/cleanmeta.py", "Processing/append_data.py"]))
+    dag.add(Stage("moves", process_moves, inputs=[moves_raw, meta_raw], outputs=[moves], after=["parse"],
+                  code=["Processing/cleanmove.py", "Processing/clock_features.py"]))
+    dag.add(Stage("evaluate", evaluate, inputs=[moves] + ([meta_raw] if eval_budget is not None else []),
+                  outputs=[moves_eval], after=["moves"], resource="engine",
+                  params={"depth": depth, "eval_budget": eval_budget},
+                  code=["Processing/add_eval.py", "Processing/unique_fen.py"]))
+    dag.add(Stage("quality", quality, inputs=[moves_eval, meta],
+                  outputs=[moves_gold, games, gold / f"{name}_moves_gold.csv"], after=["metadata", "evaluate"],
+                  code=["Processing/move_quality.py", "Processing/append_data.py"]))
+    dag.add(Stage("load", load, inputs=[moves_gold, games], outputs=[database], after=["quality"],
+                  code=["Processing/load_duckdb.py", "Processing/summary_tables.py"]))
+    return dag
+
+
+def run_pipeline(usernames: list, start_date: str = None, end_date: str = None, incremental: bool = True,
+                 workers: int = 1, depth: int = 20, eval_budget: float = None, stages=None,
+                 force: bool = False, jobs: int = 1, dry_run: bool = False, profile: bool = None) -> dict:
+    """
+    Bring every user's Bronze/Silver/Gold files and DuckDB database up to date.
+
+    Parameters:
+    -----------
+    usernames : list
+        Chess.com usernames
+    start_date, end_date, incremental, workers, depth, eval_budget
+        As in user_dag
+    stages : iterable of str, optional
+        Only consider these stages (see STAGES); the others must already be
+        done (default: all)
+    force : bool
+        Run the considered stages even when up to date (default: False)
+    jobs : int
+        Stages running at once, across users (default: 1)
+    dry_run : bool
+        Only report what would run (default: False)
+    profile : bool, optional
+        cProfile dump per stage; default from the PIPELINE_PROFILE environment variable
+
+    Returns:
+    --------
+    dict
+        {user: {stage: result}} as returned by Pipelines.dag.run_dags
+    """
+    for d in ("Bronze", "Silver", "Gold"):
+        (project_root / "Data" / d).mkdir(parents=True, exist_ok=True)
+
+    dags = [user_dag(user, start_date, end_date, incremental, workers, depth, eval_budget)
+            for user in usernames]
+    metrics = RunMetrics("run_pipeline", user=usernames[0] if len(usernames) == 1 else None, profile=profile)
+    results = run_dags(dags, only=stages, force=force, jobs=jobs, dry_run=dry_run, metrics=metrics)
+
+    print()
+    print("=" * 50)
+    print("Pipeline stages" + (" (dry run)" if dry_run else ""))
+    print("=" * 50)
+    for user, stage_results in results.items():
+        for stage, result in stage_results.items():
+            print(f"{user:<10} {stage:<10} {result}")
+
+    if not dry_run:
+        metrics.save()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the PGN -> DuckDB pipeline, skipping up-to-date stages.")
+    parser.add_argument("usernames", nargs="*")
+    parser.add_argument("--start-date", default=None)
+    parser.add_argument("--end-date", default=None)
+    parser.add_argument("--full", action="store_true", help="rebuild from every game instead of only new ones")
+    parser.add_argument("--workers", type=int, default=1, help="parser and Stockfish processes")
+    parser.add_argument("--depth", type=int, default=20)
+    parser.add_argument("--eval-budget", type=float, default=None,
+                        help="seconds for evaluation; deepen only critical positions")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=None, help="only run these stages")
+    parser.add_argument("--force", action="store_true", help="run the selected stages even if up to date")
+    parser.add_argument("--jobs", type=int, default=1, help="stages running at once")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="show what would run and why, assuming download finds no new games")
+    parser.add_argument("--profile", action="store_true", default=None,
+                        help="cProfile dump per stage in Data/Profiles (also PIPELINE_PROFILE=1)")
+    parser.add_argument("--list", action="store_true", help="list the stages and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for stage in user_dag("example").stages.values():
+            after = f" (after {', '.join(stage.after)})" if stage.after else ""
+            print(f"{stage.name:<10}{after}")
+        sys.exit(0)
+    if not args.usernames:
+        parser.error("at least one username is required")
+
+    results = run_pipeline(args.usernames, start_date=args.start_date, end_date=args.end_date,
+                           incremental=not args.full, workers=args.workers, depth=args.depth,
+                           eval_budget=args.eval_budget, stages=args.stages, force=args.force,
+                           jobs=args.jobs, dry_run=args.dry_run, profile=args.profile)
+    failed = [result for stage_results in results.values() for result in stage_results.values()
+              if result.startswith("failed")]
+    sys.exit(1 if failed else 0)
@@ -1,43 +1,282 @@
 """
-Stockfish evaluation using the stockfish Python package.
+Stockfish evaluation through the persistent UCI driver in Processing.uci_engine.
+
+The engine binary comes from ENGINE_PATH when set, else the STOCKFISH_PATH
+environment variable, engine.json at the project root, or 'stockfish' on PATH.
 
 Usage:
-    from Utils.add_eval import add_eval, add_eval_to_series
-    
-    # For unique FEN series (recommended for large datasets):
+    from Processing.add_eval import evaluate, add_eval_to_moves, add_eval_to_series
+
+    # Any iterable of FENs or position keys; duplicates are evaluated once and
+    # evals stream back in input order, batch by batch:
+    for fen, evaluation in zip(fens, evaluate(fens, depth=15, workers=8)):
+        ...
+
+    # Straight onto a moves DataFrame (deduplicated by position_key):
+    move_df = add_eval_to_moves(move_df, depth=15, workers=8, cache=EvalCache())
+
+    # For unique FEN series:
     unique_fen_series = add_eval_to_series(unique_fen_series, depth=15)
-    
-    # For direct dataframe evaluation (original behavior):
-    df_with_evals = add_eval(move_df, depth=15)
+
+    # Same, spread over 8 engine processes with 1 thread / 64 MB hash each:
+    unique_fen_series = add_eval_to_series(unique_fen_series, depth=15, workers=8, hash_mb=64)
+
+    # Survive crashes: finished positions are logged to disk and skipped on restart
+    # (Processing.eval_checkpoint); pass on_progress for rate / ETA callbacks:
+    unique_fen_series = add_eval_to_series(unique_fen_series, depth=20,
+                                           checkpoint=EvalCheckpoint('Data/Gold/run.ckpt', depth=20))
+
+    # Skip positions already scored in earlier runs (Processing.eval_cache):
+    unique_fen_series = add_eval_to_series(unique_fen_series, depth=15, cache=EvalCache())
+
+    # Same on unique positions keyed by position_key (Processing.unique_fen.unique_positions):
+    positions = add_eval_to_positions(positions, depth=15, workers=8, cache=EvalCache())
+
+    # Lookup and engine counters for run metrics (Processing.instrumentation):
+    stats = {}
+    move_df = add_eval_to_moves(move_df, depth=15, cache=EvalCache(), stats=stats)
+    # stats: {'lookups', 'index_hits', 'cache_hits', 'engine_positions', 'engine_nodes', ...}
+
+    # Opening positions straight from the prebuilt index (Processing.opening_index):
+    positions = add_eval_to_positions(positions, depth=15, index=load_opening_index(), cache=EvalCache())
+
+    # FENs from external sources are validated first; pass the games' Variant header
+    # so Chess960 positions are parsed as such:
+    unique_fen_series = add_eval_to_series(unique_fen_series, depth=15, chess960=fen_variants.eq('Chess960'))
+
+    # Best move, PV and the top 3 lines from the same search:
+    analysis = analyse_fens(fens, depth=20, multipv=3)
+
+    # Shallow pass everywhere, then deepen around big swings within a 10 minute budget:
+    positions, report = add_eval_adaptive(positions, move_df, time_budget=600,
+                                          protagonist=protagonist_moves(move_df, meta_df, 'stak1'))
 """
 
+import re
+import time
+from itertools import islice, repeat
+import numpy as np
 import pandas as pd
-from stockfish import Stockfish
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 import chess
 
-# Stockfish path
-STOCK_PATH = r"C:\Tools\stockfish\stockfish-windows-x86-64-avx2.exe"
+from Processing.eval_cache import fen_key
+from Processing.eval_checkpoint import EvalProgress
+from Processing.uci_engine import UCIEngine, EngineError, engine_path
 
+# Engine binary override; None resolves through Processing.uci_engine.engine_path
+ENGINE_PATH = None
 
-def is_valid_fen(fen: str) -> bool:
-    """Check if FEN is valid and represents a legal position (including Chess960)."""
-    try:
-        # Try standard chess first
-        board = chess.Board(fen)
-        if board.is_valid():
-            return True
-    except:
-        pass
-    
+# FENs handed to a pooled engine per task
+CHUNK_SIZE = 64
+
+# FENs per task in the time-budgeted deep pass; small so the deadline is not overrun
+DEEPEN_CHUNK = 4
+
+# Inputs evaluate() reads per batch; each batch starts its own engines
+EVAL_BATCH = 4096
+
+# Pawn value given to mate scores when measuring eval swings
+MATE_PAWNS = 10.0
+
+# Variant header value of Chess960 games
+CHESS960 = "Chess960"
+
+# FEN syntax: 8 ranks, side to move, castling (standard or Shredder), en passant, counters
+FEN_RE = re.compile(
+    r"(?:[pnbrqkPNBRQK1-8]{1,8}/){7}[pnbrqkPNBRQK1-8]{1,8}"
+    r" [wb] (?:-|[KQkqA-Ha-h]{1,4}) (?:-|[a-h][36]) \d+ \d+"
+)
+
+# Engine owned by each pool worker process
+_worker_engine = None
+
+
+def is_valid_fen(fen: str, chess960: bool = None) -> bool:
+    """
+    Check if FEN is valid and represents a legal position.
+
+    chess960 comes from the game's Variant header; when it is unknown (None)
+    the FEN is tried as standard chess first and as Chess960 second.
+    """
+    for variant_960 in ((False, True) if chess960 is None else (bool(chess960),)):
+        try:
+            if chess.Board(fen, chess960=variant_960).is_valid():
+                return True
+        except ValueError:
+            continue
+    return False
+
+
+def valid_fens(fens, chess960=None) -> np.ndarray:
+    """
+    Validate many FENs from an external source.
+
+    Cheap vectorised string checks (syntax, one king per side, no pawns on
+    the back ranks) reject malformed FENs first; only the distinct survivors
+    are parsed with python-chess for a full legality check.
+
+    Parameters:
+    -----------
+    fens : iterable of str
+        FEN strings
+    chess960 : bool or array-like of bool, optional
+        Per FEN (or for all of them) whether it comes from a Chess960 game,
+        e.g. variants == 'Chess960'; None tries both rule sets
+
+    Returns:
+    --------
+    np.ndarray
+        Boolean mask aligned with fens
+    """
+    fens = pd.Series(list(fens), dtype=object).astype(str)
+    board = fens.str.split(" ", n=1).str[0]
+    back_ranks = board.str.split("/").str[0] + board.str.split("/").str[-1]
+
+    ok = (fens.str.fullmatch(FEN_RE).fillna(False).astype(bool)
+          & board.str.count("K").eq(1) & board.str.count("k").eq(1)
+          & ~back_ranks.str.contains("[pP]", regex=True))
+
+    flags = pd.Series([None] * len(fens) if chess960 is None
+                      else np.broadcast_to(np.asarray(chess960, dtype=bool), len(fens)), dtype=object)
+    candidates = pd.DataFrame({"fen": fens[ok], "chess960": flags[ok]}).drop_duplicates()
+    legal = {(fen, flag): is_valid_fen(fen, flag)
+             for fen, flag in zip(candidates["fen"], candidates["chess960"])}
+
+    result = np.zeros(len(fens), dtype=bool)
+    rows = np.flatnonzero(ok.values)
+    result[rows] = [legal[(fen, flag)] for fen, flag in zip(fens.values[rows], flags.values[rows])]
+    return result
+
+
+def _count(stats: dict, **counts) -> None:
+    """Add counts to a caller's stats dict (see add_eval_to_series); no-op without one."""
+    if stats is None:
+        return
+    for name, value in counts.items():
+        stats[name] = stats.get(name, 0) + value
+
+
+def _new_engine(depth: int, threads: int = 1, hash_mb: int = 16, multipv: int = 1,
+                path: str = None) -> UCIEngine:
+    """Start an engine process that accepts Chess960 positions."""
+    return UCIEngine(path or engine_path(ENGINE_PATH), depth=depth, threads=threads,
+                     hash_mb=hash_mb, multipv=multipv)
+
+
+def _evaluate_stream(engine: UCIEngine, fens: list, analyse: bool = False):
+    """
+    Yield (result, failed) for each FEN in order, pipelined through one engine.
+
+    A position that kills the engine gets None and the engine is restarted
+    for the rest. With analyse, results are UCIEngine.analyse dicts instead of evals.
+    """
+    i = 0
+    while i < len(fens):
+        try:
+            for result in (engine.analyse_many if analyse else engine.evaluate_many)(fens[i:]):
+                i += 1
+                yield result, False
+        except EngineError as e:
+            print(f"Error at position {i}: {e}")
+            i += 1
+            yield None, True
+            engine.restart()
+
+
+def _init_worker(path: str, depth: int, threads: int, hash_mb: int, multipv: int = 1) -> None:
+    """Pool initializer: one engine per worker process, reused for every chunk."""
+    global _worker_engine
+    _worker_engine = _new_engine(depth, threads, hash_mb, multipv, path)
+
+
+def _evaluate_chunk(fens: list, analyse: bool = False) -> tuple:
+    """Evaluate a chunk of already validated FENs in a pool worker; returns (evals, errors, nodes)."""
+    evals = []
+    error_count = 0
+    nodes = _worker_engine.nodes
+
+    for result, failed in _evaluate_stream(_worker_engine, fens, analyse):
+        evals.append(result)
+        error_count += failed
+
+    return evals, error_count, _worker_engine.nodes - nodes
+
+
+def _analyse_chunk(fens: list) -> tuple:
+    """_evaluate_chunk returning full analyse() results."""
+    return _evaluate_chunk(fens, analyse=True)
+
+
+def _add_eval_pooled(unique_fen_series: pd.Series, depth: int, workers: int,
+                     threads: int, hash_mb: int, checkpoint=None, progress=None) -> pd.Series:
+    """Evaluate the (validated) series index across a pool of engine processes."""
+    fens = list(unique_fen_series.index)
+    total = len(fens)
+    chunks = [fens[i:i + CHUNK_SIZE] for i in range(0, total, CHUNK_SIZE)]
+    progress = progress or EvalProgress(total)
+
+    print(f"Evaluating {total} unique positions at depth {depth} "
+          f"with {workers} engines...")
+
+    done = 0
+
+    # Resolved once here: spawned workers do not see a changed ENGINE_PATH
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(engine_path(ENGINE_PATH), depth, threads, hash_mb)) as pool:
+        # map() yields chunks in submission order, so positions line up
+        for chunk, (evals, errors, nodes) in zip(chunks, pool.map(_evaluate_chunk, chunks)):
+            unique_fen_series.iloc[done:done + len(evals)] = evals
+            done += len(evals)
+            if checkpoint is not None:
+                checkpoint.append(chunk, evals)
+            progress.update(len(evals), errors, nodes)
+
+    print(f"\nCompleted: {total} positions")
+    print(f"Successfully evaluated: {total - progress.errors}")
+
+    return unique_fen_series
+
+
+def _add_eval_serial(unique_fen_series: pd.Series, depth: int, threads: int,
+                     hash_mb: int, checkpoint=None, progress=None) -> pd.Series:
+    """Evaluate the (validated) series index with a single engine process."""
+    # Initialize the engine; it accepts Chess960 positions
+    engine = _new_engine(depth, threads, hash_mb)
+
+    total = len(unique_fen_series)
+    progress = progress or EvalProgress(total)
+
+    print(f"Evaluating {total} unique positions at depth {depth}...")
+
+    # Results are checkpointed a chunk at a time, and whatever finished before an interrupt
+    start = 0
+    finished = 0
+    nodes = 0
     try:
-        # If standard fails, try Chess960
-        board = chess.Board(fen, chess960=True)
-        return board.is_valid()
-    except:
-        return False
+        for i, (evaluation, failed) in enumerate(_evaluate_stream(engine, list(unique_fen_series.index))):
+            unique_fen_series.iloc[i] = evaluation
+            finished = i + 1
+
+            if checkpoint is not None and finished - start >= CHUNK_SIZE:
+                checkpoint.append(unique_fen_series.index[start:finished], unique_fen_series.values[start:finished])
+                start = finished
+            progress.update(1, int(failed), engine.nodes - nodes)
+            nodes = engine.nodes
+    finally:
+        if checkpoint is not None:
+            checkpoint.append(unique_fen_series.index[start:finished], unique_fen_series.values[start:finished])
+        engine.close()
+
+    print(f"\nCompleted: {total} positions")
+    print(f"Successfully evaluated: {total - progress.errors}")
+
+    return unique_fen_series
 
 
-def add_eval_to_series(unique_fen_series: pd.Series, depth: int = 15) -> pd.Series:
+def add_eval_to_series(unique_fen_series: pd.Series, depth: int = 15, workers: int = 1,
+                       threads: int = 1, hash_mb: int = 16, cache=None, trusted: bool = False,
+                       chess960=None, checkpoint=None, on_progress=None, stats: dict = None) -> pd.Series:
     """
     Add Stockfish evaluation to a unique FEN Series.
     
@@ -50,121 +289,582 @@ def add_eval_to_series(unique_fen_series: pd.Series, depth: int = 15) -> pd.Seri
         Series indexed by unique FEN strings, with NaN values as placeholders
     depth : int
         Analysis depth (default: 15)
+    workers : int
+        Number of Stockfish processes; >1 distributes FENs over a process pool (default: 1)
+    threads : int
+        Search threads per engine (default: 1)
+    hash_mb : int
+        Transposition table size per engine in MB (default: 16)
+    cache : EvalCache, optional
+        Persistent cache consulted before the engine and updated afterwards
+    trusted : bool
+        The FENs were written by board.fen() during ingestion, so they are
+        legal by construction and are not validated again (default: False)
+    chess960 : bool or array-like of bool, optional
+        For untrusted FENs, whether each comes from a Chess960 game (from the
+        Variant header); None tries standard rules, then Chess960
+    checkpoint : EvalCheckpoint, optional
+        Append-only log of finished positions (Processing.eval_checkpoint);
+        positions already in it are not evaluated again, so an interrupted
+        run resumes where it stopped
+    on_progress : callable, optional
+        Called with the EvalProgress (done, total, rate, eta) after every chunk
+    stats : dict, optional
+        Counters added to in place: 'lookups', 'index_hits' and 'cache_hits'
+        for the opening index and cache, 'resumed' from the checkpoint, and
+        'engine_positions', 'engine_errors', 'engine_nodes' and
+        'engine_seconds' for the positions sent to the engine
 
     Returns:
     --------
     pd.Series
-        Series with FEN index and evaluation values
+        Series with FEN index and evaluation values; invalid FENs get None
     """
-    # Initialize Stockfish and accept Chess960 positions
-    stockfish = Stockfish(path=STOCK_PATH, depth=depth)
-    stockfish.update_engine_parameters({"UCI_Chess960": True})
-    
-    total = len(unique_fen_series)
-    invalid_count = 0
-    evaluated_count = 0
-    
-    print(f"Evaluating {total} unique positions at depth {depth}...")
-    
-    # Iterate through the index (FEN strings)
-    for i, fen in enumerate(unique_fen_series.index):
-        
-        # Validate FEN first
-        if not is_valid_fen(fen):
-            print(f"Invalid FEN at position {i}: {fen[:50]}...")
-            unique_fen_series.iloc[i] = None  # Or 0.0
-            invalid_count += 1
-            continue
-        
-        try:
-            stockfish.set_fen_position(fen)
-            evaluation = stockfish.get_evaluation()
-            
-            # Extract value
-            if evaluation['type'] == 'cp':
-                eval_value = evaluation['value'] / 100.0  # Convert centipawns
-            else:  # mate
-                eval_value = f"M{evaluation['value']}"
-            
-            unique_fen_series.iloc[i] = eval_value
-            evaluated_count += 1
-            
-        except Exception as e:
-            print(f"Error at position {i}: {e}")
-            unique_fen_series.iloc[i] = None
-        
-        # Progress
-        if (i + 1) % 50 == 0:
-            print(f"Evaluated {i + 1}/{total} positions... ({invalid_count} invalid)")
-    
-    print(f"\nCompleted: {total} positions")
-    print(f"Successfully evaluated: {evaluated_count}")
-    print(f"Invalid FENs: {invalid_count}")
-    
+    if chess960 is not None:
+        chess960 = np.broadcast_to(np.asarray(chess960, dtype=bool), len(unique_fen_series))
+
+    if trusted:
+        valid = np.ones(len(unique_fen_series), dtype=bool)
+    else:
+        valid = valid_fens(unique_fen_series.index, chess960)
+        unique_fen_series[~valid] = None
+        print(f"Invalid FENs: {(~valid).sum()}")
+        if not valid.any():
+            return unique_fen_series
+
+    if cache is not None:
+        # Only valid FENs are hashed, looked up and stored
+        rows = np.flatnonzero(valid)
+        keys = [fen_key(fen) for fen in unique_fen_series.index[rows]]
+        cached = cache.get(keys, depth)
+        hit = cached.notna().values
+        unique_fen_series.iloc[rows[hit]] = cached[hit].values
+        print(f"Eval cache: {hit.sum()}/{len(hit)} positions already evaluated at depth >= {depth}")
+        _count(stats, lookups=len(hit), cache_hits=int(hit.sum()))
+
+        # Only positions missing from the cache go to the engine; they are validated already
+        missing = unique_fen_series.iloc[rows[~hit]].copy()
+        if not missing.empty:
+            missing = add_eval_to_series(missing, depth, workers, threads, hash_mb, trusted=True,
+                                         checkpoint=checkpoint, on_progress=on_progress, stats=stats)
+            unique_fen_series.iloc[rows[~hit]] = missing.values
+            cache.put(pd.Series(missing.values, index=cached.index[~hit]), depth)
+        return unique_fen_series
+
+    to_evaluate = unique_fen_series[valid].copy()
+
+    # Positions finished by an earlier, interrupted run come from the checkpoint
+    resumed = np.zeros(len(to_evaluate), dtype=bool)
+    if checkpoint is not None:
+        done = checkpoint.load()
+        resumed = to_evaluate.index.isin(list(done))
+        to_evaluate[resumed] = to_evaluate.index[resumed].map(done).values
+    progress = EvalProgress(len(to_evaluate), done=int(resumed.sum()), on_update=on_progress)
+    _count(stats, resumed=int(resumed.sum()))
+
+    remaining = to_evaluate[~resumed].copy()
+    if not remaining.empty:
+        if workers > 1:
+            remaining = _add_eval_pooled(remaining, depth, workers, threads, hash_mb, checkpoint, progress)
+        else:
+            remaining = _add_eval_serial(remaining, depth, threads, hash_mb, checkpoint, progress)
+        _count(stats, engine_positions=len(remaining), engine_errors=progress.errors,
+               engine_nodes=progress.nodes, engine_seconds=progress.elapsed)
+    to_evaluate[~resumed] = remaining.values
+    unique_fen_series[valid] = to_evaluate.values
     return unique_fen_series
 
 
-def add_eval(move_df: pd.DataFrame, depth: int = 15) -> pd.DataFrame:
+def analyse_fens(fens, depth: int = 15, multipv: int = 1, workers: int = 1, threads: int = 1,
+                 hash_mb: int = 16) -> pd.DataFrame:
     """
-    Add Stockfish evaluation to moves DataFrame.
-    
-    NOTE: For large datasets with duplicate FENs, consider using the 
-    unique_fens() → add_eval_to_series() → repopulate_unique_evals() 
-    pipeline instead for better performance.
+    Eval, best move and principal variation(s) of each FEN from a single search.
+
+    FENs are expected to be valid (see valid_fens); duplicates are searched once.
+
+    Parameters:
+    -----------
+    fens : iterable of str
+        FEN strings
+    depth : int
+        Analysis depth (default: 15)
+    multipv : int
+        Lines per search; line k > 1 adds 'eval_<k>' and 'pv_<k>' columns (default: 1)
+    workers, threads, hash_mb : int
+        Engine processes, threads and hash per engine, as in add_eval_to_series
+
+    Returns:
+    --------
+    pd.DataFrame
+        One row per input FEN, indexed by FEN, with 'eval' (white's view),
+        'best_move' and 'pv' (space-separated UCI moves); None where the
+        search failed
+    """
+    fens = pd.Index(list(fens))
+    unique = list(fens.unique())
+
+    print(f"Analysing {len(unique)} unique positions at depth {depth} (MultiPV {multipv})...")
+    if workers > 1:
+        chunks = [unique[i:i + CHUNK_SIZE] for i in range(0, len(unique), CHUNK_SIZE)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(engine_path(ENGINE_PATH), depth, threads, hash_mb, multipv)) as pool:
+            results = [result for chunk_results, _, _ in pool.map(_analyse_chunk, chunks)
+                       for result in chunk_results]
+    else:
+        with _new_engine(depth, threads, hash_mb, multipv) as engine:
+            results = [result for result, _ in _evaluate_stream(engine, unique, analyse=True)]
+
+    columns = ["eval", "best_move", "pv"] + [f"{name}_{k}" for k in range(2, multipv + 1)
+                                             for name in ("eval", "pv")]
+    rows = []
+    for result in results:
+        if result is None:
+            rows.append([None] * len(columns))
+            continue
+        row = [result["eval"], result["best_move"], " ".join(result["pv"])]
+        for k in range(2, multipv + 1):
+            line = result["lines"][k - 1] if len(result["lines"]) >= k else {"eval": None, "pv": []}
+            row += [line["eval"], " ".join(line["pv"])]
+        rows.append(row)
+
+    analysis = pd.DataFrame(rows, index=unique, columns=columns, dtype=object)
+    return analysis.reindex(fens)
+
+
+def _fill_known(positions: pd.DataFrame, keys: pd.Index, depth: int, index=None,
+                cache=None, stats: dict = None) -> np.ndarray:
+    """Fill evals for keys from the opening index, then the cache; returns the hit mask."""
+    hit = np.zeros(len(keys), dtype=bool)
+    if index is not None or cache is not None:
+        _count(stats, lookups=len(keys))
+    for name, counter, known in (("Opening index", "index_hits", index), ("Eval cache", "cache_hits", cache)):
+        if known is None:
+            continue
+        found = known.get(keys[~hit], depth)
+        new = found.notna().values
+        rows = positions.index.get_indexer(keys[~hit][new])
+        positions.iloc[rows, positions.columns.get_loc('eval')] = found[new].values
+        print(f"{name}: {new.sum()}/{len(new)} positions already evaluated at depth >= {depth}")
+        _count(stats, **{counter: int(new.sum())})
+        hit[np.flatnonzero(~hit)[new]] = True
+    return hit
+
+
+def add_eval_to_positions(positions: pd.DataFrame, depth: int = 15, workers: int = 1,
+                          threads: int = 1, hash_mb: int = 16, cache=None,
+                          index=None, trusted: bool = None, checkpoint=None,
+                          on_progress=None, stats: dict = None) -> pd.DataFrame:
+    """
+    Add Stockfish evaluation to unique positions keyed by position_key.
+
+    Parameters:
+    -----------
+    positions : pd.DataFrame
+        Output of unique_positions: indexed by position_key, with 'fen' and 'eval'
+        columns; positions whose 'fen' is missing are only looked up, never evaluated
+    depth : int
+        Analysis depth (default: 15)
+    workers, threads, hash_mb : int
+        Engine processes, threads and hash per engine, as in add_eval_to_series
+    cache : EvalCache, optional
+        Persistent cache consulted by position_key before the engine and updated afterwards
+    index : OpeningIndex, optional
+        Read-only precomputed evals, consulted before the cache
+    trusted : bool, optional
+        Skip FEN validation; by default taken from positions.attrs['trusted_fens'],
+        which ingestion sets on its move frames (see unique_positions). Untrusted
+        positions may carry a boolean 'chess960' column for validation
+    checkpoint, on_progress, stats : optional
+        Resumable checkpoint, progress callback and counters, as in add_eval_to_series
+
+    Returns:
+    --------
+    pd.DataFrame
+        positions with the 'eval' column filled in
+    """
+    if trusted is None:
+        trusted = positions.attrs.get("trusted_fens", False)
+
+    hit = _fill_known(positions, positions.index, depth, index, cache, stats)
+
+    # Only positions missing from the index and cache go to the engine, looked up by their FEN
+    run = ~hit & positions['fen'].notna().values
+    missing = positions[run]
+    if not missing.empty:
+        fen_series = pd.Series(data=np.nan, index=missing['fen'].values, name='evaluation', dtype=object)
+        chess960 = missing['chess960'].values if 'chess960' in missing.columns else None
+        evals = add_eval_to_series(fen_series, depth, workers, threads, hash_mb,
+                                   trusted=trusted, chess960=chess960, checkpoint=checkpoint,
+                                   on_progress=on_progress, stats=stats).values
+        positions.loc[run, 'eval'] = evals
+        if cache is not None:
+            cache.put(pd.Series(evals, index=missing.index), depth)
+
+    return positions
+
+
+def _evaluate_batch(items: list, keys, chess960, known: dict, depth: int, workers: int,
+                    threads: int, hash_mb: int, cache, index, trusted: bool, checkpoint,
+                    on_progress, stats) -> list:
+    """Evals for one batch of evaluate() inputs; positions already in known are not looked up again."""
+    values = pd.Series(items, dtype=object)
+    # isinstance, so np.str_ values (e.g. from .unique() or numpy arrays) count as FENs
+    is_fen = values.map(lambda value: isinstance(value, str)).values
+    is_key = values.map(lambda value: isinstance(value, (int, np.integer))).values
+    fens = values[is_fen]
+
+    # Key 0 marks an input with no usable position (invalid FEN, missing value)
+    position_keys = np.zeros(len(values), dtype=np.uint64)
+    if keys is not None:
+        position_keys[is_fen] = np.asarray(keys, dtype=np.uint64)[is_fen]
+    position_keys[is_key] = values[is_key].astype(np.uint64).values
+
+    if len(fens):
+        valid = np.ones(len(fens), dtype=bool) if trusted else valid_fens(
+            fens, None if chess960 is None else np.asarray(chess960, dtype=object)[is_fen].astype(bool))
+        rows = np.flatnonzero(is_fen)
+        if keys is None:
+            # Hash each distinct valid FEN once
+            distinct = pd.unique(fens.values[valid])
+            hashed = dict(zip(distinct, (fen_key(fen) for fen in distinct)))
+            position_keys[rows[valid]] = fens[valid].map(hashed).values.astype(np.uint64)
+        position_keys[rows[~valid]] = 0
+
+    # One row per new position, carrying a FEN when any input gave one
+    batch = pd.DataFrame({"position_key": position_keys, "fen": values.where(is_fen)})
+    batch = batch[(batch["position_key"] != 0) & ~batch["position_key"].isin(known.keys())]
+    if not batch.empty:
+        positions = batch.groupby("position_key", sort=False)["fen"].first().to_frame()
+        positions["eval"] = pd.Series(np.nan, index=positions.index, dtype=object)
+        _count(stats, positions=len(positions))
+        positions = add_eval_to_positions(positions, depth, workers, threads, hash_mb, cache,
+                                          index, trusted=True, checkpoint=checkpoint,
+                                          on_progress=on_progress, stats=stats)
+        known.update(zip(positions.index, positions["eval"].values))
+
+    evals = pd.Series(position_keys).map(known)
+    return evals.astype(object).where(evals.notna(), None).tolist()
+
+
+def evaluate(items, depth: int = 15, workers: int = 1, threads: int = 1, hash_mb: int = 16,
+             cache=None, index=None, keys=None, trusted: bool = False, chess960=None,
+             batch_size: int = EVAL_BATCH, checkpoint=None, on_progress=None, stats: dict = None):
+    """
+    Evaluate any iterable of FENs or position keys, yielding evals in input order.
+
+    Inputs are read batch_size at a time. Each batch is reduced to its distinct
+    positions (by position_key), which are looked up in the opening index and
+    cache and otherwise sent to the engine; positions seen in earlier batches
+    are reused without another lookup. A position key on its own can only be
+    answered from the index or cache, since the engine needs a FEN.
+
+    Parameters:
+    -----------
+    items : iterable of str or int
+        FEN strings and/or position_key values
+    depth : int
+        Analysis depth (default: 15)
+    workers, threads, hash_mb : int
+        Engine processes, threads and hash per engine, as in add_eval_to_series
+    cache : EvalCache, optional
+        Persistent cache consulted before the engine and updated afterwards
+    index : OpeningIndex, optional
+        Read-only precomputed evals, consulted before the cache
+    keys : iterable of int, optional
+        position_key of each item when already known (e.g. from ingestion), so
+        FENs are not hashed again
+    trusted : bool
+        Skip FEN validation (default: False)
+    chess960 : bool or iterable of bool, optional
+        For untrusted FENs, whether each (or every) one comes from a Chess960
+        game; None tries standard rules, then Chess960
+    batch_size : int
+        Inputs per batch; engines are started once per batch (default: EVAL_BATCH)
+    checkpoint, on_progress : optional
+        Resumable checkpoint and progress callback, as in add_eval_to_series
+    stats : dict, optional
+        Counters as in add_eval_to_series, plus 'positions': distinct new
+        positions across batches
+
+    Yields:
+    -------
+    float, str or None
+        cp/100 float, 'M<n>' string, or None for invalid FENs, failed
+        evaluations and keys with no known eval
+    """
+    items = iter(items)
+    keys = iter(keys) if keys is not None else None
+    if chess960 is None or isinstance(chess960, (bool, np.bool_)):
+        chess960 = repeat(chess960)
+    else:
+        chess960 = iter(chess960)
+
+    known = {}
+    while True:
+        batch = list(islice(items, batch_size))
+        if not batch:
+            return
+        batch_keys = list(islice(keys, len(batch))) if keys is not None else None
+        flags = list(islice(chess960, len(batch)))
+        flags = None if flags[0] is None else flags
+        yield from _evaluate_batch(batch, batch_keys, flags, known, depth, workers, threads,
+                                   hash_mb, cache, index, trusted, checkpoint, on_progress, stats)
+
+
+def add_eval_to_moves(move_df: pd.DataFrame, depth: int = 15, workers: int = 1, threads: int = 1,
+                      hash_mb: int = 16, cache=None, index=None, checkpoint=None,
+                      on_progress=None, stats: dict = None) -> pd.DataFrame:
+    """
+    Add Stockfish evaluation to a moves DataFrame, evaluating each distinct position once.
 
     Parameters:
     -----------
     move_df : pd.DataFrame
-        DataFrame with 'fen' column
+        DataFrame with a 'fen' column and, from ingestion, 'position_key'; FENs
+        are validated unless attrs['trusted_fens'] is set, using the 'Variant'
+        column when present to pick the rule set
     depth : int
         Analysis depth (default: 15)
+    workers, threads, hash_mb : int
+        Engine processes, threads and hash per engine, as in add_eval_to_series
+    cache : EvalCache, optional
+        Persistent cache consulted before the engine and updated afterwards
+    index : OpeningIndex, optional
+        Read-only precomputed evals, consulted before the cache
+    checkpoint, on_progress, stats : optional
+        Resumable checkpoint, progress callback and counters, as in evaluate
 
     Returns:
     --------
     pd.DataFrame
-        DataFrame with added 'eval' column
+        Copy of move_df with an 'eval' column (None for invalid FENs)
     """
     df = move_df.copy()
-    
-    # Initialize Stockfish
-    stockfish = Stockfish(path=STOCK_PATH, depth=depth)
-    
+    keys = df['position_key'].values if 'position_key' in df.columns else None
+    chess960 = df['Variant'].eq(CHESS960).values if 'Variant' in df.columns else None
+
+    # One batch: the whole frame is deduplicated together and engines start once
+    df['eval'] = list(evaluate(df['fen'].values, depth, workers, threads, hash_mb, cache, index,
+                               keys=keys, trusted=df.attrs.get("trusted_fens", False),
+                               chess960=chess960, batch_size=max(len(df), 1),
+                               checkpoint=checkpoint, on_progress=on_progress, stats=stats))
+    print(f"Evaluated {len(df)} moves ({df['eval'].notna().sum()} with an eval)")
+    return df
+
+
+def protagonist_moves(move_df: pd.DataFrame, meta_df: pd.DataFrame, username: str) -> pd.Series:
+    """
+    Flag the plies played by username.
+
+    Parameters:
+    -----------
+    move_df : pd.DataFrame
+        One row per ply with 'game_id' and 'color' ('white'/'black' or boolean)
+    meta_df : pd.DataFrame
+        One row per game with 'White', game_id as index or column
+    username : str
+        Chess.com username of the protagonist
+
+    Returns:
+    --------
+    pd.Series
+        Boolean Series aligned with move_df
+    """
+    if "game_id" in meta_df.columns:
+        meta_df = meta_df.set_index("game_id")
+    plays_white = meta_df["White"].str.lower().eq(username.lower())
+
+    is_white = move_df["color"]
+    if is_white.dtype != bool:
+        is_white = is_white.astype(str).eq("white")
+    return move_df["game_id"].map(plays_white).fillna(False).astype(bool).eq(is_white)
+
+
+def _eval_pawns(evals: pd.Series) -> pd.Series:
+    """Float pawns from cp/100 floats and 'M<n>' strings; mates count as +-MATE_PAWNS."""
+    pawns = pd.to_numeric(evals, errors="coerce")
+    mates = pd.to_numeric(evals.where(pawns.isna()).astype(str).str[1:], errors="coerce")
+    # 'M-3' is a mate for black, 'M3' for white
+    pawns = pawns.fillna(np.sign(mates).replace(0, 1) * MATE_PAWNS)
+    return pawns.clip(-MATE_PAWNS, MATE_PAWNS)
+
+
+def _deepen_priority(move_df: pd.DataFrame, evals: pd.Series, swing: float,
+                     decisive: float, protagonist=None) -> pd.Series:
+    """
+    Priority of each position for the deep pass; higher goes first.
+
+    A ply is critical when the shallow eval moves by at least swing pawns and
+    the game was not already decided (|eval| >= decisive) on both sides of it.
+    The positions before and after a critical ply get its swing as priority,
+    and the protagonist's critical plies outrank everyone else's.
+    """
+    keys = move_df["position_key"].values
+    after = _eval_pawns(move_df["position_key"].map(evals))
+    first_ply = (move_df["ply"] == 1).values
+    before = after.shift(1).where(~first_ply, 0.0)
+
+    change = (after - before).abs()
+    decided = (before.abs() >= decisive) & (after.abs() >= decisive)
+    critical = (change >= swing) & ~decided & after.notna() & before.notna()
+
+    priority = change.where(critical)
+    if protagonist is not None:
+        priority = priority + np.where(np.asarray(protagonist, dtype=bool), 2 * MATE_PAWNS, 0.0)
+
+    # Shift with numpy: a pandas shift would turn the uint64 keys into lossy floats
+    ranked = pd.concat([
+        pd.Series(priority.values, index=keys),
+        pd.Series(priority.values[1:][~first_ply[1:]], index=keys[:-1][~first_ply[1:]]),
+    ]).dropna()
+    return ranked.groupby(level=0).max().sort_values(ascending=False)
+
+
+def _evaluate_until(fens: list, depth: int, workers: int, threads: int, hash_mb: int,
+                    deadline: float, stats: dict = None) -> list:
+    """
+    Evaluate FENs in order until time.monotonic() passes deadline.
+
+    The FENs must already be validated. Returns the evals of the leading FENs
+    reached before the deadline (None for failed ones); the rest are left out.
+    Engine counters go to stats as in add_eval_to_series.
+    """
+    start = time.monotonic()
+    if workers > 1:
+        evals = [None] * len(fens)
+        submitted = 0
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(engine_path(ENGINE_PATH), depth, threads, hash_mb)) as pool:
+            pending = {}
+            while submitted < len(fens) or pending:
+                # Keep every engine busy, but queue nothing new once time is up
+                while submitted < len(fens) and len(pending) < workers and time.monotonic() < deadline:
+                    chunk = fens[submitted:submitted + DEEPEN_CHUNK]
+                    pending[pool.submit(_evaluate_chunk, chunk)] = submitted
+                    submitted += len(chunk)
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    first = pending.pop(future)
+                    chunk_evals, errors, nodes = future.result()
+                    evals[first:first + len(chunk_evals)] = chunk_evals
+                    _count(stats, engine_errors=errors, engine_nodes=nodes)
+        _count(stats, engine_positions=submitted, engine_seconds=time.monotonic() - start)
+        return evals[:submitted]
+
+    # One position at a time, so nothing is left searching when the deadline passes
     evals = []
-    total = len(df)
-    invalid_count = 0
-    
-    for index, row in df.iterrows():
-        fen = row['fen']
-        
-        # Validate FEN first
-        if not is_valid_fen(fen):
-            print(f"Invalid FEN at position {index}: {fen[:50]}...")
-            evals.append(None)  # Or 0.0
-            invalid_count += 1
-            continue
-        
-        try:
-            stockfish.set_fen_position(fen)
-            evaluation = stockfish.get_evaluation()
-            
-            # Extract value
-            if evaluation['type'] == 'cp':
-                eval_value = evaluation['value'] / 100.0  # Convert centipawns
-            else:  # mate
-                eval_value = f"M{evaluation['value']}"
-            
-            evals.append(eval_value)
-            
-        except Exception as e:
-            print(f"Error at position {index}: {e}")
-            evals.append(None)
-        
-        # Progress
-        if (index + 1) % 50 == 0:
-            print(f"Evaluated {index + 1}/{total} positions... ({invalid_count} invalid)")
-    
-    df['eval'] = evals
-    print(f"\nCompleted: {total} positions")
-    print(f"Invalid FENs: {invalid_count}")
-    
-    return df
\ No newline at end of file
+    errors = 0
+    with _new_engine(depth, threads, hash_mb) as engine:
+        for fen in fens:
+            if time.monotonic() >= deadline:
+                break
+            for evaluation, failed in _evaluate_stream(engine, [fen]):
+                evals.append(evaluation)
+                errors += failed
+        _count(stats, engine_positions=len(evals), engine_errors=errors, engine_nodes=engine.nodes,
+               engine_seconds=time.monotonic() - start)
+    return evals
+
+
+def add_eval_adaptive(positions: pd.DataFrame, move_df: pd.DataFrame, time_budget: float = None,
+                      shallow_depth: int = 10, deep_depth: int = 20, swing: float = 1.0,
+                      decisive: float = 5.0, protagonist=None, workers: int = 1, threads: int = 1,
+                      hash_mb: int = 16, cache=None, index=None, stats: dict = None) -> tuple:
+    """
+    Evaluate unique positions shallowly, then deepen the critical ones within a time budget.
+
+    Every position first gets a shallow_depth eval. Plies whose shallow eval
+    swings by at least `swing` pawns (outside already decided positions) mark
+    the positions on both sides of them as critical; those are re-analysed at
+    deep_depth, largest swing first and the protagonist's moves before anyone
+    else's, until the budget runs out. Mates found by the shallow pass are not
+    deepened unless they sit next to a swing.
+
+    Parameters:
+    -----------
+    positions : pd.DataFrame
+        Output of unique_positions: indexed by position_key, with 'fen' and 'eval' columns
+    move_df : pd.DataFrame
+        Plies in game order with 'position_key' and 'ply', used to find eval swings
+    time_budget : float, optional
+        Wall-clock seconds for the whole call, shallow pass included; None
+        deepens every critical position (default: None)
+    shallow_depth, deep_depth : int
+        Depths of the two passes (default: 10, 20)
+    swing : float
+        Eval change in pawns that makes a ply critical (default: 1.0)
+    decisive : float
+        |eval| in pawns beyond which a position counts as decided (default: 5.0)
+    protagonist : array-like of bool, optional
+        Aligned with move_df, True on the plies whose player's mistakes matter most
+        (see protagonist_moves)
+    workers, threads, hash_mb : int
+        Engine processes, threads and hash per engine, as in add_eval_to_series
+    cache : EvalCache, optional
+        Persistent cache for both passes; deep cached evals skip the engine
+    index : OpeningIndex, optional
+        Precomputed opening evals, consulted before the cache in both passes
+    stats : dict, optional
+        Lookup and engine counters of both passes, as in add_eval_to_series
+
+    Returns:
+    --------
+    tuple
+        (positions, report): positions gains a 'depth' column (shallow_depth or
+        deep_depth); report is a dict with 'budget', 'used', 'shallow_seconds',
+        'deep_seconds', 'positions', 'critical', 'deepened' and 'cached'
+    """
+    start = time.monotonic()
+    deadline = start + time_budget if time_budget is not None else float("inf")
+
+    # Pass 1: cheap evals for every position
+    positions = add_eval_to_positions(positions, shallow_depth, workers, threads, hash_mb, cache, index,
+                                      stats=stats)
+    positions['depth'] = shallow_depth
+    shallow_seconds = time.monotonic() - start
+
+    # Pass 2: critical positions, most important first; invalid FENs got no
+    # shallow eval, so they never rank and need no validation here
+    ranked = _deepen_priority(move_df, positions['eval'], swing, decisive, protagonist)
+    critical = ranked.index[ranked.index.isin(positions.index)]
+
+    hit = _fill_known(positions, critical, deep_depth, index, cache, stats)
+    positions.iloc[positions.index.get_indexer(critical[hit]), positions.columns.get_loc('depth')] = deep_depth
+    cached_count = int(hit.sum())
+    critical = critical[~hit]
+
+    print(f"Deepening {len(critical)} critical positions to depth {deep_depth} "
+          f"({cached_count} already cached)...")
+    deep_start = time.monotonic()
+    rows = positions.index.get_indexer(critical)
+    evals = _evaluate_until(list(positions['fen'].values[rows]), deep_depth,
+                            workers, threads, hash_mb, deadline, stats)
+    rows = rows[:len(evals)]
+    positions.iloc[rows, positions.columns.get_loc('eval')] = pd.Series(evals, dtype=object).values
+    positions.iloc[rows, positions.columns.get_loc('depth')] = deep_depth
+    if cache is not None:
+        cache.put(pd.Series(evals, index=critical[:len(evals)], dtype=object), deep_depth)
+    deep_seconds = time.monotonic() - deep_start
+
+    used = time.monotonic() - start
+    report = {
+        "budget": time_budget,
+        "used": used,
+        "shallow_seconds": shallow_seconds,
+        "deep_seconds": deep_seconds,
+        "positions": len(positions),
+        "critical": len(critical) + cached_count,
+        "deepened": len(evals),
+        "cached": cached_count,
+    }
+
+    print(f"\nShallow pass: {len(positions)} positions at depth {shallow_depth} in {shallow_seconds:.1f}s")
+    print(f"Deep pass: {report['deepened']}/{len(critical)} critical positions at depth {deep_depth} "
+          f"in {deep_seconds:.1f}s")
+    if time_budget is not None:
+        print(f"Budget used: {used:.1f}/{time_budget:.1f}s ({100 * used / time_budget:.0f}%)")
+
+    return positions, report
+
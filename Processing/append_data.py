@@ -0,0 +1,80 @@
+"""
+Append newly ingested games to existing Silver/Gold CSVs.
+
+Usage:
+    from Processing.append_data import append_csv
+    append_csv(new_moves_df, 'Data/Gold/stak1_moves_gold.csv')
+
+    # Re-running a batch: rows from game 301 on are replaced, not duplicated
+    append_csv(new_moves_df, 'Data/Gold/stak1_moves_gold.csv', replace_from=301)
+"""
+
+import csv
+import pandas as pd
+from pathlib import Path
+
+
+def last_game_id(path: Path, index: bool = False):
+    """game_id of the last row of a CSV, read from its header and last line only; None if unknown."""
+    with open(path, "rb") as f:
+        header = next(csv.reader([f.readline().decode("utf-8")]))
+        f.seek(0, 2)
+        size = f.tell()
+        f.seek(max(size - (1 << 16), 0))
+        lines = f.read().decode("utf-8", errors="ignore").splitlines()
+    if len(lines) < 2 or not lines[-1]:
+        return None
+    if not index and "game_id" not in header:
+        return None
+    row = next(csv.reader([lines[-1]]))
+    return int(row[0 if index else header.index("game_id")])
+
+
+def append_csv(df: pd.DataFrame, output_path: str, index: bool = False,
+               replace_from: int = None) -> None:
+    """
+    Append rows to a CSV, creating it if needed.
+
+    When the new rows bring columns the file does not have yet (e.g. a first
+    Chess960 game adds 'Variant'), the file is rewritten with the union of columns.
+
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Rows to append
+    output_path : str
+        Target CSV path
+    index : bool
+        Whether the index is written as the first column, as in to_csv (default: False)
+    replace_from : int, optional
+        First game_id of df; rows already in the file from that game on (an
+        earlier, interrupted attempt at the same batch) are dropped first.
+        The game_id is the index with index=True, else a column
+    """
+    path = Path(output_path)
+    if df.empty:
+        return
+
+    if replace_from is not None and path.exists() and path.stat().st_size > 0:
+        last = last_game_id(path, index)
+        if last is not None and last >= replace_from:
+            existing = pd.read_csv(path, index_col=0 if index else None)
+            game_ids = existing.index if index else existing["game_id"]
+            existing[game_ids < replace_from].to_csv(path, index=index)
+            print(f"Dropped {(game_ids >= replace_from).sum()} rows of games >= {replace_from} from {path}")
+
+    if not path.exists() or path.stat().st_size == 0:
+        df.to_csv(path, index=index)
+        print(f"Saved to {path}")
+        return
+
+    existing_cols = pd.read_csv(path, nrows=0, index_col=0 if index else None).columns
+    new_cols = df.columns.difference(existing_cols)
+
+    if len(new_cols) == 0:
+        df.reindex(columns=existing_cols).to_csv(path, mode="a", header=False, index=index)
+    else:
+        existing = pd.read_csv(path, index_col=0 if index else None)
+        pd.concat([existing, df]).to_csv(path, index=index)
+
+    print(f"Appended {len(df)} rows to {path}")
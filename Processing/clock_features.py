@@ -0,0 +1,103 @@
+"""
+Per-move time features from [%clk] annotations.
+
+The remaining clock is parsed in bulk (Ingestion.movedata.clock_seconds) and
+every feature is an array expression over the whole move frame: no per-row
+Python, so it scales to millions of plies.
+
+Usage:
+    from Processing.clock_features import add_time_features
+    move_df = add_time_features(move_df, meta_df)
+"""
+
+import numpy as np
+import pandas as pd
+
+from Ingestion.movedata import clock_seconds
+
+# TimeControl values: '600' (base), '180+2' (base + increment); daily '1/86400' has no base
+TIME_CONTROL_RE = r"^(?P<base>\d+)(?:\+(?P<increment>\d+))?$"
+
+
+def parse_time_control(time_control: pd.Series) -> pd.DataFrame:
+    """
+    Split TimeControl headers into base time and increment.
+
+    Parameters:
+    -----------
+    time_control : pd.Series
+        TimeControl header values
+
+    Returns:
+    --------
+    pd.DataFrame
+        Float 'base' and 'increment' seconds, same index; NaN for daily or
+        unknown time controls
+    """
+    parts = time_control.astype(str).str.extract(TIME_CONTROL_RE).astype(float)
+    parts.loc[parts["base"].notna(), "increment"] = parts["increment"].fillna(0)
+    return parts
+
+
+def add_time_features(move_df: pd.DataFrame, meta_df: pd.DataFrame, pressure_fraction: float = 0.1,
+                      scramble_seconds: float = 10.0) -> pd.DataFrame:
+    """
+    Add remaining time, time spent and time-pressure flags to each ply.
+
+    Rows must be in game order (game_id, then ply), as produced by ingestion.
+
+    Parameters:
+    -----------
+    move_df : pd.DataFrame
+        One row per ply with 'game_id', 'ply' and 'clock' ('H:MM:SS.s' strings,
+        or Int deciseconds from the compact schema)
+    meta_df : pd.DataFrame
+        One row per game with 'TimeControl', game_id as index or column
+    pressure_fraction : float
+        Remaining time below this share of the base time counts as time
+        pressure (default: 0.1)
+    scramble_seconds : float
+        Remaining time below this many seconds counts as a time scramble (default: 10.0)
+
+    Returns:
+    --------
+    pd.DataFrame
+        move_df with float32 'clock_seconds' and 'time_spent' (seconds used on
+        the move, increment included; NaN without a clock or base time) and
+        boolean 'time_pressure' and 'time_scramble'
+    """
+    df = move_df.copy()
+    if "game_id" in meta_df.columns:
+        meta_df = meta_df.set_index("game_id")
+
+    if pd.api.types.is_numeric_dtype(df["clock"]):
+        remaining = df["clock"].astype("float64").to_numpy(na_value=np.nan) / 10
+    else:
+        remaining = clock_seconds(df["clock"])
+
+    control = parse_time_control(meta_df["TimeControl"])
+    game_index = meta_df.index.get_indexer(df["game_id"].values)
+    found = game_index >= 0
+    base = np.where(found, control["base"].values[game_index], np.nan)
+    increment = np.where(found, control["increment"].values[game_index], np.nan)
+
+    # The mover's previous clock is two plies back in the same game; their first move starts from base
+    game_id = df["game_id"].values
+    ply = df["ply"].values
+    previous = np.full(len(df), np.nan)
+    same_game = (ply[2:] > 2) & (game_id[2:] == game_id[:-2])
+    previous[2:][same_game] = remaining[:-2][same_game]
+    first_move = ply <= 2
+    previous[first_move] = base[first_move]
+
+    spent = previous - remaining + increment
+    # Lag compensation can give a little time back; never report negative thinking time
+    spent = np.maximum(spent, 0, where=~np.isnan(spent), out=spent)
+
+    df["clock_seconds"] = remaining.astype(np.float32)
+    df["time_spent"] = spent.astype(np.float32)
+    with np.errstate(invalid="ignore"):
+        df["time_pressure"] = remaining < pressure_fraction * base
+        df["time_scramble"] = remaining < scramble_seconds
+
+    return df
@@ -0,0 +1,149 @@
+"""
+Persistent Stockfish evaluation cache shared across runs and users.
+
+Evaluations are stored in a DuckDB table keyed by the position's 64-bit
+Zobrist hash (chess.polyglot.zobrist_hash, which ignores the move counters),
+keeping only the deepest result per position. A cached eval at depth >= the
+requested depth counts as a hit.
+
+Usage:
+    from Processing.eval_cache import EvalCache
+    cache = EvalCache()                      # Data/Gold/eval_cache.duckdb
+    cached = cache.get(positions.index, depth=20)      # position_key index
+    cache.put(positions['eval'], depth=20)
+"""
+
+import chess
+import chess.polyglot
+import duckdb
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+
+def normalize_fen(fen: str) -> str:
+    """Drop the halfmove and fullmove counters from a FEN."""
+    return " ".join(fen.split(" ")[:4])
+
+
+def fen_key(fen: str) -> int:
+    """Zobrist position key of a FEN, matching the position_key written at ingestion."""
+    # chess960=True also reads Shredder castling fields; the key is the same for standard FENs
+    return chess.polyglot.zobrist_hash(chess.Board(fen, chess960=True))
+
+
+class EvalCache:
+    """
+    DuckDB-backed position_key -> evaluation store.
+    """
+    def __init__(self, db_path: str = "Data/Gold/eval_cache.duckdb"):
+        self.project_root = Path(__file__).resolve().parents[1]
+        self.db_path = self.project_root / Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.con = duckdb.connect(str(self.db_path))
+        self.con.execute("""
+            CREATE TABLE IF NOT EXISTS position_evals (
+                position_key UBIGINT PRIMARY KEY,
+                depth INTEGER NOT NULL,
+                cp DOUBLE,
+                mate INTEGER
+            );
+        """)
+        self._migrate_fen_evals()
+
+    def _migrate_fen_evals(self) -> None:
+        """Re-key a cache written before position keys (table fen_evals)."""
+        exists = self.con.execute(
+            "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'fen_evals'"
+        ).fetchone()[0]
+        if not exists:
+            return
+
+        rows = self.con.execute("SELECT fen, depth, cp, mate FROM fen_evals;").df()
+        # Stored FENs were normalized; add dummy counters so they parse
+        rows.insert(0, "position_key", np.array(
+            [fen_key(f"{fen} 0 1") for fen in rows.pop("fen")], dtype=np.uint64))
+        self._upsert(rows)
+        self.con.execute("DROP TABLE fen_evals;")
+        print(f"Eval cache: migrated {len(rows)} FEN-keyed evals to position keys")
+
+    def _upsert(self, rows: pd.DataFrame) -> None:
+        """Insert (position_key, depth, cp, mate) rows, keeping the deeper eval per key."""
+        # Several FENs can share a key; keep the deepest of them
+        rows = rows.sort_values("depth", ascending=False).drop_duplicates(subset="position_key")
+
+        self.con.register("new_evals", rows)
+        self.con.execute("""
+            INSERT INTO position_evals
+            SELECT position_key, depth, cp, mate FROM new_evals
+            ON CONFLICT (position_key) DO UPDATE
+            SET depth = excluded.depth, cp = excluded.cp, mate = excluded.mate
+            WHERE excluded.depth > position_evals.depth;
+        """)
+        self.con.unregister("new_evals")
+
+    def get(self, keys, depth: int) -> pd.Series:
+        """
+        Look up evaluations for many positions in one query.
+
+        Parameters:
+        -----------
+        keys : iterable of int
+            position_key values to look up
+        depth : int
+            Minimum search depth a cached eval must have
+
+        Returns:
+        --------
+        pd.Series
+            Series indexed by the input keys with cp/100 floats, 'M<n>' strings,
+            or NaN where there is no cached eval deep enough
+        """
+        lookup = pd.DataFrame({"position_key": np.asarray(list(keys), dtype=np.uint64)})
+
+        self.con.register("lookup_keys", lookup)
+        hits = self.con.execute("""
+            SELECT k.position_key, e.cp, e.mate
+            FROM lookup_keys k
+            JOIN position_evals e USING (position_key)
+            WHERE e.depth >= ?;
+        """, [depth]).df()
+        self.con.unregister("lookup_keys")
+
+        values = hits["cp"].astype(object)
+        is_mate = hits["mate"].notna()
+        values[is_mate] = "M" + hits.loc[is_mate, "mate"].astype(int).astype(str)
+
+        result = pd.Series(data=np.nan, index=lookup["position_key"].values, name="evaluation", dtype=object)
+        result.loc[hits["position_key"].values.astype(np.uint64)] = values.values
+        return result
+
+    def put(self, evals: pd.Series, depth: int) -> None:
+        """
+        Store evaluations, replacing cached ones only when the new depth is greater.
+
+        Parameters:
+        -----------
+        evals : pd.Series
+            Series indexed by position_key with cp/100 floats or 'M<n>' strings;
+            missing values are skipped
+        depth : int
+            Search depth the evaluations were computed at
+        """
+        evals = evals.dropna()
+        if evals.empty:
+            return
+
+        values = evals.astype(str)
+        is_mate = values.str.startswith("M")
+
+        self._upsert(pd.DataFrame({
+            "position_key": np.asarray(evals.index, dtype=np.uint64),
+            "depth": depth,
+            "cp": pd.to_numeric(values.where(~is_mate), errors="coerce").values,
+            "mate": pd.to_numeric(values.where(is_mate).str[1:], errors="coerce").astype("Int64").values,
+        }))
+
+    def close(self) -> None:
+        """Close the DuckDB connection."""
+        self.con.close()
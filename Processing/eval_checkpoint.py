@@ -0,0 +1,164 @@
+"""
+Crash-safe checkpoints and progress reporting for long evaluation runs.
+
+A checkpoint is an append-only text file: a '# depth=<n>' header, then one
+'<fen>\t<eval>' line per finished position, flushed and fsynced after every
+chunk. A crash or Ctrl-C can at worst leave a torn last line, which is
+dropped on the next load, so a restarted run skips every position that was
+evaluated and written, and runs the engine only on the rest.
+
+Usage:
+    from Processing.eval_checkpoint import EvalCheckpoint
+    checkpoint = EvalCheckpoint('Data/Gold/stak1_evals.ckpt', depth=20)
+    unique_fen_series = add_eval_to_series(unique_fen_series, depth=20, checkpoint=checkpoint)
+    checkpoint.remove()                      # once the results are stored elsewhere
+"""
+
+import os
+import time
+from pathlib import Path
+
+# Minimum seconds between two progress lines
+PROGRESS_SECONDS = 10.0
+
+
+def _format_eval(evaluation) -> str:
+    """Checkpoint text of an eval: repr of the float, 'M<n>', or '' for None."""
+    if evaluation is None or evaluation != evaluation:
+        return ""
+    return str(evaluation)
+
+
+def _parse_eval(text: str):
+    """Inverse of _format_eval."""
+    if text == "":
+        return None
+    if text.startswith("M"):
+        return text
+    return float(text)
+
+
+class EvalCheckpoint:
+    """
+    Append-only FEN -> eval log for one search depth.
+    """
+    def __init__(self, path: str, depth: int):
+        self.project_root = Path(__file__).resolve().parents[1]
+        self.path = self.project_root / Path(path)
+        self.depth = depth
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def load(self) -> dict:
+        """
+        Read finished evaluations, repairing a torn last line.
+
+        Returns:
+        --------
+        dict
+            FEN -> eval for every complete, successful line; empty when there is no
+            checkpoint or it was written at another depth (it is then restarted)
+        """
+        if not self.path.exists():
+            return {}
+
+        with open(self.path, "rb") as f:
+            data = f.read()
+
+        header = f"# depth={self.depth}\n".encode()
+        if not data.startswith(header):
+            print(f"Checkpoint {self.path.name} is for another depth; starting over")
+            self.path.unlink()
+            return {}
+
+        # Anything after the last newline is a line the previous run did not finish
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            with open(self.path, "r+b") as f:
+                f.truncate(complete)
+
+        done = {}
+        for line in data[len(header):complete].decode("utf-8").splitlines():
+            fen, _, evaluation = line.partition("\t")
+            # Failed evaluations are logged but retried on resume
+            if evaluation:
+                done[fen] = _parse_eval(evaluation)
+
+        print(f"Checkpoint {self.path.name}: {len(done)} positions already evaluated")
+        return done
+
+    def append(self, fens, evals) -> None:
+        """Write finished evaluations and force them to disk."""
+        lines = "".join(f"{fen}\t{_format_eval(evaluation)}\n" for fen, evaluation in zip(fens, evals))
+        if not lines:
+            return
+
+        new = not self.path.exists()
+        with open(self.path, "a", encoding="utf-8") as f:
+            if new:
+                f.write(f"# depth={self.depth}\n")
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def remove(self) -> None:
+        """Delete the checkpoint, e.g. after its results reached the eval cache."""
+        self.path.unlink(missing_ok=True)
+
+
+class EvalProgress:
+    """
+    Completed count, rate and ETA of an evaluation run.
+
+    Pass on_update to receive the object after every update (e.g. for a
+    progress bar); a summary line is printed at most every PROGRESS_SECONDS.
+    """
+    def __init__(self, total: int, done: int = 0, on_update=None):
+        self.total = total
+        self.resumed = done
+        self.done = done
+        self.errors = 0
+        self.nodes = 0
+        self.on_update = on_update
+        self.start = time.monotonic()
+        self.last_print = self.start
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start
+
+    @property
+    def rate(self) -> float:
+        """Positions per second evaluated by this run (resumed ones excluded)."""
+        elapsed = self.elapsed
+        return (self.done - self.resumed) / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> float:
+        """Estimated seconds left, or inf before the first result."""
+        rate = self.rate
+        return (self.total - self.done) / rate if rate > 0 else float("inf")
+
+    @property
+    def nodes_per_sec(self) -> float:
+        """Engine nodes per second over all engines of this run."""
+        elapsed = self.elapsed
+        return self.nodes / elapsed if elapsed > 0 else 0.0
+
+    def update(self, count: int, errors: int = 0, nodes: int = 0) -> None:
+        """Record count more finished positions, errors of them failed, searching nodes nodes."""
+        self.done += count
+        self.errors += errors
+        self.nodes += nodes
+        if self.on_update is not None:
+            self.on_update(self)
+
+        now = time.monotonic()
+        if now - self.last_print >= PROGRESS_SECONDS or self.done >= self.total:
+            self.last_print = now
+            print(self)
+
+    def __str__(self) -> str:
+        eta = f"{self.eta:.0f}s" if self.eta != float("inf") else "?"
+        nps = f", {self.nodes_per_sec / 1000:.0f} kN/s" if self.nodes else ""
+        return (f"Evaluated {self.done}/{self.total} positions "
+                f"({self.rate:.1f}/s, ETA {eta}, {self.errors} errors{nps})")
@@ -0,0 +1,291 @@
+"""
+Per-stage metrics for pipeline runs.
+
+Each stage runs inside RunMetrics.stage(), which records wall time, CPU time
+(this process plus engine and pool processes that exited during the stage),
+rows in and out, peak RSS and any counters the stage adds, such as the
+lookup and engine counters of Processing.add_eval (cache hit rate and engine
+nodes/sec are derived from those). Stages timed elsewhere, e.g. in a pool
+worker, are added with RunMetrics.record().
+
+A finished run is appended as one JSON line to Data/Gold/pipeline_runs.jsonl
+and as one row per stage to the pipeline_runs table of
+Data/Gold/pipeline_runs.duckdb.
+
+Profiling is off unless profile=True or PIPELINE_PROFILE=1: each stage then
+writes a cProfile dump to Data/Profiles/<run_id>_<nn>_<stage>.prof (open with
+snakeviz or pstats). For py-spy, the run prints its PID, and stage start and
+end times in the JSON line let a 'py-spy record' flame graph be cut by stage.
+
+Usage:
+    from Processing.instrumentation import RunMetrics
+    metrics = RunMetrics("pgn_to_duckdb", user="stak1")
+    with metrics.stage("evaluate", rows_in=len(move_df)) as stage:
+        move_df = add_eval_to_moves(move_df, depth=20, stats=stage.counters)
+        stage.rows_out = len(move_df)
+    metrics.save()
+
+    PIPELINE_PROFILE=1 python Pipelines/pgn_to_duckdb_test.py
+
+    SELECT stage, avg(wall_seconds), avg(cache_hit_rate) FROM pipeline_runs GROUP BY stage;
+"""
+
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+
+PROFILE_ENV = "PIPELINE_PROFILE"
+PROFILE_DIR = "Data/Profiles"
+RUNS_JSON = "Data/Gold/pipeline_runs.jsonl"
+RUNS_DB = "Data/Gold/pipeline_runs.duckdb"
+RUNS_TABLE = "pipeline_runs"
+
+# Columns of the pipeline_runs table; counters go to a JSON 'counters' column
+RUN_COLUMNS = ["run_id", "pipeline", "user", "stage", "status", "started_at", "wall_seconds",
+               "cpu_seconds", "rows_in", "rows_out", "rows_per_sec", "peak_rss_mb",
+               "cache_hit_rate", "nodes_per_sec", "counters"]
+
+
+def reset_peak_rss() -> bool:
+    """Reset the kernel's peak RSS counter (Linux); False where that is not possible."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None when unavailable."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _cpu_seconds() -> float:
+    """CPU time of this process and of its exited child processes (engines, pools)."""
+    try:
+        import resource
+    except ImportError:
+        return time.process_time()
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+class StageMetrics:
+    """
+    Measurements of one stage; set rows_out and add to counters while it runs.
+    """
+    def __init__(self, name: str, rows_in: int = None, user: str = None):
+        self.name = name
+        self.user = user
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.counters = {}
+        self.status = "ok"
+        self.started_at = datetime.now()
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.peak_rss_mb = None
+        self.profile = None
+
+    @property
+    def rows_per_sec(self):
+        rows = self.rows_out if self.rows_out is not None else self.rows_in
+        return rows / self.wall_seconds if rows is not None and self.wall_seconds else None
+
+    @property
+    def cache_hit_rate(self):
+        """Share of eval lookups answered by the opening index or cache."""
+        lookups = self.counters.get("lookups")
+        if not lookups:
+            return None
+        return (self.counters.get("index_hits", 0) + self.counters.get("cache_hits", 0)) / lookups
+
+    @property
+    def nodes_per_sec(self):
+        """Engine nodes per second of engine wall time, summed over engine processes."""
+        seconds = self.counters.get("engine_seconds")
+        return self.counters.get("engine_nodes", 0) / seconds if seconds else None
+
+    def as_dict(self) -> dict:
+        def rounded(value, digits=4):
+            return round(value, digits) if value is not None else None
+
+        return {
+            "stage": self.name, "user": self.user, "status": self.status,
+            "started_at": self.started_at.isoformat(timespec="milliseconds"),
+            "wall_seconds": rounded(self.wall_seconds), "cpu_seconds": rounded(self.cpu_seconds),
+            "rows_in": self.rows_in, "rows_out": self.rows_out,
+            "rows_per_sec": rounded(self.rows_per_sec, 1), "peak_rss_mb": rounded(self.peak_rss_mb, 1),
+            "cache_hit_rate": rounded(self.cache_hit_rate), "nodes_per_sec": rounded(self.nodes_per_sec, 0),
+            "counters": self.counters, "profile": self.profile,
+        }
+
+    def __str__(self) -> str:
+        parts = [f"{self.wall_seconds:.2f}s wall"]
+        if self.cpu_seconds is not None:
+            parts.append(f"{self.cpu_seconds:.2f}s CPU")
+        if self.rows_in is not None and self.rows_out is not None:
+            parts.append(f"{self.rows_in} -> {self.rows_out} rows")
+        elif self.rows_in is not None or self.rows_out is not None:
+            parts.append(f"{self.rows_in if self.rows_in is not None else self.rows_out} rows")
+        if self.peak_rss_mb is not None:
+            parts.append(f"peak {self.peak_rss_mb:.0f} MB")
+        if self.cache_hit_rate is not None:
+            parts.append(f"{self.cache_hit_rate:.0%} cached")
+        if self.nodes_per_sec is not None:
+            parts.append(f"{self.nodes_per_sec / 1000:.0f} kN/s")
+        user = f" ({self.user})" if self.user else ""
+        return f"[{self.name}{user}] " + ", ".join(parts) + ("" if self.status == "ok" else f", {self.status}")
+
+
+class RunMetrics:
+    """
+    Stage metrics of one pipeline run.
+
+    Parameters:
+    -----------
+    pipeline : str
+        Pipeline name stored with every stage
+    user : str, optional
+        User the run is for; stages may name their own user instead
+    profile : bool, optional
+        Write a cProfile dump per stage; default from the PIPELINE_PROFILE
+        environment variable
+    profile_dir : str
+        Directory of the .prof files, relative to the project root (default: PROFILE_DIR)
+    """
+    def __init__(self, pipeline: str, user: str = None, profile: bool = None,
+                 profile_dir: str = PROFILE_DIR):
+        self.project_root = Path(__file__).resolve().parents[1]
+        self.pipeline = pipeline
+        self.user = user
+        self.started_at = datetime.now()
+        self.run_id = f"{self.started_at:%Y%m%dT%H%M%S}-{os.getpid()}"
+        self.stages = []
+        self._start = time.perf_counter()
+
+        if profile is None:
+            profile = os.environ.get(PROFILE_ENV, "").lower() in ("1", "true", "yes")
+        self.profile_dir = self.project_root / Path(profile_dir) if profile else None
+        if profile:
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+            print(f"Profiling run {self.run_id} into {self.profile_dir} "
+                  f"(py-spy: py-spy record --pid {os.getpid()})")
+
+    @contextlib.contextmanager
+    def stage(self, name: str, rows_in: int = None, user: str = None):
+        """
+        Measure the enclosed block as stage name; yields its StageMetrics.
+
+        Stages should not be nested: peak RSS is reset per stage and only one
+        cProfile profiler can run at a time. An exception marks the stage as
+        failed and is re-raised.
+        """
+        record = StageMetrics(name, rows_in, user or self.user)
+        reset_peak_rss()
+        profiler = cProfile.Profile() if self.profile_dir is not None else None
+        wall = time.perf_counter()
+        cpu = _cpu_seconds()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        except BaseException as e:
+            record.status = f"failed: {type(e).__name__}"
+            raise
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            record.wall_seconds = time.perf_counter() - wall
+            record.cpu_seconds = _cpu_seconds() - cpu
+            record.peak_rss_mb = peak_rss_mb()
+            if profiler is not None:
+                path = self.profile_dir / f"{self.run_id}_{len(self.stages):02d}_{name}.prof"
+                profiler.dump_stats(path)
+                record.profile = str(path)
+            self.stages.append(record)
+            print(record)
+
+    def record(self, name: str, wall_seconds: float, rows_in: int = None, rows_out: int = None,
+               user: str = None, status: str = "ok", **counters) -> StageMetrics:
+        """Add a stage measured elsewhere (a thread or pool worker); only wall time is known."""
+        record = StageMetrics(name, rows_in, user or self.user)
+        record.started_at = datetime.fromtimestamp(time.time() - wall_seconds)
+        record.wall_seconds = wall_seconds
+        record.rows_out = rows_out
+        record.status = status
+        record.counters.update(counters)
+        self.stages.append(record)
+        return record
+
+    def as_dict(self) -> dict:
+        return {
+            "run_id": self.run_id, "pipeline": self.pipeline, "user": self.user,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "wall_seconds": round(time.perf_counter() - self._start, 4),
+            "stages": [record.as_dict() for record in self.stages],
+        }
+
+    def to_frame(self) -> pd.DataFrame:
+        """One row per stage with the pipeline_runs columns."""
+        rows = []
+        for record in self.stages:
+            row = record.as_dict()
+            row.update(run_id=self.run_id, pipeline=self.pipeline,
+                       started_at=record.started_at, counters=json.dumps(record.counters))
+            rows.append(row)
+        return pd.DataFrame(rows, columns=RUN_COLUMNS)
+
+    def write_json(self, path: str = RUNS_JSON) -> None:
+        """Append the run as one JSON line."""
+        path = self.project_root / Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.as_dict()) + "\n")
+
+    def to_duckdb(self, con: duckdb.DuckDBPyConnection, table: str = RUNS_TABLE) -> None:
+        """Append one row per stage to table, creating it on first use."""
+        con.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                run_id VARCHAR, pipeline VARCHAR, "user" VARCHAR, stage VARCHAR, status VARCHAR,
+                started_at TIMESTAMP, wall_seconds DOUBLE, cpu_seconds DOUBLE,
+                rows_in BIGINT, rows_out BIGINT, rows_per_sec DOUBLE, peak_rss_mb DOUBLE,
+                cache_hit_rate DOUBLE, nodes_per_sec DOUBLE, counters JSON
+            );
+        """)
+        con.register("run_metrics_view", self.to_frame())
+        con.execute(f"INSERT INTO {table} BY NAME SELECT * FROM run_metrics_view;")
+        con.unregister("run_metrics_view")
+
+    def save(self, json_path: str = RUNS_JSON, db_path: str = RUNS_DB) -> None:
+        """Write the run to the JSON lines file and the pipeline_runs DuckDB table."""
+        self.write_json(json_path)
+        con = duckdb.connect(str(self.project_root / Path(db_path)))
+        try:
+            self.to_duckdb(con)
+        finally:
+            con.close()
+        print(f"Run {self.run_id}: {len(self.stages)} stages recorded in {Path(json_path).name} "
+              f"and {Path(db_path).name}")
@@ -0,0 +1,275 @@
+"""
+Load pandas DataFrames straight into DuckDB with an explicit schema.
+
+The DataFrames are registered with DuckDB and scanned in place, so there is
+no CSV write/re-read and no type inference; every known column is cast to a
+fixed SQL type, and a value that does not fit its column's type (e.g. a
+'white'/'black' color before Processing.cleanmove.convert_color) fails the
+load rather than being stored as NULL. Clocks load as TIME from either
+'H:MM:SS' strings or the compact schema's integer deciseconds.
+
+load_star_schema stores each game's headers once ('games'), each distinct
+position and its eval once ('positions', keyed by the Zobrist position_key
+when the moves carry one) and one narrow row per ply ('moves'), plus a 'game_data' view with the columns of the old merged table
+so the Query/*.sql files keep working. After each load the game_summary and
+opening_summary tables (Processing.summary_tables) are updated for the new
+games, so per-game and per-opening queries need not scan the plies.
+
+Usage:
+    from Processing.load_duckdb import load_star_schema, load_game_data
+    con = duckdb.connect('Data/Gold/stak1.duckdb')
+    load_star_schema(con, meta_df, move_df)                      # games/moves/positions + game_data view
+    load_star_schema(con, new_meta_df, new_move_df, append=True, user='stak1')
+
+    load_game_data(con, merged_df)                               # single denormalized table
+"""
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from Processing.summary_tables import update_summaries
+
+# SQL types for the columns the pipeline produces; other PGN headers load as VARCHAR
+GAME_DATA_SCHEMA = {
+    "game_id": "INTEGER",
+    "ply": "SMALLINT",
+    "color": "BOOLEAN",
+    "move": "VARCHAR",
+    "clock": "TIME",
+    "eval": "VARCHAR",
+    "fen": "VARCHAR",
+    "position_key": "UBIGINT",
+    "clock_seconds": "REAL",
+    "time_spent": "REAL",
+    "time_pressure": "BOOLEAN",
+    "time_scramble": "BOOLEAN",
+    "score_cp": "REAL",
+    "cp_loss": "REAL",
+    "win_loss": "REAL",
+    "move_accuracy": "REAL",
+    "quality": "VARCHAR",
+    "White": "VARCHAR",
+    "Black": "VARCHAR",
+    "Result": "VARCHAR",
+    "WhiteElo": "SMALLINT",
+    "BlackElo": "SMALLINT",
+    "TimeControl": "VARCHAR",
+    "ECO": "VARCHAR",
+    "Termination": "VARCHAR",
+    "Variant": "VARCHAR",
+    "SetUp": "VARCHAR",
+    "SetupFEN": "VARCHAR",
+    "StartDateTime": "TIMESTAMP",
+    "EndDateTime": "TIMESTAMP",
+    "white_accuracy": "REAL",
+    "white_acpl": "REAL",
+    "white_inaccuracies": "SMALLINT",
+    "white_mistakes": "SMALLINT",
+    "white_blunders": "SMALLINT",
+    "black_accuracy": "REAL",
+    "black_acpl": "REAL",
+    "black_inaccuracies": "SMALLINT",
+    "black_mistakes": "SMALLINT",
+    "black_blunders": "SMALLINT",
+}
+
+# DuckDB identifiers are case-insensitive, so the Chess960 'FEN' header would clash with 'fen'
+COLUMN_RENAMES = {"FEN": "SetupFEN"}
+
+# Compact move frames hold clocks as integer deciseconds (Ingestion.movedata.clock_to_deciseconds);
+# they go through the same 'H:MM:SS.s' text as string clocks, so out-of-range values still fail the cast
+CLOCK_FROM_DECISECONDS = "printf('%d:%02d:%04.1f', {0} // 36000, {0} // 600 % 60, {0} % 600 / 10)"
+
+# Numeric companions of the text 'eval' column ('0.35' / 'M3', kept for LIKE '%M%' filters)
+EVAL_NUMERIC = """TRY_CAST("eval" AS DOUBLE) AS eval_cp,
+        CASE WHEN CAST("eval" AS VARCHAR) LIKE 'M%'
+             THEN TRY_CAST(substr(CAST("eval" AS VARCHAR), 2) AS INTEGER) END AS eval_mate"""
+
+
+def _typed_columns(con: duckdb.DuckDBPyConnection, view: str, df: pd.DataFrame,
+                   skip: tuple = ()) -> str:
+    """Typed SELECT list over a registered frame."""
+    # DuckDB suffixes case-insensitive duplicates when registering ('FEN' -> 'FEN_1'),
+    # so take the view's names positionally
+    view_cols = [row[0] for row in con.execute(f"DESCRIBE {view};").fetchall()]
+
+    exprs = []
+    for col, dtype, view_col in zip(df.columns, df.dtypes, view_cols):
+        if col in skip:
+            continue
+        name = COLUMN_RENAMES.get(col, col)
+        sql_type = GAME_DATA_SCHEMA.get(name, "VARCHAR")
+        source = f'{view}."{view_col}"'
+        if sql_type == "TIME" and pd.api.types.is_numeric_dtype(dtype):
+            source = CLOCK_FROM_DECISECONDS.format(f"CAST({source} AS BIGINT)")
+        exprs.append(f'CAST({source} AS {sql_type}) AS "{name}"')
+
+    return ",\n        ".join(exprs)
+
+
+def _table_exists(con: duckdb.DuckDBPyConnection, table: str) -> bool:
+    """Whether a table or view with this name exists."""
+    return con.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [table]
+    ).fetchone()[0] > 0
+
+
+def _columns(con: duckdb.DuckDBPyConnection, relation: str) -> list:
+    """Column names of a table, view or query."""
+    return [row[0] for row in con.execute(f"DESCRIBE {relation};").fetchall()]
+
+
+def _insert(con: duckdb.DuckDBPyConnection, table: str, select: str, append: bool) -> None:
+    """Create table from select, or insert by name and add any new columns."""
+    if append and _table_exists(con, table):
+        table_cols = set(_columns(con, table))
+        for name, col_type, *_ in con.execute(f"DESCRIBE {select};").fetchall():
+            if name not in table_cols:
+                con.execute(f'ALTER TABLE {table} ADD COLUMN "{name}" {col_type};')
+        con.execute(f"INSERT INTO {table} BY NAME {select};")
+    else:
+        con.execute(f"CREATE OR REPLACE TABLE {table} AS {select};")
+
+
+def load_game_data(con: duckdb.DuckDBPyConnection, merged_df: pd.DataFrame,
+                   table: str = "game_data", append: bool = False) -> None:
+    """
+    Load the merged moves + metadata frame into DuckDB without a CSV round-trip.
+
+    Parameters:
+    -----------
+    con : duckdb.DuckDBPyConnection
+        Open DuckDB connection
+    merged_df : pd.DataFrame
+        Output of merge_data
+    table : str
+        Target table (default: 'game_data')
+    append : bool
+        Insert into the existing table (adding any new header columns) instead
+        of replacing it (default: False)
+    """
+    con.register("merged_df_view", merged_df)
+    select = f"SELECT\n        {_typed_columns(con, 'merged_df_view', merged_df)}"
+    if "eval" in merged_df.columns:
+        select += f",\n        {EVAL_NUMERIC}"
+    select += "\n    FROM merged_df_view"
+
+    _insert(con, table, select, append)
+
+    con.unregister("merged_df_view")
+    print(f"Loaded {len(merged_df)} rows into {table}")
+
+
+def load_star_schema(con: duckdb.DuckDBPyConnection, meta_df: pd.DataFrame,
+                     move_df: pd.DataFrame, append: bool = False, user: str = None) -> None:
+    """
+    Load metadata and evaluated moves as games / moves / positions tables.
+
+    Parameters:
+    -----------
+    con : duckdb.DuckDBPyConnection
+        Open DuckDB connection
+    meta_df : pd.DataFrame
+        One row per game, game_id as index or column
+    move_df : pd.DataFrame
+        One row per ply with 'game_id', 'ply', 'color', 'move', 'clock', 'eval', 'fen'
+        and optionally 'position_key'; with a key, positions are deduplicated on
+        it and the stored fen is the first one seen for the key
+    append : bool
+        Add the games to the existing tables; positions already stored keep
+        their position_id, and games already loaded with a game_id at or
+        above the first new one (a batch loaded again after an interrupted
+        run) are replaced rather than duplicated (default: False)
+    user : str, optional
+        Protagonist of the summary tables (default: the player in the most games)
+    """
+    if append and not _table_exists(con, "moves"):
+        raise ValueError("No games/moves/positions tables to append to; run a full load first")
+
+    if not append:
+        # Databases built before the star schema hold game_data as a table
+        kind = con.execute(
+            "SELECT table_type FROM information_schema.tables WHERE table_name = 'game_data'"
+        ).fetchone()
+        if kind is not None:
+            con.execute(f"DROP {'VIEW' if kind[0] == 'VIEW' else 'TABLE'} game_data;")
+        for table in ("moves", "games", "positions"):
+            con.execute(f"DROP TABLE IF EXISTS {table};")
+
+    if "game_id" not in meta_df.columns:
+        meta_df = meta_df.reset_index()
+
+    if append and len(meta_df):
+        first_game_id = int(meta_df["game_id"].min())
+        for table in ("moves", "games"):
+            con.execute(f"DELETE FROM {table} WHERE game_id >= ?;", [first_game_id])
+
+    # games: one row of headers per game
+    con.register("meta_df_view", meta_df)
+    _insert(con, "games",
+            f"SELECT\n        {_typed_columns(con, 'meta_df_view', meta_df)}\n    FROM meta_df_view",
+            append=True)
+    con.unregister("meta_df_view")
+
+    # positions: each distinct position once, numbered in order of first appearance
+    key = "position_key" if "position_key" in move_df.columns else "fen"
+    new_positions = move_df[list(dict.fromkeys([key, "fen", "eval"]))].drop_duplicates(subset=key)
+    new_positions = new_positions.assign(first_seen=np.arange(len(new_positions)))
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS positions (
+            position_id INTEGER PRIMARY KEY,
+            fen VARCHAR NOT NULL,
+            eval VARCHAR,
+            eval_cp DOUBLE,
+            eval_mate INTEGER,
+            position_key UBIGINT
+        );
+    """)
+    con.execute("ALTER TABLE positions ADD COLUMN IF NOT EXISTS position_key UBIGINT;")
+    key_select = ",\n            CAST(position_key AS UBIGINT) AS position_key" if key == "position_key" else ""
+    con.register("positions_view", new_positions)
+    con.execute(f"""
+        INSERT INTO positions BY NAME
+        SELECT
+            (SELECT COALESCE(MAX(position_id), 0) FROM positions)
+                + ROW_NUMBER() OVER (ORDER BY first_seen) AS position_id,
+            CAST(fen AS VARCHAR) AS fen,
+            CAST("eval" AS VARCHAR) AS eval,
+            {EVAL_NUMERIC}{key_select}
+        FROM positions_view n
+        WHERE NOT EXISTS (SELECT 1 FROM positions p WHERE p.{key} = n.{key});
+    """)
+    con.unregister("positions_view")
+
+    # moves: narrow ply rows pointing at their position
+    con.register("move_df_view", move_df)
+    _insert(con, "moves", f"""SELECT
+        {_typed_columns(con, 'move_df_view', move_df, skip=('fen', 'eval', 'position_key'))},
+        p.position_id
+    FROM move_df_view
+    JOIN positions p ON p.{key} = move_df_view.{key}""", append=True)
+    con.unregister("move_df_view")
+
+    # game_data: the old merged table's columns, moves first then headers
+    move_cols = [c for c in _columns(con, "moves") if c not in ("game_id", "position_id")]
+    game_cols = [c for c in _columns(con, "games") if c != "game_id"]
+    con.execute(f"""
+        CREATE OR REPLACE VIEW game_data AS
+        SELECT
+            m.game_id,
+            {", ".join(f'm."{c}"' for c in move_cols)},
+            p.eval,
+            p.fen,
+            {", ".join(f'g."{c}"' for c in game_cols)},
+            p.eval_cp,
+            p.eval_mate
+        FROM moves m
+        JOIN positions p USING (position_id)
+        LEFT JOIN games g USING (game_id);
+    """)
+
+    print(f"Loaded {len(meta_df)} games and {len(move_df)} moves into games/moves/positions")
+
+    first_game_id = int(meta_df["game_id"].min()) if append and len(meta_df) else None
+    update_summaries(con, user, first_game_id)
@@ -0,0 +1,190 @@
+"""
+Move quality from engine evaluations: eval loss, win-probability loss,
+inaccuracy / mistake / blunder labels and per-game accuracy.
+
+Every step is an array expression or a groupby aggregation over the whole
+move frame; rows must be in game order (game_id, then ply).
+
+The win-probability curve, the 5/10/15 point label thresholds and the move
+accuracy formula follow Lichess' published definitions.
+
+Usage:
+    from Processing.move_quality import add_move_quality, game_accuracy
+    move_df = add_move_quality(move_df)          # after evals are repopulated
+    accuracy_df = game_accuracy(move_df)         # one row per game_id
+"""
+
+import numpy as np
+import pandas as pd
+
+# Centipawn score given to a forced mate, before subtracting the mate distance
+MATE_CP = 10000.0
+
+# Evals are capped here before eval loss / win probability, as Lichess does
+CP_CAP = 1000.0
+
+# Eval of the position before the first move (Stockfish's start position)
+INITIAL_CP = 20.0
+
+# Win-probability loss (percentage points) at which each label starts
+QUALITY_LABELS = ["good", "inaccuracy", "mistake", "blunder"]
+QUALITY_THRESHOLDS = [5.0, 10.0, 15.0]
+
+
+def eval_score(evals: pd.Series, white_moved=None) -> np.ndarray:
+    """
+    Numeric, mate-aware white-POV score in centipawns.
+
+    Parameters:
+    -----------
+    evals : pd.Series
+        cp/100 floats or 'M<n>' strings (n > 0 white mates, n < 0 black mates)
+    white_moved : array-like of bool, optional
+        Whether white made the move leading to each position; resolves 'M0'
+        (side to move is mated) to a win for the mover
+
+    Returns:
+    --------
+    np.ndarray
+        Float centipawns; mate in n scores +-(MATE_CP - n), NaN where there is no eval
+    """
+    evals = pd.Series(evals, dtype=object)
+    pawns = pd.to_numeric(evals, errors="coerce").to_numpy(dtype=float)
+    # Only the non-numeric values can be mates; parse just those
+    text = np.flatnonzero(np.isnan(pawns) & evals.notna().to_numpy())
+    mate = np.full(len(evals), np.nan)
+    mate[text] = pd.to_numeric(evals.iloc[text].astype(str).str[1:], errors="coerce").to_numpy(dtype=float)
+
+    score = pawns * 100
+    is_mate = ~np.isnan(mate)
+    score[is_mate] = np.sign(mate[is_mate]) * (MATE_CP - np.abs(mate[is_mate]))
+
+    if white_moved is not None:
+        mated = is_mate & (mate == 0)
+        score[mated] = np.where(np.asarray(white_moved, dtype=bool)[mated], MATE_CP, -MATE_CP)
+    else:
+        score[is_mate & (mate == 0)] = np.nan
+    return score
+
+
+def win_probability(cp: np.ndarray) -> np.ndarray:
+    """Win chance in percent for the side the centipawn score favours (Lichess curve)."""
+    cp = np.clip(cp, -CP_CAP, CP_CAP)
+    return 50 + 50 * (2 / (1 + np.exp(-0.00368208 * cp)) - 1)
+
+
+def add_move_quality(move_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add per-ply eval loss, win-probability loss, accuracy and quality label.
+
+    Parameters:
+    -----------
+    move_df : pd.DataFrame
+        One row per ply in game order with 'game_id', 'ply', 'color'
+        (boolean or 'white'/'black') and 'eval' (the position after the move)
+
+    Returns:
+    --------
+    pd.DataFrame
+        move_df with float32 'score_cp' (white POV, mate-aware), 'cp_loss' and
+        'win_loss' (mover's perspective, >= 0), 'move_accuracy' (0-100) and a
+        categorical 'quality' (good / inaccuracy / mistake / blunder); NaN
+        where either side of the move has no eval
+    """
+    df = move_df.copy()
+
+    white = df["color"].to_numpy()
+    if white.dtype != bool:
+        white = df["color"].astype(str).eq("white").to_numpy()
+
+    after = eval_score(df["eval"], white)
+
+    # Score before the move: previous ply of the same game, or the start position
+    game_id = df["game_id"].to_numpy()
+    first = df["ply"].to_numpy() == 1
+    before = np.empty_like(after)
+    before[0:1] = INITIAL_CP
+    before[1:] = np.where(game_id[1:] == game_id[:-1], after[:-1], np.nan)
+    before[first] = INITIAL_CP
+
+    # Mover's perspective: positive is good for the side that just moved
+    sign = np.where(white, 1.0, -1.0)
+    capped_before = np.clip(before, -CP_CAP, CP_CAP) * sign
+    capped_after = np.clip(after, -CP_CAP, CP_CAP) * sign
+
+    # Moves that improve the mover's eval (engine horizon, opponent's error) count as zero loss
+    cp_loss = capped_before - capped_after
+    cp_loss = np.maximum(cp_loss, 0, where=~np.isnan(cp_loss), out=cp_loss)
+    win_loss = win_probability(capped_before) - win_probability(capped_after)
+    win_loss = np.maximum(win_loss, 0, where=~np.isnan(win_loss), out=win_loss)
+
+    # Lichess move accuracy from the win-probability drop
+    accuracy = np.clip(103.1668 * np.exp(-0.04354 * win_loss) - 3.1669, 0, 100)
+
+    codes = np.searchsorted(QUALITY_THRESHOLDS, win_loss, side="right")
+    codes[np.isnan(win_loss)] = -1
+
+    df["score_cp"] = after.astype(np.float32)
+    df["cp_loss"] = cp_loss.astype(np.float32)
+    df["win_loss"] = win_loss.astype(np.float32)
+    df["move_accuracy"] = accuracy.astype(np.float32)
+    df["quality"] = pd.Categorical.from_codes(codes, categories=QUALITY_LABELS)
+    return df
+
+
+def game_accuracy(move_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-game, per-colour accuracy, average centipawn loss and error counts.
+
+    Accuracy is the mean of the arithmetic and harmonic means of the move
+    accuracies, as in Lichess (without its volatility weighting).
+
+    Parameters:
+    -----------
+    move_df : pd.DataFrame
+        Output of add_move_quality
+
+    Returns:
+    --------
+    pd.DataFrame
+        Indexed by game_id with white_/black_ prefixed 'accuracy', 'acpl',
+        'inaccuracies', 'mistakes' and 'blunders'
+    """
+    white = move_df["color"].to_numpy()
+    if white.dtype != bool:
+        white = move_df["color"].astype(str).eq("white").to_numpy()
+
+    # Harmonic mean via the mean of reciprocals; +1 keeps zero accuracies finite
+    accuracy = move_df["move_accuracy"].astype(float)
+    frame = pd.DataFrame({
+        "game_id": move_df["game_id"].to_numpy(),
+        "side": np.where(white, "white", "black"),
+        "accuracy": accuracy.to_numpy(),
+        "inverse": 1 / (accuracy.to_numpy() + 1),
+        "acpl": move_df["cp_loss"].astype(float).to_numpy(),
+        "inaccuracies": (move_df["quality"] == "inaccuracy").to_numpy(),
+        "mistakes": (move_df["quality"] == "mistake").to_numpy(),
+        "blunders": (move_df["quality"] == "blunder").to_numpy(),
+    })
+
+    stats = frame.groupby(["game_id", "side"], sort=False).agg(
+        accuracy=("accuracy", "mean"),
+        inverse=("inverse", "mean"),
+        acpl=("acpl", "mean"),
+        inaccuracies=("inaccuracies", "sum"),
+        mistakes=("mistakes", "sum"),
+        blunders=("blunders", "sum"),
+    )
+    stats["accuracy"] = (stats["accuracy"] + (1 / stats["inverse"] - 1)) / 2
+    stats = stats.drop(columns="inverse").astype({"accuracy": np.float32, "acpl": np.float32})
+
+    wide = stats.unstack("side")
+    wide.columns = [f"{side}_{name}" for name, side in wide.columns]
+    columns = [f"{side}_{name}" for side in ("white", "black")
+               for name in ("accuracy", "acpl", "inaccuracies", "mistakes", "blunders")]
+    wide = wide.reindex(columns=columns).sort_index()
+
+    # unstack leaves NaN for a side with no moves; keep the counts integral
+    counts = [col for col in columns if not col.endswith(("accuracy", "acpl"))]
+    wide[counts] = wide[counts].astype("Int16")
+    return wide
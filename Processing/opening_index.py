@@ -0,0 +1,289 @@
+"""
+Precomputed evaluations for common opening positions, stored as a
+memory-mapped open-addressing hash table keyed by position_key.
+
+The index is two files: <name>.npy, a structured numpy array of
+power-of-two size (key, cp, mate, depth) where each key sits at
+key & (size - 1) or the next free slot after it, and <name>.json, a sidecar
+with the format version, build depth, source and probe statistics. np.load
+with mmap_mode='r' maps the table without reading it, so opening the index
+costs milliseconds and lookups touch only the probed slots.
+
+Usage:
+    from Processing.opening_index import OpeningIndex, common_positions, load_opening_index
+
+    # Build from evaluated Gold moves (or PGNData moves + add_eval_to_positions)
+    moves = pd.read_csv('Data/Gold/stak1_moves_gold.csv')
+    OpeningIndex.build(common_positions(moves), depth=20, source='stak1 gold')
+
+    index = load_opening_index()             # None when no index has been built
+    evals = index.get(positions.index, depth=20)
+
+    python Processing/opening_index.py Data/Gold/stak1_moves_gold.csv --depth 20   # depth the CSV was evaluated at
+    python Processing/opening_index.py games.pgn --depth 20 --workers 8
+"""
+
+import json
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Bump when the table layout or key scheme changes; older files are refused
+FORMAT_VERSION = 1
+
+ENTRY_DTYPE = np.dtype([
+    ("key", "<u8"),      # polyglot Zobrist position_key, 0 = empty slot
+    ("cp", "<i2"),       # centipawns, 0 for mates
+    ("mate", "<i2"),     # mate in n (signed), 0 when cp is set
+    ("depth", "<u1"),    # search depth of the eval
+])
+
+DEFAULT_PATH = "Data/Gold/opening_index"
+
+
+def common_positions(move_df: pd.DataFrame, max_ply: int = 24, min_games: int = 3) -> pd.DataFrame:
+    """
+    Positions reached early in at least min_games different games.
+
+    Parameters:
+    -----------
+    move_df : pd.DataFrame
+        One row per ply with 'game_id', 'ply', 'position_key', 'fen' and optionally 'eval'
+    max_ply : int
+        Only plies up to this one count as opening (default: 24)
+    min_games : int
+        Minimum number of games a position must appear in (default: 3)
+
+    Returns:
+    --------
+    pd.DataFrame
+        Indexed by position_key with 'fen', 'games' and 'eval' (NaN when move_df has none)
+    """
+    opening = move_df[move_df["ply"] <= max_ply]
+    games = opening.groupby("position_key")["game_id"].nunique()
+    keep = games[games >= min_games]
+
+    firsts = opening.drop_duplicates(subset="position_key").set_index("position_key")
+    positions = firsts.loc[keep.index, ["fen"]]
+    positions["games"] = keep.values
+    positions["eval"] = firsts.loc[keep.index, "eval"].values if "eval" in firsts else np.nan
+    positions["eval"] = positions["eval"].astype(object)
+    positions.attrs["trusted_fens"] = move_df.attrs.get("trusted_fens", False)
+
+    print(f"Found {len(positions)} opening positions in {min_games}+ games (plies <= {max_ply})")
+    return positions.sort_values("games", ascending=False)
+
+
+class OpeningIndex:
+    """
+    Read-only position_key -> evaluation table backed by a memory-mapped .npy file.
+    """
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.project_root = Path(__file__).resolve().parents[1]
+        self.path = self.project_root / Path(path)
+
+        with open(self.path.with_suffix(".json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"{self.path}: index format {self.meta.get('format')}, "
+                             f"expected {FORMAT_VERSION}; rebuild it with OpeningIndex.build")
+
+        self.table = np.load(self.path.with_suffix(".npy"), mmap_mode="r")
+        self.mask = np.uint64(len(self.table) - 1)
+        self.max_probe = self.meta["max_probe"]
+
+    def __len__(self) -> int:
+        return self.meta["entries"]
+
+    def _slots(self, keys: np.ndarray) -> np.ndarray:
+        """Table slot of each key, or -1 when the key is not in the index."""
+        slots = np.full(len(keys), -1, dtype=np.int64)
+        pending = np.arange(len(keys))
+        probe = keys & self.mask
+
+        # Linear probing; no key sits more than max_probe slots past its home slot
+        for _ in range(self.max_probe + 1):
+            if len(pending) == 0:
+                break
+            stored = self.table["key"][probe.astype(np.int64)]
+            # An empty slot ends the probe sequence: the key is absent (key 0 included)
+            empty = stored == 0
+            found = (stored == keys[pending]) & ~empty
+            slots[pending[found]] = probe[found]
+            keep = ~found & ~empty
+            pending = pending[keep]
+            probe = (probe[keep] + np.uint64(1)) & self.mask
+
+        return slots
+
+    def get(self, keys, depth: int = 0) -> pd.Series:
+        """
+        Look up evaluations for many positions.
+
+        Parameters:
+        -----------
+        keys : iterable of int
+            position_key values to look up
+        depth : int
+            Minimum search depth an indexed eval must have (default: 0)
+
+        Returns:
+        --------
+        pd.Series
+            Series indexed by the input keys with cp/100 floats, 'M<n>' strings,
+            or NaN where the index has no eval deep enough
+        """
+        keys = np.asarray(list(keys), dtype=np.uint64)
+        result = pd.Series(data=np.nan, index=keys, name="evaluation", dtype=object)
+
+        slots = self._slots(keys)
+        hit = slots >= 0
+        entries = self.table[slots[hit]]
+        deep_enough = entries["depth"] >= depth
+        hit[hit] = deep_enough
+        entries = entries[deep_enough]
+
+        values = (entries["cp"] / 100.0).astype(object)
+        is_mate = entries["mate"] != 0
+        values[is_mate] = ["M" + str(m) for m in entries["mate"][is_mate]]
+        result.iloc[np.flatnonzero(hit)] = values
+        return result
+
+    @classmethod
+    def build(cls, positions: pd.DataFrame, depth: int, path: str = DEFAULT_PATH,
+              source: str = "", load_factor: float = 0.5) -> "OpeningIndex":
+        """
+        Write a new index from evaluated positions, replacing any previous one.
+
+        Parameters:
+        -----------
+        positions : pd.DataFrame
+            Indexed by position_key with an 'eval' column (cp/100 floats or 'M<n>'
+            strings); positions without an eval are skipped
+        depth : int
+            Search depth the evals were computed at
+        path : str
+            Index path without suffix (default: Data/Gold/opening_index)
+        source : str
+            Free-text description of the data the index was built from
+        load_factor : float
+            Maximum fraction of occupied slots (default: 0.5)
+
+        Returns:
+        --------
+        OpeningIndex
+            The freshly written index, memory-mapped
+        """
+        evals = positions["eval"].dropna()
+        evals = evals[~evals.index.duplicated()]
+        keys = np.asarray(evals.index, dtype=np.uint64)
+        # Key 0 marks an empty slot; no real position hashes to it in practice
+        evals, keys = evals[keys != 0], keys[keys != 0]
+
+        values = evals.astype(str)
+        is_mate = values.str.startswith("M").values
+        cp = (pd.to_numeric(values.where(~is_mate), errors="coerce") * 100).round().fillna(0)
+        cp = cp.clip(-32767, 32767).values
+        mate = pd.to_numeric(values.where(is_mate).str[1:], errors="coerce").fillna(0).values
+
+        size = 1 << max(4, int(np.ceil(np.log2(max(len(keys), 1) / load_factor))))
+        table = np.zeros(size, dtype=ENTRY_DTYPE)
+        mask = np.uint64(size - 1)
+
+        # Vectorised linear-probing insert: each round, every still-pending key
+        # tries its current slot; one key wins each free slot, the rest move on
+        pending = np.arange(len(keys))
+        probe = keys & mask
+        max_probe = 0
+        rounds = 0
+        while len(pending):
+            slots = probe.astype(np.int64)
+            free = table["key"][slots] == 0
+            _, first = np.unique(slots, return_index=True)
+            wins = np.zeros(len(pending), dtype=bool)
+            wins[first] = True
+            wins &= free
+
+            rows = pending[wins]
+            table["key"][slots[wins]] = keys[rows]
+            table["cp"][slots[wins]] = cp[rows]
+            table["mate"][slots[wins]] = mate[rows]
+            table["depth"][slots[wins]] = depth
+            if wins.any():
+                max_probe = rounds
+
+            pending = pending[~wins]
+            probe = (probe[~wins] + np.uint64(1)) & mask
+            rounds += 1
+
+        project_root = Path(__file__).resolve().parents[1]
+        out = project_root / Path(path)
+        out.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write both files under temporary names so a reader never sees half an index
+        tmp = out.with_suffix(".npy.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, table)
+        tmp.replace(out.with_suffix(".npy"))
+
+        meta = {
+            "format": FORMAT_VERSION,
+            "key": "polyglot-zobrist",
+            "built_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "source": source,
+            "depth": depth,
+            "entries": int(len(keys)),
+            "slots": size,
+            "max_probe": max_probe,
+        }
+        tmp = out.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=1)
+        tmp.replace(out.with_suffix(".json"))
+
+        print(f"Saved {len(keys)} positions to {out.with_suffix('.npy')} "
+              f"({size} slots, max probe {max_probe})")
+        return cls(path)
+
+
+def load_opening_index(path: str = DEFAULT_PATH):
+    """Open the index at path, or return None when it has not been built."""
+    project_root = Path(__file__).resolve().parents[1]
+    if not (project_root / Path(path)).with_suffix(".json").exists():
+        return None
+    return OpeningIndex(path)
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+    parser = argparse.ArgumentParser(description="Build the opening position eval index.")
+    parser.add_argument("source", help="evaluated Gold moves CSV, or a PGN file to parse and evaluate")
+    parser.add_argument("--depth", type=int, default=None,
+                        help="for a CSV, the depth its evals were computed at (required); "
+                             "for a PGN, the depth to evaluate at (default: 20)")
+    parser.add_argument("--max-ply", type=int, default=24)
+    parser.add_argument("--min-games", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=1, help="parser and engine processes for PGN sources")
+    parser.add_argument("--output", default=DEFAULT_PATH)
+    args = parser.parse_args()
+
+    if args.source.endswith(".csv"):
+        # Every entry is stamped with this depth, so it must be the CSV's actual depth
+        if args.depth is None:
+            parser.error("--depth is required for CSV sources: give the depth the CSV's evals were computed at")
+        moves = pd.read_csv(args.source, usecols=["game_id", "ply", "fen", "position_key", "eval"],
+                            dtype={"position_key": np.uint64})
+        positions = common_positions(moves, args.max_ply, args.min_games)
+    else:
+        args.depth = 20 if args.depth is None else args.depth
+        from Ingestion.pgndata import PGNData
+        from Processing.add_eval import add_eval_to_positions
+        moves = PGNData(args.source, workers=args.workers, signatures=False).moves_df
+        positions = common_positions(moves, args.max_ply, args.min_games)
+        positions = add_eval_to_positions(positions, depth=args.depth, workers=args.workers)
+
+    OpeningIndex.build(positions, depth=args.depth, path=args.output, source=Path(args.source).name)
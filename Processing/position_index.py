@@ -0,0 +1,307 @@
+"""
+Position search over every ingested game: exact positions by position_key and
+similar positions or pawn structures by bitboard signature.
+
+PGNData records a signature for each ply while the PGN is parsed
+(Ingestion.movedata.SIGNATURE_DTYPE): the polyglot position_key, four
+bitboards (white pawns, black pawns, white pieces, black pieces) and the
+game_id and ply it was reached at. Each loaded batch of a user becomes one
+segment, Data/Gold/position_index/<user>_<first game_id>.npy, sorted by key
+and memory-mapped when queried. A segment is stored column by column (a
+6 x n uint64 array: key, the four bitboards, game_id << 16 | ply), so each
+column a query reads is one contiguous block of the file:
+
+    lookup    binary search on the sorted keys of each segment
+    similar   Hamming distance between bitboards (np.bitwise_count of the
+              XOR), summed over the four words, or over the two pawn words
+              for pawn-structure matches. Words are compared one at a time
+              and each only for the plies still within max_distance, so
+              after a scan of the white pawn column the rest is small
+
+A batch loaded again (same or lower first game_id) replaces the user's
+segments from that game_id on, as the CSV and DuckDB sinks do.
+
+Usage:
+    from Processing.position_index import PositionIndex
+    index = PositionIndex()
+    index.add('stak1', pgn_data.signatures)                  # Ingestion.pgndata.PGNData
+    index.lookup('r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3')
+    index.similar(board, max_distance=4)                    # chess.Board or FEN
+    index.similar(fen, max_distance=0, pawns_only=True)     # same pawn structure
+
+    python Processing/position_index.py build stak1 Data/Bronze/stak1.pgn --workers 4
+    python Processing/position_index.py find "<fen>" --distance 2 --pawns
+"""
+
+import os
+import sys
+import time
+import chess
+import chess.polyglot
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# Runnable as a script (python Processing/position_index.py ...)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from Ingestion.movedata import SIGNATURE_DTYPE, SIGNATURE_WORDS, board_signature
+
+DEFAULT_PATH = "Data/Gold/position_index"
+
+# Rows of a segment array
+COLUMNS = ["key"] + SIGNATURE_WORDS + ["game_ply"]
+KEY, GAME_PLY = 0, len(COLUMNS) - 1
+
+# The first two signature words are the pawn bitboards
+PAWN_WORDS = SIGNATURE_WORDS[:2]
+
+
+def position_signature(position) -> tuple:
+    """
+    (position_key, signature words) of a position.
+
+    Parameters:
+    -----------
+    position : str or chess.Board
+        FEN or board. A FEN is parsed in Chess960 mode, as Processing.eval_cache.fen_key
+        does, so Shredder castling rights of Chess960 games are read rather
+        than dropped; standard FENs hash the same either way
+    """
+    board = chess.Board(position, chess960=True) if isinstance(position, str) else position
+    return chess.polyglot.zobrist_hash(board), board_signature(board)
+
+
+class PositionIndex:
+    """
+    Segments of per-ply position signatures in one directory, one or more per user.
+
+    Parameters:
+    -----------
+    path : str
+        Index directory, relative to the project root (default: Data/Gold/position_index)
+    """
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.project_root = Path(__file__).resolve().parents[1]
+        self.path = self.project_root / Path(path)
+        self._segments = {}
+
+    def segment_path(self, user: str, first: int) -> Path:
+        """File of the user's segment starting at game_id first."""
+        return self.path / f"{user}_{first:09d}.npy"
+
+    def segments(self) -> dict:
+        """{(user, first game_id): memory-mapped segment array}, refreshed when files change."""
+        # Other processes may add and remove segments while this one reads (run_pipeline --jobs),
+        # so a file that vanishes between the scan and the load is skipped
+        files = {}
+        if self.path.exists():
+            with os.scandir(self.path) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".npy"):
+                        try:
+                            files[entry.name] = entry.stat().st_mtime_ns
+                        except FileNotFoundError:
+                            continue
+
+        segments = {}
+        for name, mtime in sorted(files.items()):
+            cached = self._segments.get(name)
+            if cached and cached[0] == mtime:
+                table = cached[1]
+            else:
+                try:
+                    table = np.load(self.path / name, mmap_mode="r")
+                except FileNotFoundError:
+                    continue
+            segments[name] = (mtime, table)
+        self._segments = segments
+
+        result = {}
+        for name, (_, table) in segments.items():
+            user, first = name[:-len(".npy")].rsplit("_", 1)
+            result[(user, int(first))] = table
+        return result
+
+    def __len__(self) -> int:
+        return sum(table.shape[1] for table in self.segments().values())
+
+    @property
+    def users(self) -> list:
+        return sorted({user for user, _ in self.segments()})
+
+    def add(self, user: str, signatures: np.ndarray) -> Path:
+        """
+        Store one batch of a user's plies, replacing the user's segments from
+        its first game_id on.
+
+        Parameters:
+        -----------
+        user : str
+            Name the hits are reported under (e.g. short_name(username))
+        signatures : np.ndarray
+            SIGNATURE_DTYPE rows, e.g. PGNData.signatures
+
+        Returns:
+        --------
+        Path
+            The segment file, or None for an empty batch
+        """
+        if len(signatures) == 0:
+            return None
+        first = int(signatures["game_id"].min())
+        self.path.mkdir(parents=True, exist_ok=True)
+        for old_user, old_first in self.segments():
+            if old_user == user and old_first >= first:
+                self.segment_path(old_user, old_first).unlink(missing_ok=True)
+
+        rows = np.asarray(signatures, dtype=SIGNATURE_DTYPE)
+        rows = rows[np.argsort(rows["key"], kind="stable")]
+        table = np.empty((len(COLUMNS), len(rows)), dtype=np.uint64)
+        for i, column in enumerate(COLUMNS[:GAME_PLY]):
+            table[i] = rows[column]
+        table[GAME_PLY] = (rows["game_id"].astype(np.uint64) << np.uint64(16)) | rows["ply"]
+        out = self.segment_path(user, first)
+        tmp = out.with_suffix(".npy.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, table)
+        tmp.replace(out)
+
+        print(f"Indexed {len(rows)} positions of {user} (games {first}..{int(rows['game_id'].max())})")
+        return out
+
+    def remove(self, user: str) -> None:
+        """Drop every segment of user."""
+        for old_user, old_first in self.segments():
+            if old_user == user:
+                self.segment_path(old_user, old_first).unlink(missing_ok=True)
+
+    @staticmethod
+    def _hits(user: str, game_ply: np.ndarray, **columns) -> pd.DataFrame:
+        return pd.DataFrame({"user": user, "game_id": (game_ply >> np.uint64(16)).astype(np.uint32),
+                             "ply": (game_ply & np.uint64(0xFFFF)).astype(np.uint16), **columns})
+
+    @staticmethod
+    def _concat(parts: list, columns: list) -> pd.DataFrame:
+        if not parts:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(parts, ignore_index=True)[columns]
+
+    def lookup(self, position, users: list = None) -> pd.DataFrame:
+        """
+        Every ply that reached position.
+
+        Parameters:
+        -----------
+        position : str, chess.Board or int
+            FEN, board or position_key
+        users : list, optional
+            Only search these users' segments (default: all)
+
+        Returns:
+        --------
+        pd.DataFrame
+            'user', 'game_id', 'ply', ordered by user, game_id and ply
+        """
+        key = position if isinstance(position, (int, np.integer)) else position_signature(position)[0]
+        key = np.uint64(key)
+
+        parts = []
+        for (user, _), table in self.segments().items():
+            if users is not None and user not in users:
+                continue
+            keys = table[KEY]
+            lo, hi = np.searchsorted(keys, key, side="left"), np.searchsorted(keys, key, side="right")
+            if hi > lo:
+                parts.append(self._hits(user, table[GAME_PLY, lo:hi]))
+
+        hits = self._concat(parts, ["user", "game_id", "ply"])
+        return hits.sort_values(["user", "game_id", "ply"], ignore_index=True)
+
+    def similar(self, position, max_distance: int = 4, pawns_only: bool = False,
+                users: list = None, limit: int = 1000) -> pd.DataFrame:
+        """
+        Plies whose position differs from position in at most max_distance squares.
+
+        The distance is the number of bitboard bits that differ: a piece that
+        moved to another square counts 2, a captured piece 1. With
+        pawns_only, only the pawn bitboards are compared, so max_distance=0
+        finds the same pawn structure whatever the pieces.
+
+        Parameters:
+        -----------
+        position : str or chess.Board
+            FEN or board to compare with
+        max_distance : int
+            Largest distance returned (default: 4)
+        pawns_only : bool
+            Compare pawn structure only (default: False)
+        users : list, optional
+            Only search these users' segments (default: all)
+        limit : int, optional
+            Return the closest limit plies; None for all (default: 1000)
+
+        Returns:
+        --------
+        pd.DataFrame
+            'user', 'game_id', 'ply', 'distance', closest first
+        """
+        _, query = position_signature(position)
+        words = PAWN_WORDS if pawns_only else SIGNATURE_WORDS
+
+        parts = []
+        for (user, _), table in self.segments().items():
+            if users is not None and user not in users:
+                continue
+            # The partial sum only grows, so plies over max_distance drop out after each word;
+            # at most 16 pieces and 8 pawns per side keep the summed counts within uint8
+            rows, distance = None, 0
+            for word in words:
+                i = SIGNATURE_WORDS.index(word)
+                column = table[1 + i] if rows is None else table[1 + i][rows]
+                distance = distance + np.bitwise_count(column ^ np.uint64(query[i]))
+                close = np.flatnonzero(distance <= max_distance)
+                rows, distance = (close if rows is None else rows[close]), distance[close]
+            if limit is not None and len(rows) > limit:
+                # The closest limit plies overall are among each segment's closest limit
+                closest = np.argpartition(distance, limit - 1)[:limit]
+                rows, distance = rows[closest], distance[closest]
+            if len(rows):
+                parts.append(self._hits(user, table[GAME_PLY, rows], distance=distance))
+
+        hits = self._concat(parts, ["user", "game_id", "ply", "distance"])
+        hits = hits.sort_values(["distance", "user", "game_id", "ply"], ignore_index=True)
+        return hits if limit is None else hits.head(limit)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build or query the position search index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="index a user's whole PGN, replacing their segments")
+    build.add_argument("user")
+    build.add_argument("pgn")
+    build.add_argument("--workers", type=int, default=1)
+    find = commands.add_parser("find", help="games that reached a position")
+    find.add_argument("fen")
+    find.add_argument("--distance", type=int, default=None,
+                      help="similar positions up to this distance instead of exact matches")
+    find.add_argument("--pawns", action="store_true", help="compare pawn structure only")
+    find.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--index", default=DEFAULT_PATH)
+    args = parser.parse_args()
+
+    index = PositionIndex(args.index)
+    if args.command == "build":
+        from Ingestion.pgndata import PGNData
+        index.remove(args.user)
+        index.add(args.user, PGNData(args.pgn, workers=args.workers).signatures)
+    else:
+        start = time.perf_counter()
+        if args.distance is None and not args.pawns:
+            hits = index.lookup(args.fen)
+        else:
+            hits = index.similar(args.fen, max_distance=args.distance or 0, pawns_only=args.pawns, limit=None)
+        print(f"{len(hits)} plies in {(time.perf_counter() - start) * 1000:.1f} ms "
+              f"({len(index)} indexed)")
+        print(hits.head(args.limit).to_string(index=False))
@@ -0,0 +1,236 @@
+"""
+Per-game and per-opening summary tables, maintained at load time.
+
+Dashboard questions (game length, first mate ply, opening frequency and
+score, Elo spread, accuracy, time usage) otherwise scan every ply of
+game_data. update_summaries computes them once per loaded batch:
+
+    game_summary      one row per game: result and score from the
+                      protagonist's side, their color (1 white, -1 black,
+                      as ProtColor in Query/update_table_practice.sql), Elo
+                      difference (as EloSpread), plies, first ply with a
+                      mate on the board, accuracy and time usage of both sides
+    opening_summary   one row per ECO code aggregated from game_summary
+
+An incremental update only touches the games of the batch: game_summary rows
+from the batch's first game_id on are replaced, and only the openings that
+appear in the replaced or new rows are re-aggregated (from game_summary, not
+from the moves). Columns the loaded frames do not have (e.g. no accuracy
+before Processing.move_quality) are left NULL.
+
+Usage:
+    from Processing.summary_tables import update_summaries
+    update_summaries(con, user="stak1")                        # rebuild both tables
+    update_summaries(con, user="stak1", first_game_id=501)     # after appending games 501..
+
+    SELECT eco, games, score, avg_plies FROM opening_summary ORDER BY games DESC;
+"""
+
+import duckdb
+
+GAME_SUMMARY = "game_summary"
+OPENING_SUMMARY = "opening_summary"
+
+GAME_SUMMARY_COLUMNS = """
+    game_id INTEGER PRIMARY KEY,
+    start_time TIMESTAMP,
+    eco VARCHAR,
+    time_control VARCHAR,
+    variant VARCHAR,
+    result VARCHAR,
+    termination VARCHAR,
+    protagonist_color TINYINT,
+    opponent VARCHAR,
+    score DOUBLE,
+    protagonist_elo SMALLINT,
+    opponent_elo SMALLINT,
+    elo_diff SMALLINT,
+    plies SMALLINT,
+    first_mate_ply SMALLINT,
+    protagonist_accuracy REAL,
+    opponent_accuracy REAL,
+    protagonist_blunders SMALLINT,
+    protagonist_time_spent REAL,
+    opponent_time_spent REAL,
+    protagonist_min_clock REAL,
+    protagonist_pressure_moves SMALLINT
+"""
+
+OPENING_SUMMARY_COLUMNS = """
+    eco VARCHAR,
+    games INTEGER,
+    white_games INTEGER,
+    wins INTEGER,
+    draws INTEGER,
+    losses INTEGER,
+    score DOUBLE,
+    avg_plies DOUBLE,
+    avg_elo_diff DOUBLE,
+    avg_opponent_elo DOUBLE,
+    avg_accuracy DOUBLE,
+    avg_opponent_accuracy DOUBLE,
+    mate_games INTEGER,
+    avg_first_mate_ply DOUBLE,
+    avg_time_spent DOUBLE,
+    first_played TIMESTAMP,
+    last_played TIMESTAMP
+"""
+
+
+def _protagonist(con: duckdb.DuckDBPyConnection) -> str:
+    """The player who appears in the most loaded games."""
+    row = con.execute("""
+        SELECT name FROM (SELECT White AS name FROM games UNION ALL SELECT Black FROM games)
+        WHERE name IS NOT NULL
+        GROUP BY lower(name), name ORDER BY COUNT(*) DESC LIMIT 1;
+    """).fetchone()
+    return row[0] if row else None
+
+
+def _game_summary_select(con: duckdb.DuckDBPyConnection) -> str:
+    """SELECT producing game_summary rows for games with game_id >= $first and protagonist $user."""
+    game_cols = {row[0] for row in con.execute("DESCRIBE games;").fetchall()}
+    move_cols = {row[0] for row in con.execute("DESCRIBE moves;").fetchall()}
+
+    def game(col):
+        return f'g."{col}"' if col in game_cols else "NULL"
+
+    def move(col):
+        return f'm."{col}"' if col in move_cols else "NULL"
+
+    def by_side(white, black):
+        # (protagonist, opponent) expressions from per-color ones
+        return (f"CASE g.side WHEN 1 THEN {white} WHEN -1 THEN {black} END",
+                f"CASE g.side WHEN 1 THEN {black} WHEN -1 THEN {white} END")
+
+    # Game-level accuracy from move_quality, else the mean of the move accuracies
+    white_accuracy = f"COALESCE({game('white_accuracy')}, s.white_move_accuracy)"
+    black_accuracy = f"COALESCE({game('black_accuracy')}, s.black_move_accuracy)"
+    elo = by_side(game("WhiteElo"), game("BlackElo"))
+    accuracy = by_side(white_accuracy, black_accuracy)
+    time_spent = by_side("s.white_time_spent", "s.black_time_spent")
+
+    return f"""
+        WITH ply_stats AS (
+            SELECT
+                m.game_id,
+                MAX(m.ply) AS plies,
+                MIN(CASE WHEN p.eval_mate IS NOT NULL THEN m.ply END) AS first_mate_ply,
+                AVG(CASE WHEN m.color THEN {move('move_accuracy')} END) AS white_move_accuracy,
+                AVG(CASE WHEN NOT m.color THEN {move('move_accuracy')} END) AS black_move_accuracy,
+                SUM(CASE WHEN m.color THEN {move('time_spent')} END) AS white_time_spent,
+                SUM(CASE WHEN NOT m.color THEN {move('time_spent')} END) AS black_time_spent,
+                MIN(CASE WHEN m.color THEN {move('clock_seconds')} END) AS white_min_clock,
+                MIN(CASE WHEN NOT m.color THEN {move('clock_seconds')} END) AS black_min_clock,
+                COUNT(CASE WHEN m.color AND {move('time_pressure')} THEN 1 END) AS white_pressure_moves,
+                COUNT(CASE WHEN NOT m.color AND {move('time_pressure')} THEN 1 END) AS black_pressure_moves
+            FROM moves m
+            JOIN positions p USING (position_id)
+            WHERE m.game_id >= $first
+            GROUP BY m.game_id
+        ),
+        sides AS (
+            SELECT *,
+                CASE WHEN lower(White) = lower($user) THEN 1
+                     WHEN lower(Black) = lower($user) THEN -1 END AS side
+            FROM games
+            WHERE game_id >= $first
+        )
+        SELECT
+            g.game_id,
+            {game('StartDateTime')} AS start_time,
+            {game('ECO')} AS eco,
+            {game('TimeControl')} AS time_control,
+            {game('Variant')} AS variant,
+            g.Result AS result,
+            {game('Termination')} AS termination,
+            g.side AS protagonist_color,
+            CASE g.side WHEN 1 THEN g.Black WHEN -1 THEN g.White END AS opponent,
+            CASE WHEN g.side IS NULL THEN NULL
+                 WHEN g.Result = '1/2-1/2' THEN 0.5
+                 WHEN g.Result = '1-0' THEN CASE g.side WHEN 1 THEN 1.0 ELSE 0.0 END
+                 WHEN g.Result = '0-1' THEN CASE g.side WHEN -1 THEN 1.0 ELSE 0.0 END END AS score,
+            {elo[0]} AS protagonist_elo,
+            {elo[1]} AS opponent_elo,
+            ({game('WhiteElo')} - {game('BlackElo')}) * g.side AS elo_diff,
+            s.plies,
+            s.first_mate_ply,
+            {accuracy[0]} AS protagonist_accuracy,
+            {accuracy[1]} AS opponent_accuracy,
+            {by_side(game('white_blunders'), game('black_blunders'))[0]} AS protagonist_blunders,
+            {time_spent[0]} AS protagonist_time_spent,
+            {time_spent[1]} AS opponent_time_spent,
+            {by_side('s.white_min_clock', 's.black_min_clock')[0]} AS protagonist_min_clock,
+            {by_side('s.white_pressure_moves', 's.black_pressure_moves')[0]} AS protagonist_pressure_moves
+        FROM sides g
+        LEFT JOIN ply_stats s USING (game_id)
+    """
+
+
+OPENING_SUMMARY_SELECT = f"""
+    SELECT
+        eco,
+        COUNT(*) AS games,
+        COUNT(CASE WHEN protagonist_color = 1 THEN 1 END) AS white_games,
+        COUNT(CASE WHEN score = 1 THEN 1 END) AS wins,
+        COUNT(CASE WHEN score = 0.5 THEN 1 END) AS draws,
+        COUNT(CASE WHEN score = 0 THEN 1 END) AS losses,
+        AVG(score) AS score,
+        AVG(plies) AS avg_plies,
+        AVG(elo_diff) AS avg_elo_diff,
+        AVG(opponent_elo) AS avg_opponent_elo,
+        AVG(protagonist_accuracy) AS avg_accuracy,
+        AVG(opponent_accuracy) AS avg_opponent_accuracy,
+        COUNT(first_mate_ply) AS mate_games,
+        AVG(first_mate_ply) AS avg_first_mate_ply,
+        AVG(protagonist_time_spent) AS avg_time_spent,
+        MIN(start_time) AS first_played,
+        MAX(start_time) AS last_played
+    FROM {GAME_SUMMARY} s
+    WHERE EXISTS (SELECT 1 FROM summary_openings o WHERE o.eco IS NOT DISTINCT FROM s.eco)
+    GROUP BY eco
+"""
+
+
+def update_summaries(con: duckdb.DuckDBPyConnection, user: str = None, first_game_id: int = None) -> None:
+    """
+    Bring game_summary and opening_summary up to date with the games/moves/positions tables.
+
+    Parameters:
+    -----------
+    con : duckdb.DuckDBPyConnection
+        Connection holding the star schema of Processing.load_duckdb
+    user : str, optional
+        Protagonist whose side score, Elo difference, accuracy and time are
+        taken from (default: the player in the most games)
+    first_game_id : int, optional
+        First game_id of the batch just loaded; summary rows from it on are
+        replaced and the openings they touch re-aggregated. None rebuilds
+        both tables (default: None)
+    """
+    user = user or _protagonist(con)
+    if first_game_id is None:
+        for table in (GAME_SUMMARY, OPENING_SUMMARY):
+            con.execute(f"DROP TABLE IF EXISTS {table};")
+        first_game_id = 0
+    con.execute(f"CREATE TABLE IF NOT EXISTS {GAME_SUMMARY} ({GAME_SUMMARY_COLUMNS});")
+    con.execute(f"CREATE TABLE IF NOT EXISTS {OPENING_SUMMARY} ({OPENING_SUMMARY_COLUMNS});")
+
+    batch = {"first": first_game_id}
+    # Openings of the rows being replaced, then of the new ones
+    con.execute(f"CREATE OR REPLACE TEMP TABLE summary_openings AS "
+                f"SELECT DISTINCT eco FROM {GAME_SUMMARY} WHERE game_id >= $first;", batch)
+    con.execute(f"DELETE FROM {GAME_SUMMARY} WHERE game_id >= $first;", batch)
+    con.execute(f"INSERT INTO {GAME_SUMMARY} BY NAME {_game_summary_select(con)};",
+                {**batch, "user": user})
+    con.execute(f"INSERT INTO summary_openings SELECT DISTINCT eco FROM {GAME_SUMMARY} "
+                f"WHERE game_id >= $first;", batch)
+
+    con.execute(f"DELETE FROM {OPENING_SUMMARY} o WHERE EXISTS "
+                f"(SELECT 1 FROM summary_openings b WHERE b.eco IS NOT DISTINCT FROM o.eco);")
+    con.execute(f"INSERT INTO {OPENING_SUMMARY} BY NAME {OPENING_SUMMARY_SELECT};")
+    openings = con.execute("SELECT COUNT(DISTINCT eco) FROM summary_openings;").fetchone()[0]
+    con.execute("DROP TABLE summary_openings;")
+
+    games = con.execute(f"SELECT COUNT(*) FROM {GAME_SUMMARY} WHERE game_id >= $first;", batch).fetchone()[0]
+    print(f"Summarized {games} games and {openings} openings into {GAME_SUMMARY}/{OPENING_SUMMARY}")
@@ -0,0 +1,258 @@
+"""
+Lean persistent UCI engine driver.
+
+Talks to any UCI engine (Stockfish, Lc0, a stub script) over pipes:
+- one 'uci' / 'isready' handshake per process, no per-position sync round trips;
+- 'position fen' and 'go depth' are sent in one write, and the next position
+  is queued while the engine is still searching (pipeline=True), so the
+  engine never waits on Python between searches;
+- no 'ucinewgame' between positions, so the transposition table carries over
+  from one position to the next (consecutive unique positions mostly come
+  from the same game);
+- one pass over the 'info' lines gives the score, best move, PV and, with
+  multipv > 1, the alternative lines of the same search;
+- the nodes each search reports are summed in UCIEngine.nodes, for
+  nodes/sec figures in run metrics.
+
+The engine binary is found by engine_path: explicit path, then the
+STOCKFISH_PATH environment variable, then "path" in engine.json at the
+project root, then 'stockfish' on PATH, then DEFAULT_PATH.
+
+Usage:
+    from Processing.uci_engine import UCIEngine
+    with UCIEngine(depth=20, threads=1, hash_mb=64) as engine:
+        engine.evaluate(fen)                          # 0.35 or 'M3', white's point of view
+        evals = list(engine.evaluate_many(fens))      # pipelined
+        engine.analyse(fen)                           # {'eval', 'best_move', 'pv', 'lines'}
+
+    STOCKFISH_PATH=/usr/games/stockfish python Pipelines/pgn_to_duckdb_test.py
+"""
+
+import json
+import os
+import shutil
+import subprocess
+from collections import deque
+from pathlib import Path
+
+ENV_VAR = "STOCKFISH_PATH"
+CONFIG_FILE = "engine.json"
+DEFAULT_PATH = r"C:\Tools\stockfish\stockfish-windows-x86-64-avx2.exe"
+
+
+class EngineError(RuntimeError):
+    """The engine process died or answered something unexpected."""
+
+
+def engine_config() -> dict:
+    """Contents of engine.json at the project root, or {} when there is none."""
+    config = Path(__file__).resolve().parents[1] / CONFIG_FILE
+    if not config.exists():
+        return {}
+    with open(config, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def engine_path(path: str = None) -> str:
+    """
+    Resolve the engine binary.
+
+    Parameters:
+    -----------
+    path : str, optional
+        Explicit path; wins over every other source
+
+    Returns:
+    --------
+    str
+        path, $STOCKFISH_PATH, engine.json "path", 'stockfish' on PATH or
+        DEFAULT_PATH, whichever is found first
+    """
+    return (path or os.environ.get(ENV_VAR) or engine_config().get("path")
+            or shutil.which("stockfish") or DEFAULT_PATH)
+
+
+def _white_pov(kind: str, value: int, white_to_move: bool):
+    """UCI score (side to move's view) as cp/100 float or 'M<n>' from white's view."""
+    if not white_to_move:
+        value = -value
+    if kind == "cp":
+        return value / 100.0
+    return f"M{value}"
+
+
+class UCIEngine:
+    """
+    One engine process kept alive across many searches.
+
+    Parameters:
+    -----------
+    path : str, optional
+        Engine binary, resolved with engine_path
+    depth : int
+        Search depth per position (default: 15)
+    threads, hash_mb : int
+        Threads and transposition table size in MB (default: 1, 16)
+    multipv : int
+        Lines per search; > 1 fills analyse()['lines'] (default: 1)
+    options : dict, optional
+        Extra UCI options; engine.json "options" are applied first
+    pipeline : bool
+        Queue the next position while the engine searches; turn off for
+        engines that do not read input during a search (default: True)
+    """
+    def __init__(self, path: str = None, depth: int = 15, threads: int = 1, hash_mb: int = 16,
+                 multipv: int = 1, options: dict = None, pipeline: bool = True):
+        self.path = engine_path(path)
+        self.depth = depth
+        self.multipv = multipv
+        self.pipeline = pipeline
+
+        self.settings = {"Threads": threads, "Hash": hash_mb, "MultiPV": multipv, "UCI_Chess960": "true"}
+        self.settings.update(engine_config().get("options", {}))
+        self.settings.update(options or {})
+        self.process = None
+        # Nodes and searches over the engine's lifetime, restarts included
+        self.nodes = 0
+        self.searches = 0
+        self._start()
+
+    def _start(self) -> None:
+        """Launch the process, handshake and apply the options."""
+        try:
+            self.process = subprocess.Popen([self.path], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                            stderr=subprocess.DEVNULL, text=True, bufsize=1)
+        except OSError as e:
+            raise EngineError(f"Cannot start engine {self.path!r} (set {ENV_VAR} or "
+                              f"{CONFIG_FILE}): {e}") from e
+
+        self._send("uci")
+        self._read_until("uciok")
+        self._send("\n".join(f"setoption name {name} value {value}" for name, value in self.settings.items()))
+        self.new_game()
+
+    def restart(self) -> None:
+        """Replace a dead or wedged engine process with a fresh one, same options."""
+        self.close()
+        self._start()
+
+    def _send(self, commands: str) -> None:
+        """Write one or more newline-separated commands in a single write."""
+        try:
+            self.process.stdin.write(commands + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise EngineError(f"Engine {self.path!r} exited") from e
+
+    def _readline(self) -> str:
+        line = self.process.stdout.readline()
+        if not line:
+            raise EngineError(f"Engine {self.path!r} exited (code {self.process.poll()})")
+        return line
+
+    def _read_until(self, token: str) -> None:
+        while not self._readline().startswith(token):
+            pass
+
+    def new_game(self) -> None:
+        """Clear the hash table (ucinewgame) and wait until the engine is ready."""
+        self._send("ucinewgame\nisready")
+        self._read_until("readyok")
+
+    def _go(self, fen: str) -> None:
+        self._send(f"position fen {fen}\ngo depth {self.depth}")
+
+    def _read_search(self, fen: str) -> dict:
+        """Collect the info lines of one search up to its bestmove."""
+        white_to_move = fen.split(" ")[1] != "b"
+        lines = {}
+        nodes = 0
+        while True:
+            line = self._readline()
+            if line.startswith("bestmove"):
+                tokens = line.split()
+                best_move = tokens[1] if len(tokens) > 1 and tokens[1] != "(none)" else None
+                break
+            if not line.startswith("info"):
+                continue
+
+            tokens = line.split()
+            if "nodes" in tokens:
+                # Cumulative for the search, so the last report is the total
+                nodes = int(tokens[tokens.index("nodes") + 1])
+            if "score" not in tokens:
+                continue
+            at = tokens.index("score")
+            number = int(tokens[tokens.index("multipv") + 1]) if "multipv" in tokens else 1
+            pv = tokens[tokens.index("pv") + 1:] if "pv" in tokens else []
+            # Later info lines are deeper; the last one per line number is the result
+            lines[number] = {"eval": _white_pov(tokens[at + 1], int(tokens[at + 2]), white_to_move),
+                             "pv": pv}
+
+        self.nodes += nodes
+        self.searches += 1
+        ranked = [lines[number] for number in sorted(lines)]
+        # A position with no legal moves: checkmate reports 'mate 0', stalemate 'cp 0'
+        main = ranked[0] if ranked else {"eval": None, "pv": []}
+        return {"eval": main["eval"], "best_move": best_move, "pv": main["pv"], "lines": ranked,
+                "nodes": nodes}
+
+    def analyse(self, fen: str) -> dict:
+        """
+        Search one position.
+
+        Returns:
+        --------
+        dict
+            'eval' (cp/100 float or 'M<n>', white's view), 'best_move' (UCI or
+            None), 'pv' (list of UCI moves), 'lines' (one {'eval', 'pv'} per
+            MultiPV line, best first) and 'nodes' searched
+        """
+        self._go(fen)
+        return self._read_search(fen)
+
+    def analyse_many(self, fens):
+        """Search many positions, yielding analyse() results in order; pipelined when enabled."""
+        ahead = 1 if self.pipeline else 0
+        pending = deque()
+        try:
+            for fen in fens:
+                self._go(fen)
+                pending.append(fen)
+                if len(pending) > ahead:
+                    yield self._read_search(pending.popleft())
+            while pending:
+                yield self._read_search(pending.popleft())
+        finally:
+            # A caller that stops early must not leave queued results for the next search
+            while pending and self.process.poll() is None:
+                self._read_search(pending.popleft())
+
+    def evaluate(self, fen: str):
+        """Eval of one position as cp/100 float or 'M<n>', from white's point of view."""
+        return self.analyse(fen)["eval"]
+
+    def evaluate_many(self, fens):
+        """Evals of many positions in order; pipelined when enabled."""
+        for result in self.analyse_many(fens):
+            yield result["eval"]
+
+    def close(self) -> None:
+        """Ask the engine to quit, killing it if it does not."""
+        if self.process is not None and self.process.poll() is None:
+            try:
+                self._send("quit")
+                self.process.wait(timeout=5)
+            except (EngineError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        if getattr(self, "process", None) is not None:
+            self.close()
@@ -55,4 +55,55 @@ def repopulate_unique_evals(moves_df, unique_fen_series):
     # This preserves the original row order
     moves_df['eval'] = moves_df['fen'].map(unique_fen_series)
     
-    return moves_df
\ No newline at end of file
+    return moves_df
+
+
+def unique_positions(moves_df):
+    """
+    Extract unique positions from a moves dataframe by their 64-bit position key.
+
+    Parameters:
+    -----------
+    moves_df : pandas.DataFrame
+        DataFrame containing 'position_key' (Zobrist hash) and 'fen' columns
+
+    Returns:
+    --------
+    pandas.DataFrame
+        DataFrame indexed by unique position_key, with the first FEN seen for
+        each key and an 'eval' column of NaN placeholders; attrs['trusted_fens']
+        is copied from moves_df
+    """
+    # Integer keys hash much faster than FEN strings and merge
+    # transpositions that differ only in the move counters
+    positions = moves_df.drop_duplicates(subset='position_key').set_index('position_key')[['fen']]
+    positions['eval'] = pd.Series(np.nan, index=positions.index, dtype=object)
+    # Keep ingestion's trusted-FEN flag so evaluation can skip revalidation
+    positions.attrs['trusted_fens'] = moves_df.attrs.get('trusted_fens', False)
+
+    # Reveal number of unique positions found
+    print(f"Found {len(positions)} unique positions from {len(moves_df)} total.")
+    print(f"Computational reduction: {100 * (1 - len(positions) / len(moves_df)):.2f}%")
+
+    return positions
+
+
+def repopulate_position_evals(moves_df, positions):
+    """
+    Map evaluations from unique positions back to the original moves dataframe.
+
+    Parameters:
+    -----------
+    moves_df : pandas.DataFrame
+        Original DataFrame containing a 'position_key' column
+    positions : pandas.DataFrame
+        Output of unique_positions with the 'eval' column filled in
+
+    Returns:
+    --------
+    pandas.DataFrame
+        The moves_df with its 'eval' column set from the matching position
+    """
+    moves_df['eval'] = moves_df['position_key'].map(positions['eval'])
+
+    return moves_df
@@ -0,0 +1,39 @@
+-- Dashboard versions of the explore / mate_patterns / groupby / update_table queries,
+-- reading the per-game and per-opening tables maintained by the loader
+
+-- Average plys per game
+SELECT
+    AVG(plies) AS avg_plys,
+    MIN(plies) AS shortest_game,
+    MAX(plies) AS longest_game
+FROM game_summary;
+
+-- Top 50 longest games
+SELECT game_id, plies AS max_ply
+FROM game_summary
+ORDER BY plies DESC
+LIMIT 50;
+
+-- Average ply where first mate instance is on the board
+SELECT AVG(first_mate_ply) AS avg_first_mate_ply
+FROM game_summary;
+
+-- Percentage of games with mate on the board
+SELECT (CAST(COUNT(first_mate_ply) AS FLOAT) / COUNT(*)) * 100 AS perc_with_mate
+FROM game_summary;
+
+-- Protagonist color and ELO spread, without ALTER/UPDATE on the ply table
+SELECT game_id, protagonist_color, protagonist_elo, opponent_elo, elo_diff
+FROM game_summary
+LIMIT 30;
+
+-- Opening frequency and score
+SELECT eco, games, white_games, wins, draws, losses, score
+FROM opening_summary
+ORDER BY games DESC;
+
+-- Openings where accuracy and time usage differ most from the average
+SELECT eco, games, avg_accuracy, avg_opponent_accuracy, avg_time_spent
+FROM opening_summary
+WHERE games >= 10
+ORDER BY avg_accuracy;
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Minimal UCI engine for benchmarks and tests: answers instantly (or after
+STUB_ENGINE_DELAY seconds per search) with a score derived from a CRC of the
+FEN, so results are deterministic and engine time is not what gets measured.
+Scores are from the side to move's point of view, as real engines report them.
+
+A search of the position STUB_ENGINE_CRASH (a FEN) makes the engine exit
+without answering, standing in for an engine that crashes on a position.
+
+Usage:
+    STOCKFISH_PATH=Tests/fixtures/stub_engine.py python Benchmarks/run_benchmarks.py
+    STUB_ENGINE_CRASH="<fen>" python -m pytest Tests
+"""
+
+import os
+import sys
+import time
+import zlib
+
+DELAY = float(os.environ.get("STUB_ENGINE_DELAY", "0"))
+CRASH_FEN = os.environ.get("STUB_ENGINE_CRASH")
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+
+def out(line: str) -> None:
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+
+
+def score(fen: str, line: int = 1) -> str:
+    """UCI score of MultiPV line (1 = best) for fen: a mate for one FEN in 50, else centipawns."""
+    crc = zlib.crc32(fen.encode())
+    if crc % 50 == 0 and line == 1:
+        return f"mate {crc % 7 - 3 or 1}"
+    return f"cp {crc % 600 - 300 - 10 * (line - 1)}"
+
+
+def main() -> None:
+    fen = START_FEN
+    multipv = 1
+    out("Stub UCI engine")
+    for line in sys.stdin:
+        tokens = line.split()
+        if not tokens:
+            continue
+        command = tokens[0]
+
+        if command == "uci":
+            out("id name StubEngine")
+            out("option name Hash type spin default 16 min 1 max 33554432")
+            out("option name Threads type spin default 1 min 1 max 1024")
+            out("option name MultiPV type spin default 1 min 1 max 500")
+            out("option name UCI_Chess960 type check default false")
+            out("uciok")
+        elif command == "isready":
+            out("readyok")
+        elif command == "setoption" and len(tokens) >= 5 and tokens[2] == "MultiPV":
+            multipv = int(tokens[4])
+        elif command == "position" and len(tokens) > 7 and tokens[1] == "fen":
+            fen = " ".join(tokens[2:8])
+        elif command == "go":
+            depth = int(tokens[tokens.index("depth") + 1]) if "depth" in tokens else 10
+            if fen == CRASH_FEN:
+                sys.exit(1)
+            if DELAY:
+                time.sleep(DELAY)
+            for k in range(1, multipv + 1):
+                out(f"info depth {depth} seldepth {depth} multipv {k} score {score(fen, k)} "
+                    f"nodes {1000 * depth} nps 1000000 pv e2e4 e7e5")
+            out("bestmove e2e4 ponder e7e5")
+        elif command == "quit":
+            break
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Bulk clock parsing (Ingestion.movedata.clock_seconds) and the per-move time
+features, checked against the per-row str.split parse they replaced.
+
+Run with: python -m pytest Tests
+"""
+
+# Establish project root and add to PATH
+from pathlib import Path
+import sys
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+import random
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from Ingestion.movedata import clock_seconds, clock_to_deciseconds
+from Processing.clock_features import add_time_features, parse_time_control
+
+
+def split_seconds(clock) -> float:
+    """The old per-row parse: split on ':' and add the fields in base 60."""
+    if not isinstance(clock, str) or not clock:
+        return np.nan
+    seconds = 0.0
+    for part in clock.split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def split_deciseconds(clock: pd.Series) -> pd.Series:
+    """The old clock_to_deciseconds, for 'H:MM:SS.s' clocks."""
+    parts = clock.str.split(":", expand=True)
+    seconds = (parts[0].astype(float) * 3600
+               + parts[1].astype(float) * 60
+               + parts[2].astype(float))
+    return (seconds * 10).round().astype("Int32")
+
+
+class ClockSecondsTest(unittest.TestCase):
+    CASES = [
+        ("0:03:00", 180.0),
+        ("0:02:58.9", 178.9),
+        ("1:00:00", 3600.0),
+        ("12:34:56.7", 45296.7),
+        ("0:00:00.1", 0.1),
+        ("0:00:09.95", 9.95),
+        ("2:59", 179.0),
+        ("0:07.5", 7.5),
+        ("45", 45.0),
+        ("100:00:00", 360000.0),
+    ]
+
+    def test_table(self):
+        clocks, expected = zip(*self.CASES)
+        np.testing.assert_allclose(clock_seconds(list(clocks)), expected)
+        for clock, seconds in self.CASES:
+            self.assertAlmostEqual(split_seconds(clock), seconds)
+
+    def test_missing(self):
+        result = clock_seconds(["0:01:00", None, np.nan, "", pd.NA, "0:00:05"])
+        np.testing.assert_array_equal(np.isnan(result), [False, True, True, True, True, False])
+        self.assertEqual(result[0], 60.0)
+        self.assertEqual(result[5], 5.0)
+        self.assertTrue(np.isnan(clock_seconds([None, None])).all())
+        self.assertEqual(len(clock_seconds([])), 0)
+
+    def test_matches_split_parse(self):
+        rng = random.Random(16)
+        clocks = []
+        for _ in range(5000):
+            h, m, s = rng.randrange(3), rng.randrange(60), rng.randrange(60)
+            tenths = rng.choice(["", f".{rng.randrange(10)}"])
+            clocks.append(rng.choice([f"{h}:{m:02d}:{s:02d}{tenths}", f"{m}:{s:02d}{tenths}", None]))
+        np.testing.assert_allclose(clock_seconds(clocks), [split_seconds(c) for c in clocks])
+
+        full = pd.Series([c for c in clocks if c and c.count(":") == 2], dtype=object)
+        pd.testing.assert_series_equal(clock_to_deciseconds(full), split_deciseconds(full))
+
+    def test_deciseconds(self):
+        result = clock_to_deciseconds(pd.Series(["0:03:00", None, "0:00:00.1"], index=[5, 6, 7], dtype=object))
+        self.assertEqual(str(result.dtype), "Int32")
+        self.assertEqual(list(result.index), [5, 6, 7])
+        self.assertEqual(result[5], 1800)
+        self.assertTrue(pd.isna(result[6]))
+        self.assertEqual(result[7], 1)
+
+
+class TimeFeaturesTest(unittest.TestCase):
+    def frames(self, plies: list, time_controls: dict):
+        """move_df from (game_id, ply, clock) rows and meta_df from {game_id: TimeControl}."""
+        move_df = pd.DataFrame(plies, columns=["game_id", "ply", "clock"])
+        meta_df = pd.DataFrame({"TimeControl": list(time_controls.values())},
+                               index=pd.Index(list(time_controls), name="game_id"))
+        return move_df, meta_df
+
+    def test_parse_time_control(self):
+        parts = parse_time_control(pd.Series(["180+2", "600", "1/86400", None, "-"]))
+        self.assertEqual(parts["base"].tolist()[:2], [180.0, 600.0])
+        self.assertEqual(parts["increment"].tolist()[:2], [2.0, 0.0])
+        self.assertTrue(parts.iloc[2:].isna().all().all())
+
+    def test_time_spent_with_increment(self):
+        move_df, meta_df = self.frames([
+            # game_id, ply, clock               time spent (180+2)
+            (1, 1, "0:03:00"),                  # 180 - 180 + 2 = 2
+            (1, 2, "0:02:59.5"),                # 180 - 179.5 + 2 = 2.5
+            (1, 3, "0:02:50"),                  # 180 - 170 + 2 = 12
+            (1, 4, "0:03:01.5"),                # 179.5 - 181.5 + 2 = 0
+            (1, 5, None),                       # no clock: NaN
+            (1, 6, "0:03:02"),                  # 181.5 - 182 + 2 = 1.5
+            (1, 7, "0:02:49"),                  # previous clock missing: NaN
+            (2, 1, "9:59"),                     # 600 - 599 + 0 = 1
+            (2, 2, "0:09:00"),                  # 600 - 540 = 60
+            (2, 3, "0:09:58"),                  # 599 - 598 = 1
+            (3, 1, "23:59:59"),                 # daily: no base, NaN
+            (3, 2, "23:00:00"),
+        ], {1: "180+2", 2: "600", 3: "1/86400"})
+        df = add_time_features(move_df, meta_df)
+
+        expected = [2, 2.5, 12, 0, np.nan, 1.5, np.nan, 1, 60, 1, np.nan, np.nan]
+        np.testing.assert_allclose(df["time_spent"].values, expected, atol=1e-5)
+        np.testing.assert_allclose(df["clock_seconds"].values[:3], [180, 179.5, 170])
+        self.assertEqual(df["time_spent"].dtype, np.float32)
+        self.assertEqual(df["clock_seconds"].dtype, np.float32)
+
+        # The compact schema's Int32 deciseconds give the same features
+        compact = move_df.assign(clock=clock_to_deciseconds(move_df["clock"]))
+        pd.testing.assert_frame_equal(add_time_features(compact, meta_df.reset_index()).drop(columns="clock"),
+                                      df.drop(columns="clock"))
+
+    def test_pressure_and_scramble_thresholds(self):
+        move_df, meta_df = self.frames([
+            # game_id, ply, clock      pressure (< 18s of 180)  scramble (< 10s)
+            (1, 1, "0:00:18"),         # False                   False
+            (1, 2, "0:00:17.9"),       # True                    False
+            (1, 3, "0:00:10"),         # True                    False
+            (1, 4, "0:00:09.9"),       # True                    True
+            (1, 5, None),              # False                   False
+            (2, 1, "0:00:05"),         # daily, no base: False   True
+        ], {1: "180+2", 2: "1/86400"})
+        df = add_time_features(move_df, meta_df)
+        self.assertEqual(df["time_pressure"].tolist(), [False, True, True, True, False, False])
+        self.assertEqual(df["time_scramble"].tolist(), [False, False, False, True, False, True])
+
+        # 6% of 180 is 10.8s
+        df = add_time_features(move_df, meta_df, pressure_fraction=0.06, scramble_seconds=5)
+        self.assertEqual(df["time_pressure"].tolist(), [False, False, True, True, False, False])
+        self.assertEqual(df["time_scramble"].tolist(), [False, False, False, False, False, False])
+
+    def test_unknown_game(self):
+        move_df, meta_df = self.frames([(9, 1, "0:01:00"), (9, 2, "0:00:59")], {1: "60"})
+        df = add_time_features(move_df, meta_df)
+        self.assertTrue(df["time_spent"].isna().all())
+        self.assertFalse(df["time_pressure"].any())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+"""
+download_pgn against a local stub of the Chess.com archive API.
+
+Run with: python -m pytest Tests
+"""
+
+# Establish project root and add to PATH
+from pathlib import Path
+import sys
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+import hashlib
+import json
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest import mock
+
+import chess.pgn
+
+import Ingestion.download_pgn as downloader
+from Ingestion.download_pgn import download_pgn, load_manifest, mark_loaded, short_name
+
+USER = "stubtest_user"
+
+
+def month_pgn(month: str, games: int) -> str:
+    """A monthly archive of minimal games with distinct Link headers."""
+    return "\n\n".join(
+        f'[Event "Live Chess"]\n[Site "Chess.com"]\n[White "{USER}"]\n[Black "opp{i}"]\n[Result "1-0"]\n'
+        f'[Link "https://www.chess.com/game/live/{month.replace("/", "")}{i:03d}"]\n\n1. e4 e5 2. Qh5 Nc6 1-0'
+        for i in range(games)
+    ) + "\n"
+
+
+class StubArchive:
+    """Serves /archives and /<YYYY>/<MM>/pgn with ETags; failures are injected per month."""
+    def __init__(self, months: dict):
+        self.months = months
+        self.fail = {}          # month -> HTTP status for its next request
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def send(self, status, body=b"", headers=()):
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                stub.requests.append(self.path)
+                base = f"http://127.0.0.1:{stub.server.server_port}/pub/player/{USER}/games"
+                if self.path.endswith("/archives"):
+                    body = json.dumps({"archives": [f"{base}/{m}" for m in stub.months]}).encode()
+                    return self.send(200, body)
+                month = "/".join(self.path.split("/")[-3:-1])
+                if month in stub.fail:
+                    return self.send(stub.fail.pop(month), headers=[("Retry-After", "0")])
+                body = stub.months[month].encode()
+                etag = '"%s"' % hashlib.md5(body).hexdigest()
+                if self.headers.get("If-None-Match") == etag:
+                    return self.send(304)
+                self.send(200, body, [("ETag", etag)])
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.api_base = f"http://127.0.0.1:{self.server.server_port}/pub"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def read_links(path: Path) -> list:
+    links = []
+    with open(path, encoding="utf-8") as f:
+        while (game := chess.pgn.read_game(f)) is not None:
+            links.append(game.headers["Link"])
+    return links
+
+
+class DownloadPgnTest(unittest.TestCase):
+    def setUp(self):
+        # Archives and manifests go to a temporary Bronze directory, not Data/Bronze
+        self.tmp = tempfile.TemporaryDirectory()
+        self.bronze = Path(self.tmp.name)
+        patch = mock.patch.object(downloader, "BRONZE_DIR", self.bronze)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.name = short_name(USER)
+        self.stub = StubArchive({"2025/01": month_pgn("2025/01", 50), "2025/02": month_pgn("2025/02", 50),
+                                 "2025/03": month_pgn("2025/03", 50)})
+
+    def tearDown(self):
+        self.stub.close()
+        self.tmp.cleanup()
+
+    def download(self):
+        return download_pgn(USER, incremental=True, max_workers=1, api_base=self.stub.api_base)
+
+    def test_full_then_incremental(self):
+        new_file = self.download()
+        self.assertEqual(len(read_links(new_file)), 150)
+        mark_loaded(USER)
+        self.assertEqual(load_manifest(USER)["loaded"], 150)
+
+        # Unchanged months are answered 304 or skipped as complete; only the new month's games are pending
+        self.stub.months["2025/04"] = month_pgn("2025/04", 20)
+        new_file = self.download()
+        self.assertEqual(len(read_links(new_file)), 20)
+        self.assertEqual(len(read_links(self.bronze / f"{self.name}.pgn")), 170)
+
+    def test_retries_rate_limited_month(self):
+        self.stub.fail["2025/02"] = 429
+        new_file = self.download()
+        self.assertEqual(len(set(read_links(new_file))), 150)
+
+    def test_failed_month_leaves_no_duplicates(self):
+        # Months are fetched newest first; 2025/02 failing stops the run after 2025/03 was written
+        self.stub.fail["2025/02"] = 404
+        with self.assertRaises(Exception):
+            self.download()
+        self.assertEqual(len(load_manifest(USER)["links"]), len(read_links(self.bronze / f"{self.name}_new.pgn")))
+
+        new_file = self.download()
+        links = read_links(new_file)
+        self.assertEqual(len(links), 150)
+        self.assertEqual(len(set(links)), 150)
+        self.assertEqual(load_manifest(USER)["links"], links)
+        self.assertEqual(read_links(self.bronze / f"{self.name}.pgn"), links)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+"""
+EvalCache: the position_key-keyed DuckDB store, its migration from the old
+FEN-keyed table, and add_eval_to_series with a cache.
+
+Run with: python -m pytest Tests
+"""
+
+# Establish project root and add to PATH
+from pathlib import Path
+import sys
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+import tempfile
+import unittest
+
+import chess
+import chess.polyglot
+import duckdb
+import numpy as np
+import pandas as pd
+
+import Processing.add_eval as add_eval
+from Processing.eval_cache import EvalCache, fen_key, normalize_fen
+
+STUB = str(project_root / "Tests" / "fixtures" / "stub_engine.py")
+
+START = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+# After 1.e4, with and without the (uncapturable) en passant square: one Zobrist key
+E4_EP = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1"
+E4 = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"
+
+
+def evals(values: dict) -> pd.Series:
+    """Series of evals indexed by the position_key of each FEN."""
+    return pd.Series(list(values.values()), index=[fen_key(fen) for fen in values], dtype=object)
+
+
+class FenKeyTest(unittest.TestCase):
+    def test_matches_polyglot(self):
+        self.assertEqual(fen_key(START), chess.polyglot.zobrist_hash(chess.Board(START)))
+        self.assertEqual(fen_key(START), 0x463B96181691FC9C)
+        # Move counters and an uncapturable en passant square do not change the key
+        self.assertEqual(fen_key(E4), fen_key(E4_EP))
+        self.assertEqual(fen_key(E4), fen_key(E4.replace(" 0 1", " 3 17")))
+        self.assertEqual(normalize_fen(E4_EP), "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3")
+
+    def test_shredder_castling(self):
+        board = "bqnbrkrn/pppppppp/8/8/8/8/PPPPPPPP/BQNBRKRN w {} - 0 1"
+        keys = [fen_key(board.format(castling)) for castling in ("GEge", "Ge", "Eg", "G", "e", "-")]
+        self.assertEqual(len(set(keys)), len(keys))
+        # Shredder letters for the standard rooks give the standard key
+        self.assertEqual(fen_key(START.replace("KQkq", "HAha")), fen_key(START))
+
+    def test_rejects_invalid_fen(self):
+        with self.assertRaises(ValueError):
+            fen_key("not a fen")
+
+
+class EvalCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = str(Path(self.tmp.name) / "eval_cache.duckdb")
+        self.cache = EvalCache(self.db_path)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def test_get_put(self):
+        self.cache.put(evals({START: 0.3, E4: "M-4"}), depth=20)
+        result = self.cache.get([fen_key(START), fen_key(E4), 12345], depth=20)
+        self.assertEqual(list(result.index), [fen_key(START), fen_key(E4), 12345])
+        self.assertEqual(result.iloc[0], 0.3)
+        self.assertEqual(result.iloc[1], "M-4")
+        self.assertTrue(pd.isna(result.iloc[2]))
+
+        # A shallower eval is not a hit for a deeper request
+        self.assertTrue(self.cache.get([fen_key(START)], depth=21).isna().all())
+        self.assertEqual(self.cache.get([fen_key(START)], depth=12).iloc[0], 0.3)
+
+    def test_keeps_deepest_eval(self):
+        self.cache.put(evals({START: 0.3}), depth=20)
+        self.cache.put(evals({START: 0.1}), depth=12)
+        self.assertEqual(self.cache.get([fen_key(START)], depth=12).iloc[0], 0.3)
+
+        self.cache.put(evals({START: "M7"}), depth=25)
+        self.assertEqual(self.cache.get([fen_key(START)], depth=25).iloc[0], "M7")
+        row = self.cache.con.execute("SELECT depth, cp, mate FROM position_evals").fetchall()
+        self.assertEqual(row, [(25, None, 7)])
+
+        # Duplicate keys within one put keep the deeper of the batch; missing evals are skipped
+        self.cache.put(pd.Series([0.5, None], index=[fen_key(E4), fen_key(START)], dtype=object), depth=10)
+        self.cache._upsert(pd.DataFrame({"position_key": np.array([fen_key(E4)] * 2, dtype=np.uint64),
+                                         "depth": [14, 18], "cp": [0.2, 0.4], "mate": [None, None]}))
+        self.assertEqual(self.cache.get([fen_key(E4)], depth=18).iloc[0], 0.4)
+        self.assertEqual(self.cache.get([fen_key(START)], depth=25).iloc[0], "M7")
+
+    def test_persists(self):
+        self.cache.put(evals({START: 0.25}), depth=16)
+        self.cache.close()
+        self.cache = EvalCache(self.db_path)
+        self.assertEqual(self.cache.get([fen_key(START)], depth=16).iloc[0], 0.25)
+
+
+class MigrationTest(unittest.TestCase):
+    def test_migrates_fen_evals(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = str(Path(tmp) / "eval_cache.duckdb")
+            con = duckdb.connect(db_path)
+            con.execute("CREATE TABLE fen_evals (fen VARCHAR PRIMARY KEY, depth INTEGER, cp DOUBLE, mate INTEGER);")
+            con.executemany("INSERT INTO fen_evals VALUES (?, ?, ?, ?);", [
+                (normalize_fen(START), 20, 0.3, None),
+                # Two normalized FENs of one position: the deeper eval wins
+                (normalize_fen(E4_EP), 12, -0.1, None),
+                (normalize_fen(E4), 18, None, 3),
+            ])
+            con.close()
+
+            cache = EvalCache(db_path)
+            try:
+                tables = {row[0] for row in cache.con.execute("SHOW TABLES;").fetchall()}
+                self.assertEqual(tables, {"position_evals"})
+                result = cache.get([fen_key(START), fen_key(E4)], depth=12)
+                self.assertEqual(list(result.values), [0.3, "M3"])
+                self.assertTrue(cache.get([fen_key(E4)], depth=19).isna().all())
+            finally:
+                cache.close()
+
+            # Opening the migrated cache again is a no-op
+            cache = EvalCache(db_path)
+            try:
+                self.assertEqual(cache.con.execute("SELECT COUNT(*) FROM position_evals").fetchone()[0], 2)
+            finally:
+                cache.close()
+
+
+class AddEvalCacheTest(unittest.TestCase):
+    def setUp(self):
+        add_eval.ENGINE_PATH = STUB
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = EvalCache(str(Path(self.tmp.name) / "eval_cache.duckdb"))
+
+    def tearDown(self):
+        add_eval.ENGINE_PATH = None
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def test_invalid_fens_skip_the_cache(self):
+        self.cache.put(evals({START: 0.3}), depth=12)
+        invalid = ["not a fen", "8/8/8/8/8/8/8/8 w - - 0 1", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0"]
+        series = pd.Series(None, index=[START] + invalid + [E4], dtype=object)
+        stats = {}
+        result = add_eval.add_eval_to_series(series, depth=12, cache=self.cache, stats=stats)
+
+        self.assertEqual(result[START], 0.3)
+        for fen in invalid:
+            self.assertIsNone(result[fen])
+        self.assertIsNotNone(result[E4])
+        # Only the two valid FENs were looked up, and only the miss was searched and stored
+        self.assertEqual(stats["lookups"], 2)
+        self.assertEqual(stats["cache_hits"], 1)
+        self.assertEqual(stats["engine_positions"], 1)
+        self.assertEqual(self.cache.get([fen_key(E4)], depth=12).iloc[0], result[E4])
+        self.assertEqual(self.cache.con.execute("SELECT COUNT(*) FROM position_evals").fetchone()[0], 2)
+
+    def test_all_invalid(self):
+        series = pd.Series(None, index=["not a fen", "8/8/8/8/8/8/8/8 w - - 0 1"], dtype=object)
+        result = add_eval.add_eval_to_series(series, depth=12, cache=self.cache)
+        self.assertTrue(result.isna().all())
+
+
+if __name__ == "__main__":
+    unittest.main()
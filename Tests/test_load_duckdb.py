@@ -0,0 +1,105 @@
+"""
+load_star_schema / load_game_data with string clocks and with the compact
+schema's integer decisecond clocks.
+
+Run with: python -m pytest Tests
+"""
+
+# Establish project root and add to PATH
+from pathlib import Path
+import sys
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+import datetime
+import unittest
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+from Ingestion.movedata import clock_to_deciseconds
+from Processing.load_duckdb import load_star_schema, load_game_data
+
+START = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+E4 = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"
+E4E5 = "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2"
+
+CLOCKS = ["0:03:00", "0:02:58.9", None, "1:00:00", "23:59:59.9"]
+TIMES = [datetime.time(0, 3), datetime.time(0, 2, 58, 900000), None,
+         datetime.time(1), datetime.time(23, 59, 59, 900000)]
+
+
+def frames():
+    """meta_df and a string-clock move_df for two games."""
+    meta_df = pd.DataFrame({
+        "game_id": [1, 2], "White": ["stak1", "rival"], "Black": ["rival", "stak1"],
+        "Result": ["1-0", "0-1"], "WhiteElo": [1500, 1520], "BlackElo": [1510, 1490],
+        "TimeControl": ["180", "3600"], "ECO": ["C20", "C20"],
+    })
+    move_df = pd.DataFrame({
+        "game_id": [1, 1, 1, 2, 2],
+        "ply": [1, 2, 3, 1, 2],
+        "color": [True, False, True, True, False],
+        "move": ["e4", "e5", "Nf3", "e4", "e5"],
+        "clock": pd.Series(CLOCKS, dtype=object),
+        "eval": [0.3, 0.35, "M4", 0.3, 0.35],
+        "fen": [E4, E4E5, START, E4, E4E5],
+    })
+    return meta_df, move_df
+
+
+def compact(move_df: pd.DataFrame) -> pd.DataFrame:
+    """move_df with the compact schema's types (MoveBuffers.compact_frame)."""
+    return move_df.assign(
+        game_id=move_df["game_id"].astype(np.uint32),
+        ply=move_df["ply"].astype(np.uint16),
+        move=pd.Categorical(move_df["move"]),
+        clock=clock_to_deciseconds(move_df["clock"]),
+    )
+
+
+class LoadClockTest(unittest.TestCase):
+    def setUp(self):
+        self.con = duckdb.connect()
+
+    def tearDown(self):
+        self.con.close()
+
+    def clocks(self, table: str) -> list:
+        return [row[0] for row in self.con.execute(f"SELECT clock FROM {table} ORDER BY game_id, ply").fetchall()]
+
+    def test_star_schema_both_clock_shapes(self):
+        meta_df, move_df = frames()
+        for moves in (move_df, compact(move_df)):
+            load_star_schema(self.con, meta_df, moves, user="stak1")
+            self.assertEqual(self.clocks("game_data"), TIMES)
+            column_type = self.con.execute(
+                "SELECT data_type FROM information_schema.columns WHERE table_name = 'moves' AND column_name = 'clock'"
+            ).fetchone()[0]
+            self.assertEqual(column_type, "TIME")
+
+        # Appending compact moves to a table loaded from string clocks
+        load_star_schema(self.con, meta_df, move_df, user="stak1")
+        later = compact(move_df).assign(game_id=move_df["game_id"] + 2)
+        load_star_schema(self.con, meta_df.assign(game_id=[3, 4]), later, append=True, user="stak1")
+        self.assertEqual(self.clocks("game_data"), TIMES * 2)
+
+    def test_game_data_both_clock_shapes(self):
+        meta_df, move_df = frames()
+        merged = move_df.merge(meta_df, on="game_id")
+        load_game_data(self.con, merged)
+        load_game_data(self.con, compact(merged), table="compact_game_data")
+        self.assertEqual(self.clocks("game_data"), TIMES)
+        self.assertEqual(self.clocks("compact_game_data"), TIMES)
+
+    def test_clock_out_of_range_fails(self):
+        meta_df, move_df = frames()
+        for clock in ("25:00:00", np.int32(900000)):
+            moves = move_df.assign(clock=pd.Series([clock] * len(move_df)))
+            with self.assertRaises(duckdb.ConversionException):
+                load_game_data(self.con, moves.merge(meta_df, on="game_id"))
+
+
+if __name__ == "__main__":
+    unittest.main()
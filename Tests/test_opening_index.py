@@ -0,0 +1,130 @@
+"""
+OpeningIndex: the linear-probing table, its sidecar checks and the build CLI.
+
+Run with: python -m pytest Tests
+"""
+
+# Establish project root and add to PATH
+from pathlib import Path
+import sys
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+import json
+import subprocess
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from Processing.opening_index import OpeningIndex, load_opening_index, FORMAT_VERSION
+
+
+def positions(evals: dict) -> pd.DataFrame:
+    """Evaluated positions indexed by position_key, as common_positions + add_eval produce."""
+    index = pd.Index(np.asarray(list(evals), dtype=np.uint64), name="position_key")
+    return pd.DataFrame({"eval": pd.Series(list(evals.values()), index=index, dtype=object)})
+
+
+class OpeningIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = str(Path(self.tmp.name) / "opening_index")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        evals = {0x9D39247E33776D41: 0.35, 0x1234_5678_9ABC_DEF0: -1.2, 77: "M3", 78: "M-2",
+                 79: 0.0, 80: None, 2 ** 64 - 1: 400.0}
+        index = OpeningIndex.build(positions(evals), depth=20, path=self.path, source="test")
+
+        # Missing evals are skipped; cp is clipped to int16 centipawns
+        self.assertEqual(len(index), 6)
+        result = index.get([0x9D39247E33776D41, 0x1234_5678_9ABC_DEF0, 77, 78, 79, 80, 2 ** 64 - 1, 12345])
+        self.assertEqual(list(result.values[:5]), [0.35, -1.2, "M3", "M-2", 0.0])
+        self.assertTrue(pd.isna(result.values[5]))
+        self.assertEqual(result.values[6], 327.67)
+        self.assertTrue(pd.isna(result.values[7]))
+        self.assertEqual(list(result.index[:2]), [0x9D39247E33776D41, 0x1234_5678_9ABC_DEF0])
+
+    def test_depth_filter(self):
+        OpeningIndex.build(positions({101: 0.5, 102: "M1"}), depth=12, path=self.path)
+        index = load_opening_index(self.path)
+        self.assertEqual(list(index.get([101, 102], depth=12).values), [0.5, "M1"])
+        self.assertEqual(list(index.get([101, 102]).values), [0.5, "M1"])
+        self.assertTrue(index.get([101, 102], depth=13).isna().all())
+
+    def test_collisions_wrap_around(self):
+        # 7 keys -> 16 slots; these all hash to the last slot and spill over past the table end
+        wrapping = [15, 31, 47, 63, 79]
+        evals = {key: i / 10 for i, key in enumerate(wrapping)}
+        evals[16] = "M5"       # home slot 0, which it claims in the first round
+        evals[14] = -0.7       # home slot 14, just before the cluster
+        index = OpeningIndex.build(positions(evals), depth=20, path=self.path)
+
+        self.assertEqual(len(index.table), 16)
+        self.assertGreaterEqual(index.max_probe, 4)
+        slots = index._slots(np.asarray(wrapping, dtype=np.uint64))
+        self.assertEqual(sorted(slots.tolist()), [1, 2, 3, 4, 15])
+        self.assertEqual(index._slots(np.asarray([16, 14], dtype=np.uint64)).tolist(), [0, 14])
+        self.assertEqual(list(index.get(list(evals)).values), list(evals.values()))
+
+        # Absent keys homing into the cluster stop at the first empty slot
+        self.assertTrue(index.get([95, 0, 32, 13]).isna().all())
+
+    def test_empty_build(self):
+        index = OpeningIndex.build(positions({5: None}), depth=20, path=self.path)
+        self.assertEqual(len(index), 0)
+        self.assertTrue(index.get([5, 6]).isna().all())
+
+    def test_rejects_other_format(self):
+        OpeningIndex.build(positions({101: 0.5}), depth=20, path=self.path)
+        sidecar = Path(self.path).with_suffix(".json")
+        meta = json.loads(sidecar.read_text())
+        self.assertEqual(meta["format"], FORMAT_VERSION)
+        meta["format"] = FORMAT_VERSION + 1
+        sidecar.write_text(json.dumps(meta))
+        with self.assertRaisesRegex(ValueError, "rebuild it"):
+            OpeningIndex(self.path)
+
+    def test_missing_index(self):
+        self.assertIsNone(load_opening_index(str(Path(self.tmp.name) / "absent")))
+
+
+class OpeningIndexCliTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.csv = Path(self.tmp.name) / "moves_gold.csv"
+        fen = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"
+        pd.DataFrame({"game_id": [1, 2, 3, 3], "ply": [1, 1, 1, 30], "fen": fen,
+                      "position_key": np.uint64(0x823C9B50FD114196), "eval": [0.3, 0.3, 0.3, 0.3]}
+                     ).to_csv(self.csv, index=False)
+        self.output = str(Path(self.tmp.name) / "index")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_cli(self, *args):
+        return subprocess.run([sys.executable, str(project_root / "Processing" / "opening_index.py"),
+                               str(self.csv), "--output", self.output, *args],
+                              capture_output=True, text=True, cwd=project_root)
+
+    def test_csv_requires_depth(self):
+        result = self.run_cli()
+        self.assertEqual(result.returncode, 2)
+        self.assertIn("--depth is required for CSV sources", result.stderr)
+        self.assertFalse(Path(self.output).with_suffix(".json").exists())
+
+    def test_csv_stamps_given_depth(self):
+        result = self.run_cli("--depth", "12")
+        self.assertEqual(result.returncode, 0, result.stderr)
+        index = OpeningIndex(self.output)
+        self.assertEqual(index.meta["depth"], 12)
+        self.assertEqual(index.get([0x823C9B50FD114196], depth=12).iloc[0], 0.3)
+        self.assertTrue(index.get([0x823C9B50FD114196], depth=20).isna().all())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+"""
+UCIEngine and the add_eval engine paths against the stub UCI engine in Tests/fixtures.
+
+Run with: python -m pytest Tests
+"""
+
+# Establish project root and add to PATH
+from pathlib import Path
+import sys
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+import importlib.util
+import os
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+import Processing.add_eval as add_eval
+from Processing.uci_engine import UCIEngine, EngineError, engine_path
+
+STUB = str(project_root / "Tests" / "fixtures" / "stub_engine.py")
+
+# The stub's scoring, so expected evals come from the same formula
+_spec = importlib.util.spec_from_file_location("stub_engine", STUB)
+stub = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(stub)
+
+WHITE = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 {}"
+BLACK = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 {}"
+
+
+def fens(template: str, n: int, mate: bool = False) -> list:
+    """n FENs of one position that differ in the fullmove number, with a mate score or without."""
+    found = []
+    move = 1
+    while len(found) < n:
+        fen = template.format(move)
+        if stub.score(fen).startswith("mate") == mate:
+            found.append(fen)
+        move += 1
+    return found
+
+
+def expected(fen: str, line: int = 1):
+    """The stub's score for fen from white's point of view, as UCIEngine reports it."""
+    kind, value = stub.score(fen, line).split()
+    value = int(value) if fen.split()[1] == "w" else -int(value)
+    return value / 100.0 if kind == "cp" else f"M{value}"
+
+
+class UCIEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = UCIEngine(STUB, depth=12)
+
+    def tearDown(self):
+        self.engine.close()
+
+    def test_handshake(self):
+        self.assertIsNone(self.engine.process.poll())
+        self.assertEqual(self.engine.settings["UCI_Chess960"], "true")
+        # A second isready round trip answers on the same process
+        self.engine.new_game()
+        self.assertEqual(self.engine.searches, 0)
+
+    def test_engine_path_order(self):
+        self.assertEqual(engine_path("/explicit"), "/explicit")
+        with mock.patch.dict(os.environ, {"STOCKFISH_PATH": STUB}):
+            self.assertEqual(engine_path(), STUB)
+        with self.assertRaises(EngineError):
+            UCIEngine(str(project_root / "Tests" / "fixtures" / "no_such_engine"))
+
+    def test_white_pov_sign(self):
+        for fen in fens(WHITE, 3) + fens(BLACK, 3):
+            self.assertEqual(self.engine.evaluate(fen), expected(fen))
+        # Same search score, opposite signs for the two sides to move
+        white, black = WHITE.format(1), BLACK.format(1)
+        self.assertEqual(self.engine.evaluate(black), -int(stub.score(black).split()[1]) / 100.0)
+        self.assertEqual(self.engine.evaluate(white), int(stub.score(white).split()[1]) / 100.0)
+
+    def test_mate_scores(self):
+        for fen in fens(WHITE, 2, mate=True) + fens(BLACK, 2, mate=True):
+            evaluation = self.engine.evaluate(fen)
+            self.assertEqual(evaluation, expected(fen))
+            self.assertRegex(evaluation, r"^M-?\d+$")
+
+    def test_analyse_many_pipelined(self):
+        batch = fens(WHITE, 20) + fens(BLACK, 20) + fens(BLACK, 2, mate=True)
+        results = list(self.engine.analyse_many(batch))
+        self.assertEqual([r["eval"] for r in results], [expected(fen) for fen in batch])
+        self.assertEqual(self.engine.searches, len(batch))
+        self.assertEqual(self.engine.nodes, 1000 * 12 * len(batch))
+
+        # Stopping early drains the queued search, so the next answer is not stale
+        next(self.engine.evaluate_many(batch[:5]))
+        self.assertEqual(self.engine.evaluate(batch[7]), expected(batch[7]))
+
+    def test_unpipelined(self):
+        engine = UCIEngine(STUB, depth=12, pipeline=False)
+        try:
+            batch = fens(WHITE, 5) + fens(BLACK, 5)
+            self.assertEqual(list(engine.evaluate_many(batch)), [expected(fen) for fen in batch])
+        finally:
+            engine.close()
+
+    def test_multipv_best_move_pv(self):
+        engine = UCIEngine(STUB, depth=12, multipv=3)
+        try:
+            fen = fens(BLACK, 1)[0]
+            result = engine.analyse(fen)
+            self.assertEqual(result["best_move"], "e2e4")
+            self.assertEqual(result["pv"], ["e2e4", "e7e5"])
+            self.assertEqual(result["nodes"], 12000)
+            self.assertEqual([line["eval"] for line in result["lines"]],
+                             [expected(fen, k) for k in (1, 2, 3)])
+            self.assertEqual(result["eval"], result["lines"][0]["eval"])
+        finally:
+            engine.close()
+
+    def test_restart_after_crash(self):
+        crash, *rest = fens(WHITE, 4)
+        # Restarted processes inherit the environment too
+        patch = mock.patch.dict(os.environ, {"STUB_ENGINE_CRASH": crash})
+        patch.start()
+        self.addCleanup(patch.stop)
+        engine = UCIEngine(STUB, depth=12)
+        try:
+            with self.assertRaises(EngineError):
+                engine.evaluate(crash)
+            engine.restart()
+            self.assertIsNone(engine.process.poll())
+            self.assertEqual(engine.evaluate(rest[0]), expected(rest[0]))
+
+            # The stream gives the crashing position None and restarts for the rest
+            results = list(add_eval._evaluate_stream(engine, rest[1:2] + [crash] + rest[2:]))
+            self.assertEqual(results, [(expected(rest[1]), False), (None, True), (expected(rest[2]), False)])
+        finally:
+            engine.close()
+
+
+class AddEvalEngineTest(unittest.TestCase):
+    def setUp(self):
+        add_eval.ENGINE_PATH = STUB
+
+    def tearDown(self):
+        add_eval.ENGINE_PATH = None
+
+    def test_series_with_crashing_position(self):
+        batch = fens(WHITE, 5) + fens(BLACK, 5)
+        crash = batch[3]
+        series = pd.Series(None, index=batch, dtype=object)
+        stats = {}
+        with mock.patch.dict(os.environ, {"STUB_ENGINE_CRASH": crash}):
+            result = add_eval.add_eval_to_series(series, depth=12, trusted=True, stats=stats)
+
+        self.assertIsNone(result[crash])
+        for fen in batch:
+            if fen != crash:
+                self.assertEqual(result[fen], expected(fen))
+        self.assertEqual(stats["engine_errors"], 1)
+        self.assertEqual(stats["engine_positions"], len(batch))
+
+    def test_series_pooled(self):
+        batch = fens(WHITE, 70) + fens(BLACK, 70)
+        series = pd.Series(None, index=batch, dtype=object)
+        result = add_eval.add_eval_to_series(series, depth=12, workers=2, trusted=True)
+        self.assertEqual(list(result.values), [expected(fen) for fen in batch])
+
+
+if __name__ == "__main__":
+    unittest.main()